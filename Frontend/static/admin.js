@@ -1,10 +1,18 @@
 // Admin JavaScript
-let allUsers = [];
+const PAGE_SIZE = 50;
+let loadedUsers = [];     // các trang đã tải với bộ lọc hiện tại
+let nextCursor = null;    // cursor của trang tiếp theo (null = hết)
+let usersRequest = 0;     // bỏ qua response của bộ lọc cũ
+let searchTimer = null;
 let currentEditingUser = null;
 
 // DOM Elements
 const usersTableBody = document.getElementById('usersTableBody');
 const searchInput = document.getElementById('searchInput');
+const searchField = document.getElementById('searchField');
+const roleFilter = document.getElementById('roleFilter');
+const loadMoreBtn = document.getElementById('loadMoreBtn');
+const pageInfo = document.getElementById('pageInfo');
 const roleModal = document.getElementById('roleModal');
 const modalUsername = document.getElementById('modalUsername');
 const updateRoleBtn = document.getElementById('updateRoleBtn');
@@ -13,11 +21,15 @@ const closeModal = document.querySelector('.close');
 // Load users khi trang được tải
 document.addEventListener('DOMContentLoaded', function() {
     loadUsers();
+    loadStats();
     setupEventListeners();
 });
 
 function setupEventListeners() {
     searchInput.addEventListener('input', filterUsers);
+    searchField.addEventListener('change', () => loadUsers());
+    roleFilter.addEventListener('change', () => loadUsers());
+    loadMoreBtn.addEventListener('click', () => loadUsers(true));
     updateRoleBtn.addEventListener('click', updateUserRole);
     closeModal.addEventListener('click', closeRoleModal);
     
@@ -29,21 +41,53 @@ function setupEventListeners() {
     });
 }
 
-// Load danh sách users từ API
-async function loadUsers() {
+// Query string cho /api/admin/users theo bộ lọc hiện tại
+function usersQuery(cursor) {
+    const params = new URLSearchParams({ limit: PAGE_SIZE });
+    const term = searchInput.value.trim();
+    if (term) params.set(searchField.value, term);
+    if (roleFilter.value) params.set('role', roleFilter.value);
+    if (cursor) params.set('cursor', cursor);
+    else params.set('include_total', 'true');
+    return params.toString();
+}
+
+// Load danh sách users từ API (append = tải trang tiếp theo)
+async function loadUsers(append = false) {
+    if (append && !nextCursor) return;
+    const request = ++usersRequest;
+    loadMoreBtn.disabled = true;
     try {
-        const response = await fetch('/api/debug-all-users');
+        const response = await fetch(`/api/admin/users?${usersQuery(append ? nextCursor : null)}`);
         if (!response.ok) throw new Error('Failed to fetch users');
-        
-        allUsers = await response.json();
-        displayUsers(allUsers);
-        updateStats(allUsers);
+
+        const page = await response.json();
+        if (request !== usersRequest) return;
+        loadedUsers = append ? loadedUsers.concat(page.items) : page.items;
+        nextCursor = page.next_cursor;
+        if (!append) {
+            pageInfo.dataset.total = page.total_exact ? page.total : `${page.total}+`;
+        }
+        displayUsers(loadedUsers);
+        pageInfo.textContent = `Đang hiển thị ${loadedUsers.length} / ${pageInfo.dataset.total} user`;
+        loadMoreBtn.disabled = !nextCursor;
     } catch (error) {
         console.error('Error loading users:', error);
         alert('Lỗi khi tải danh sách user: ' + error.message);
     }
 }
 
+// Số user theo role cho các ô thống kê
+async function loadStats() {
+    try {
+        const response = await fetch('/api/admin/users/counts');
+        if (!response.ok) throw new Error('Failed to fetch user counts');
+        updateStats(await response.json());
+    } catch (error) {
+        console.error('Error loading stats:', error);
+    }
+}
+
 // Hiển thị users trong table
 function displayUsers(users) {
     usersTableBody.innerHTML = '';
@@ -54,6 +98,7 @@ function displayUsers(users) {
         row.innerHTML = `
             <td>${user.id}</td>
             <td>${user.username}</td>
+            <td>${user.name || ''}</td>
             <td>
                 <span class="role-badge role-${user.role}">
                     ${getRoleDisplayName(user.role)}
@@ -70,26 +115,18 @@ function displayUsers(users) {
     });
 }
 
-// Lọc users
+// Lọc users: hỏi lại server (theo tiền tố), chờ người dùng gõ xong
 function filterUsers() {
-    const searchTerm = searchInput.value.toLowerCase();
-    const filteredUsers = allUsers.filter(user => 
-        user.username.toLowerCase().includes(searchTerm)
-    );
-    displayUsers(filteredUsers);
+    clearTimeout(searchTimer);
+    searchTimer = setTimeout(() => loadUsers(), 300);
 }
 
 // Cập nhật thống kê
-function updateStats(users) {
-    const totalUsers = users.length;
-    const totalStudents = users.filter(u => u.role === 'student').length;
-    const totalTeachers = users.filter(u => u.role === 'teacher').length;
-    const totalAdmins = users.filter(u => u.role === 'admin').length;
-    
-    document.getElementById('totalUsers').textContent = totalUsers;
-    document.getElementById('totalStudents').textContent = totalStudents;
-    document.getElementById('totalTeachers').textContent = totalTeachers;
-    document.getElementById('totalAdmins').textContent = totalAdmins;
+function updateStats(counts) {
+    document.getElementById('totalUsers').textContent = counts.total;
+    document.getElementById('totalStudents').textContent = counts.student;
+    document.getElementById('totalTeachers').textContent = counts.teacher;
+    document.getElementById('totalAdmins').textContent = counts.admin;
 }
 
 // Mở modal phân quyền
@@ -145,6 +182,7 @@ async function updateUserRole() {
         alert(result.message);
         closeRoleModal();
         loadUsers(); // Reload danh sách users
+        loadStats();
         
     } catch (error) {
         console.error('Error updating role:', error);
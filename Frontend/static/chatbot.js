@@ -168,7 +168,7 @@ class ChatbotUI {
         this.showTypingIndicator();
 
         try {
-            const response = await fetch('/api/chatbot/chat', {
+            const response = await fetch('/api/chatbot/chat/stream', {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
@@ -180,20 +180,32 @@ class ChatbotUI {
                 })
             });
 
-            if (!response.ok) throw new Error('Failed to get response');
+            if (!response.ok || !response.body) throw new Error('Failed to get response');
+
+            // Render incrementally as Server-Sent Events arrive
+            let reply = '';
+            let contentDiv = null;
+            await this.readEventStream(response, (event, payload) => {
+                if (event === 'error') throw new Error(payload.detail || 'Stream error');
+                if (event !== 'message' || !payload.delta) return;
+                if (!contentDiv) {
+                    this.hideTypingIndicator();
+                    this.isTyping = true;
+                    contentDiv = this.addMessage('assistant', '');
+                }
+                reply += payload.delta;
+                contentDiv.innerHTML = this.formatMessage(reply);
+                const messagesContainer = document.getElementById('chatbot-messages');
+                messagesContainer.scrollTop = messagesContainer.scrollHeight;
+            });
 
-            const data = await response.json();
-            
-            // Remove typing indicator
             this.hideTypingIndicator();
-
-            // Add assistant response
-            this.addMessage('assistant', data.response);
+            if (!contentDiv) this.addMessage('assistant', reply);
 
             // Update conversation history
             this.conversationHistory.push(
                 { role: 'user', content: message },
-                { role: 'assistant', content: data.response }
+                { role: 'assistant', content: reply }
             );
 
         } catch (error) {
@@ -203,6 +215,34 @@ class ChatbotUI {
         }
     }
 
+    async readEventStream(response, onEvent) {
+        // Minimal SSE parser: frames separated by a blank line, "event:" and "data:" fields
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const frame = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+
+                let event = 'message';
+                let data = '';
+                frame.split('\n').forEach(line => {
+                    if (line.startsWith('event:')) event = line.slice(6).trim();
+                    else if (line.startsWith('data:')) data += line.slice(5).trim();
+                });
+                if (event === 'done') return;
+                onEvent(event, data ? JSON.parse(data) : {});
+            }
+        }
+    }
+
     addMessage(role, content) {
         const messagesContainer = document.getElementById('chatbot-messages');
         const messageDiv = document.createElement('div');
@@ -217,6 +257,7 @@ class ChatbotUI {
 
         // Scroll to bottom
         messagesContainer.scrollTop = messagesContainer.scrollHeight;
+        return contentDiv;
     }
 
     formatMessage(content) {
@@ -1,6 +1,6 @@
 // ========================================
 // studentHome.js — Final (UI-upgraded, logic preserved)
-// - Giữ nguyên API endpoints & logic gốc
+// - Trang chủ tải hồ sơ + lớp + điểm từ 1 request /api/student/dashboard (ETag)
 // - Removes inline color for progress, adds .progress-text
 // - Injects Dark Mode button into header (no HTML change required)
 // ========================================
@@ -8,6 +8,9 @@
 const API_BASE_URL = 'http://127.0.0.1:8000/api';
 let scoreChart = null;
 let currentUser = null;
+// Dữ liệu /api/student/dashboard + ETag để gửi If-None-Match lần sau
+let dashboard = null;
+let dashboardEtag = null;
 
 // ===== Helpers =====
 function getAuthHeaders() {
@@ -53,17 +56,21 @@ function showNotification(message, isError = false) {
   }, 3500);
 }
 
-// ===== 1. Fetch current user =====
-async function fetchCurrentUser() {
+// ===== 1. Fetch dashboard (profile + classes + grades in one request) =====
+async function fetchDashboard() {
   try {
-    const resp = await fetch(`/api/me`, { headers: getAuthHeaders() });
-    if (!resp.ok) throw new Error('Không thể lấy thông tin người dùng');
-    const data = await resp.json();
-    currentUser = data;
-    renderStudentInfo(data);
-    return data;
+    const headers = getAuthHeaders();
+    if (dashboard && dashboardEtag) headers['If-None-Match'] = dashboardEtag;
+    const resp = await fetch(`${API_BASE_URL}/student/dashboard`, { headers });
+    if (resp.status === 304) return dashboard;
+    if (!resp.ok) throw new Error('Không thể lấy dữ liệu trang chủ');
+    dashboard = await resp.json();
+    dashboardEtag = resp.headers.get('ETag');
+    currentUser = dashboard.profile;
+    renderStudentInfo(currentUser);
+    return dashboard;
   } catch (err) {
-    console.error('fetchCurrentUser error', err);
+    console.error('fetchDashboard error', err);
     showNotification('Không thể tải thông tin sinh viên', true);
     return null;
   }
@@ -91,48 +98,17 @@ function renderStudentInfo(userData) {
   }
 }
 
-// ===== 3. Fetch enrollments & class details =====
-async function fetchStudentClasses(studentId) {
-  try {
-    const enrollRes = await fetch(`${API_BASE_URL}/students/${studentId}/enrollments`, { headers: getAuthHeaders() });
-    if (!enrollRes.ok) throw new Error('Không thể lấy danh sách lớp học');
-    const enrollments = await enrollRes.json();
-    if (!Array.isArray(enrollments) || enrollments.length === 0) return [];
-
-    // load class details in parallel
-    const promises = enrollments.map(async (enroll) => {
-      try {
-        const clsRes = await fetch(`${API_BASE_URL}/classes/${enroll.class_id}`, { headers: getAuthHeaders() });
-        if (!clsRes.ok) return null;
-        return await clsRes.json();
-      } catch (e) {
-        console.error('fetch class error', enroll.class_id, e);
-        return null;
-      }
-    });
-
-    const classes = await Promise.all(promises);
-    return classes.filter(c => c !== null);
-  } catch (err) {
-    console.error('fetchStudentClasses error', err);
-    showNotification('Không thể tải danh sách lớp học', true);
-    return [];
-  }
-}
-
-// ===== 4. Generate class cards (uses .progress-text class, no inline color) =====
+// ===== 3. Generate class cards (uses .progress-text class, no inline color) =====
 async function generateClassCards() {
   const grid = document.getElementById('classes-grid');
   if (!grid) return;
 
   grid.innerHTML = `<div style="text-align:center;padding:40px;color:#666;">⏳ Đang tải danh sách lớp học...</div>`;
 
-  if (!currentUser) {
-    const u = await fetchCurrentUser();
-    if (!u) {
-      grid.innerHTML = `<div style="text-align:center;padding:40px;color:#f44336;">❌ Không thể tải thông tin người dùng</div>`;
-      return;
-    }
+  const data = await fetchDashboard();
+  if (!data) {
+    grid.innerHTML = `<div style="text-align:center;padding:40px;color:#f44336;">❌ Không thể tải thông tin người dùng</div>`;
+    return;
   }
 
   if (!currentUser.student_profile) {
@@ -140,8 +116,7 @@ async function generateClassCards() {
     return;
   }
 
-  const studentId = currentUser.student_profile.student_id;
-  const classes = await fetchStudentClasses(studentId);
+  const classes = data.classes;
 
   if (!classes || classes.length === 0) {
     grid.innerHTML = `<div style="text-align:center;padding:40px;color:#666;">📚 Chưa đăng ký lớp học nào</div>`;
@@ -154,12 +129,14 @@ async function generateClassCards() {
     card.className = 'class-card';
 
     const progress = calculateProgress(cls.year, cls.semester);
+    const teachers = cls.teachers.length ? cls.teachers.join(', ') : 'Chưa phân công';
 
     card.innerHTML = `
                 <div class="class-name tooltip" data-tooltip="Năm: ${cls.year}, Học kỳ: ${cls.semester}">
                     ${cls.class_name}
                 </div>
                 <div class="class-code">Lớp: ${cls.class_id} | Năm ${cls.year} - HK${cls.semester}</div>
+                <div class="class-code">GV: ${teachers}</div>
                 <div class="progress-bar">
                     <div class="progress-fill" style="width:${progress}%"></div>
                 </div>
@@ -168,14 +145,14 @@ async function generateClassCards() {
                 </div>
             `;
 
-    card.addEventListener('click', () => showSubjectScore(cls.class_id, cls.class_name));
+    card.addEventListener('click', () => showSubjectScore(cls));
     grid.appendChild(card);
   });
 
   showNotification('✅ Đã tải danh sách lớp học');
 }
 
-// ===== 5. Progress calculation (keep same logic semantics) =====
+// ===== 4. Progress calculation (keep same logic semantics) =====
 function calculateProgress(year, semester) {
   const now = new Date();
   const currentYear = now.getFullYear();
@@ -204,21 +181,7 @@ function calculateProgress(year, semester) {
   return 50;
 }
 
-// ===== 6. Group grades + calculate average (preserve original mapping) =====
-function groupGradesByClass(grades) {
-  const grouped = {};
-  grades.forEach(grade => {
-    const classId = grade.class_id;
-    if (!grouped[classId]) grouped[classId] = { class_id: classId, attendance: null, mid: null, final: null };
-
-    const subject = (grade.subject || '').toLowerCase();
-    if (subject === 'attendance') grouped[classId].attendance = grade.score;
-    else if (subject === 'mid') grouped[classId].mid = grade.score;
-    else if (subject === 'final') grouped[classId].final = grade.score;
-  });
-  return Object.values(grouped);
-}
-
+// ===== 5. Calculate average (fallback when some components are missing) =====
 function calculateAverage(attendance, mid, finalScore) {
   const scores = [];
   const weights = [];
@@ -231,8 +194,8 @@ function calculateAverage(attendance, mid, finalScore) {
   return (weightedSum / totalWeight).toFixed(2);
 }
 
-// ===== 7. Show scores for a class and render chart =====
-async function showSubjectScore(classId, className) {
+// ===== 6. Show scores for a class (from dashboard data) and render chart =====
+function showSubjectScore(cls) {
   const tbody = document.getElementById('score-table-body');
   const section = document.getElementById('score-section');
   const chartSection = document.getElementById('chart-section');
@@ -240,63 +203,33 @@ async function showSubjectScore(classId, className) {
 
   if (!tbody || !section || !chartSection || !title) return;
 
-  tbody.innerHTML = '<tr><td colspan="5" style="text-align:center;padding:20px;">⏳ Đang tải điểm...</td></tr>';
   section.style.display = 'block';
   chartSection.style.display = 'none';
-  title.textContent = `📊 Điểm môn học: ${className}`;
+  title.textContent = `📊 Điểm môn học: ${cls.class_name}`;
 
-  try {
-    if (!currentUser || !currentUser.student_profile) {
-      tbody.innerHTML = '<tr><td colspan="5" style="text-align:center;color:#f44336;">Không tìm thấy thông tin sinh viên</td></tr>';
-      return;
-    }
-    const studentId = currentUser.student_profile.student_id;
-    const res = await fetch(`${API_BASE_URL}/students/${studentId}/grades?class_id=${classId}`, { headers: getAuthHeaders() });
-    if (!res.ok) throw new Error('Không thể lấy điểm');
-    const grades = await res.json();
-
-    if (!grades || grades.length === 0) {
-      tbody.innerHTML = '<tr><td colspan="5" style="text-align:center;padding:20px;color:#666;">📝 Chưa có điểm</td></tr>';
-      return;
-    }
-
-    const grouped = groupGradesByClass(grades);
-    tbody.innerHTML = '';
-
-    grouped.forEach(gradeGroup => {
-      const att = gradeGroup.attendance !== null ? parseFloat(gradeGroup.attendance).toFixed(2) : '-';
-      const mid = gradeGroup.mid !== null ? parseFloat(gradeGroup.mid).toFixed(2) : '-';
-      const fin = gradeGroup.final !== null ? parseFloat(gradeGroup.final).toFixed(2) : '-';
-      const avg = calculateAverage(gradeGroup.attendance, gradeGroup.mid, gradeGroup.final);
-      const avgDisplay = avg !== null ? avg : '-';
-      tbody.innerHTML += `
-        <tr>
-          <td>${className}</td>
-          <td>${att}</td>
-          <td>${mid}</td>
-          <td>${fin}</td>
-          <td><b style="color:#4CAF50">${avgDisplay}</b></td>
-        </tr>
-      `;
-    });
+  const g = cls.grades;
+  if (g.attendance === null && g.mid === null && g.final === null) {
+    tbody.innerHTML = '<tr><td colspan="5" style="text-align:center;padding:20px;color:#666;">📝 Chưa có điểm</td></tr>';
+    return;
+  }
 
-    // render chart if at least one group
-    if (grouped.length > 0) {
-      chartSection.style.display = 'block';
-      renderScoreChart(grouped, className);
-    } else {
-      chartSection.style.display = 'none';
-    }
+  const fmt = (v) => v !== null ? parseFloat(v).toFixed(2) : '-';
+  const avg = cls.average !== null ? cls.average.toFixed(2) : calculateAverage(g.attendance, g.mid, g.final);
+  tbody.innerHTML = `
+    <tr>
+      <td>${cls.class_name}</td>
+      <td>${fmt(g.attendance)}</td>
+      <td>${fmt(g.mid)}</td>
+      <td>${fmt(g.final)}</td>
+      <td><b style="color:#4CAF50">${avg !== null ? avg : '-'}</b></td>
+    </tr>
+  `;
 
-    showNotification('✅ Đã tải điểm thành công');
-  } catch (err) {
-    console.error('showSubjectScore error', err);
-    tbody.innerHTML = '<tr><td colspan="5" style="text-align:center;padding:20px;color:#f44336;">❌ Không thể tải điểm</td></tr>';
-    showNotification('Không thể tải điểm', true);
-  }
+  chartSection.style.display = 'block';
+  renderScoreChart([g], cls.class_name);
 }
 
-// ===== 8. Render chart (uses Chart.js already included in HTML) =====
+// ===== 7. Render chart (uses Chart.js already included in HTML) =====
 function renderScoreChart(groupedGrades, className) {
   const ctxEl = document.getElementById('scoreChart');
   if (!ctxEl) return;
@@ -342,7 +275,7 @@ function renderScoreChart(groupedGrades, className) {
   });
 }
 
-// ===== 9. Dark mode toggle logic (keeps state in localStorage) =====
+// ===== 8. Dark mode toggle logic (keeps state in localStorage) =====
 function toggleDarkMode() {
   document.body.classList.toggle('dark-mode');
   const isDark = document.body.classList.contains('dark-mode');
@@ -352,13 +285,12 @@ function initDarkModeFromStorage() {
   if (localStorage.getItem('darkMode') === 'true') document.body.classList.add('dark-mode');
 }
 
-// ===== 10. Join class =====
+// ===== 9. Join class =====
 async function JoinClass() {
   try {
-    const resp = await fetch(`/api/me`, { headers: getAuthHeaders() });
-    if (!resp.ok) throw new Error('Không thể lấy thông tin người dùng');
-    const userData = await resp.json();
-    const studentId = parseInt(userData.student_profile.student_id);
+    const current = await fetchDashboard();
+    if (!current || !current.profile.student_profile) throw new Error('Không thể lấy thông tin người dùng');
+    const studentId = parseInt(current.profile.student_profile.student_id);
     const joinCode = (document.querySelector('.code-input')?.value || '').trim();
 
     const res = await fetch(`${API_BASE_URL}/student/${studentId}/join`, {
@@ -379,14 +311,14 @@ async function JoinClass() {
   }
 }
 
-// ===== 11. Edit profile redirect (kept original behavior) =====
+// ===== 10. Edit profile redirect (kept original behavior) =====
 function editProfile() {
   window.location.href = '/editProfile';
 }
 
-// ===== 12. Auto update on focus & storage changes =====
+// ===== 11. Auto update on focus & storage changes =====
 window.addEventListener('focus', async () => {
-  try { await fetchCurrentUser(); await generateClassCards(); } catch(e){}
+  try { await generateClassCards(); } catch(e){}
 });
 window.addEventListener('storage', async (e) => {
   if (e.key === 'userInfo') {
@@ -397,7 +329,7 @@ window.addEventListener('storage', async (e) => {
   }
 });
 
-// ===== 13. Inject header dark mode button (so no HTML changes needed) =====
+// ===== 12. Inject header dark mode button (so no HTML changes needed) =====
 function ensureHeaderDarkToggle() {
   try {
     const headerButtons = document.querySelector('.header-buttons');
@@ -424,7 +356,7 @@ function ensureHeaderDarkToggle() {
   }
 }
 
-// ===== 14. Init on DOMContentLoaded =====
+// ===== 13. Init on DOMContentLoaded =====
 document.addEventListener('DOMContentLoaded', async () => {
   // ensure token exists (original behavior)
   const token = localStorage.getItem('token');
@@ -438,8 +370,7 @@ document.addEventListener('DOMContentLoaded', async () => {
   initDarkModeFromStorage();
   ensureHeaderDarkToggle();
 
-  // load user and classes
-  await fetchCurrentUser();
+  // load user and classes (one /api/student/dashboard request)
   await generateClassCards();
 
   console.log('✅ studentHome.js initialized');
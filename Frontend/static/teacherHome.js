@@ -3,6 +3,8 @@
 const API_BASE_URL = '/api';
 let teacherClasses = [];
 let currentClass = null;
+// class_id -> { etag, data }: chi tiết lớp đã tải, gửi If-None-Match khi tải lại
+const classDetailCache = new Map();
 
 
 function getAuthHeaders() {
@@ -154,12 +156,20 @@ async function createClass(name, code) {
 
 async function fetchClassDetail(id) {
   try {
+    const cached = classDetailCache.get(String(id));
+    const headers = getAuthHeaders();
+    if (cached) headers['If-None-Match'] = cached.etag;
     const res = await fetch(`${API_BASE_URL}/teacher/classes/${id}`, {
-      headers: getAuthHeaders(),
-      cache: 'no-cache'
+      headers,
+      cache: 'no-store'
     });
+    // 304: lớp chưa đổi (version giữ nguyên) -> dùng bản đã lưu
+    if (res.status === 304 && cached) return structuredClone(cached.data);
     if (!res.ok) throw new Error('Không tải được dữ liệu lớp');
-    return await res.json();
+    const data = await res.json();
+    const etag = res.headers.get('ETag');
+    if (etag) classDetailCache.set(String(id), { etag, data: structuredClone(data) });
+    return data;
   } catch (err) {
     console.error('fetchClassDetail', err);
     notify('Không tải được dữ liệu lớp', true);
@@ -0,0 +1,355 @@
+"""
+Thống kê điểm theo học kỳ (GET /api/analytics/terms/{year}/{semester}).
+
+Nguồn dữ liệu là student_class_results (điểm thành phần + điểm tổng kết đã tính
+sẵn, xem db/grade_aggregates.py): một câu truy vấn đọc toàn bộ dòng của học kỳ
+vào các mảng NumPy, mọi thống kê được tính theo nhóm bằng bincount / lexsort,
+không có vòng lặp Python trên từng dòng:
+
+- phân bố điểm tổng kết mỗi lớp và cả học kỳ: số lượng, trung bình, độ lệch
+  chuẩn, min / max, phân vị (PERCENTILES), tỉ lệ đạt (>= PASS_SCORE), histogram
+  theo từng điểm (0-1, ..., 9-10) và số lượng theo học lực (grade_aggregates.BANDS)
+- so sánh giảng viên: gộp các lớp mỗi người dạy, chênh lệch so với cả học kỳ
+- tương quan giữa các thành phần (ma trận Pearson cả học kỳ, và chuyên cần -
+  cuối kỳ cho từng lớp)
+
+Kết quả được cache (cache.analytics_cache) theo phiên bản của học kỳ:
+term_version() = (số lớp, tổng classes.version, tổng class_id). Mọi thay đổi ghi
+danh / điểm đều tăng version của lớp, thêm / xóa lớp đổi số lớp và tổng id, nên
+báo cáo cũ không bao giờ được trả lại sau khi dữ liệu đổi. Mảng điểm của từng
+lớp cũng được giữ theo classes.version, nên tính lại sau khi sửa điểm chỉ đọc
+các lớp đã đổi.
+
+NumPy chỉ được import khi có người xem thống kê (router import module này lúc
+gọi), không làm chậm lúc khởi động app.
+"""
+import threading
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from . import cache
+from .db import grade_aggregates, models
+
+PERCENTILES = (10, 25, 50, 75, 90)
+HISTOGRAM_BINS = 10                                              # [0, 1), [1, 2), ..., [9, 10]
+PASS_SCORE = dict(grade_aggregates.BANDS)["average"]             # từ trung bình trở lên là đạt
+FIELDS = grade_aggregates.COMPONENTS + ("weighted",)
+# Ngưỡng học lực tăng dần -> chỉ số trong BANDS_ASCENDING (weak, average, good, excellent)
+BANDS_ASCENDING = tuple(name for name, _ in reversed(grade_aggregates.BANDS))
+_BAND_EDGES = np.array([lower for _, lower in reversed(grade_aggregates.BANDS[:-1])])
+_DECIMALS = 3
+
+TermVersion = Tuple[int, int, int]
+
+
+class TermData(NamedTuple):
+    class_ids: "np.ndarray"                 # id lớp của học kỳ, tăng dần
+    class_names: List[str]
+    group: "np.ndarray"                     # chỉ số lớp (trong class_ids) của từng dòng
+    scores: Dict[str, "np.ndarray"]         # attendance / mid / final / weighted, NaN = chưa có
+    teachers: List[Tuple[int, str]]         # (teacher_id, họ tên)
+    pairs: "np.ndarray"                     # (chỉ số giảng viên, chỉ số lớp) của mỗi phân công
+
+
+def term_version(db: Session, year: int, semester: int) -> TermVersion:
+    """Phiên bản dữ liệu của học kỳ, chỉ đọc bảng classes."""
+    count, versions, ids = db.execute(
+        select(func.count(), func.coalesce(func.sum(models.Class.version), 0),
+               func.coalesce(func.sum(models.Class.class_id), 0))
+        .where(models.Class.year == year, models.Class.semester == semester)
+    ).one()
+    return count, versions, ids
+
+
+# =========================
+# ĐỌC DỮ LIỆU
+# =========================
+# Điểm thành phần của từng lớp đã đọc, theo học kỳ: class_id -> (classes.version, mảng n x 3).
+# Lớp giữ nguyên version thì dùng lại, nên sau khi sửa điểm chỉ đọc lại các lớp đã đổi
+# thay vì cả học kỳ. Mỗi process giữ bản riêng; version lấy từ DB nên không lệch nhau.
+_blocks: Dict[Tuple[int, int], Dict[int, Tuple[int, "np.ndarray"]]] = {}
+_blocks_lock = threading.Lock()
+_CHUNK = 500
+
+
+def _fetch_components(db: Session, query) -> Dict[int, "np.ndarray"]:
+    """class_id -> mảng điểm thành phần (NaN = chưa có) của các dòng `query` trả về."""
+    # Đọc thẳng tuple từ cursor DBAPI: các cột không cần xử lý kiểu của SQLAlchemy,
+    # còn np.array() trên Row phải dò __array__... từng dòng (chậm ~10 lần).
+    result = db.connection().execute(query.order_by(models.StudentClassResult.class_id))
+    try:
+        rows = result.cursor.fetchall()
+    finally:
+        result.close()
+    table = np.array(rows, dtype=np.float64).reshape(len(rows), len(grade_aggregates.COMPONENTS) + 1)
+    class_ids, starts = np.unique(table[:, 0].astype(np.int64), return_index=True)
+    return dict(zip(class_ids.tolist(), np.split(table[:, 1:], starts[1:])))
+
+
+def load_term(db: Session, year: int, semester: int) -> TermData:
+    classes = db.execute(
+        select(models.Class.class_id, models.Class.class_name, models.Class.version)
+        .where(models.Class.year == year, models.Class.semester == semester)
+        .order_by(models.Class.class_id)
+    ).all()
+    class_ids = np.array([c for c, _, _ in classes], dtype=np.int64)
+
+    with _blocks_lock:
+        known = dict(_blocks.get((year, semester), {}))
+    stale = [(class_id, version) for class_id, _, version in classes
+             if known.get(class_id, (None,))[0] != version]
+    if stale:
+        results = models.StudentClassResult
+        query = select(results.class_id, *(getattr(results, field) for field in grade_aggregates.COMPONENTS))
+        if len(stale) == len(classes):
+            # Lần đầu: một câu truy vấn cho toàn bộ điểm của học kỳ
+            fetched = _fetch_components(db, query.join(models.Class, models.Class.class_id == results.class_id)
+                                        .where(models.Class.year == year, models.Class.semester == semester))
+        else:
+            ids = [class_id for class_id, _ in stale]
+            fetched = {}
+            for start in range(0, len(ids), _CHUNK):
+                fetched.update(_fetch_components(db, query.where(results.class_id.in_(ids[start:start + _CHUNK]))))
+        empty = np.empty((0, len(grade_aggregates.COMPONENTS)))
+        known.update((class_id, (version, fetched.get(class_id, empty))) for class_id, version in stale)
+    blocks = {class_id: known[class_id] for class_id, _, _ in classes}  # bỏ lớp đã xóa / chuyển kỳ
+    with _blocks_lock:
+        _blocks[(year, semester)] = blocks
+
+    components = [block for _, block in blocks.values()]
+    table = np.concatenate(components) if components else np.empty((0, len(grade_aggregates.COMPONENTS)))
+    group = np.repeat(np.arange(len(classes)), [len(block) for block in components])
+    scores = {field: np.ascontiguousarray(table[:, i]) for i, field in enumerate(grade_aggregates.COMPONENTS)}
+    # Cột weighted không cần đọc: cùng công thức (và thứ tự phép tính) với
+    # grade_aggregates.weighted_average, thiếu thành phần -> NaN như None
+    scores["weighted"] = sum(scores[field] * weight for field, weight in grade_aggregates.WEIGHTS.items())
+
+    assignments = db.execute(
+        select(models.TeachingAssignment.teacher_id, models.TeachingAssignment.class_id, models.User.full_name)
+        .join(models.Class, models.Class.class_id == models.TeachingAssignment.class_id)
+        .join(models.User, models.User.user_id == models.TeachingAssignment.teacher_id)
+        .where(models.Class.year == year, models.Class.semester == semester)
+        .order_by(models.TeachingAssignment.teacher_id)
+    ).all()
+    teacher_index: Dict[int, int] = {}
+    teachers = []
+    for teacher_id, _, name in assignments:
+        if teacher_id not in teacher_index:
+            teacher_index[teacher_id] = len(teachers)
+            teachers.append((teacher_id, name))
+    pairs = np.array([(teacher_index[t], c) for t, c, _ in assignments], dtype=np.int64).reshape(-1, 2)
+    pairs[:, 1] = np.searchsorted(class_ids, pairs[:, 1])
+
+    return TermData(class_ids, [name for _, name, _ in classes], group, scores, teachers, pairs)
+
+
+# =========================
+# THỐNG KÊ THEO NHÓM (VECTOR HÓA)
+# =========================
+def _divide(a: "np.ndarray", b: "np.ndarray") -> "np.ndarray":
+    """a / b, NaN khi b == 0."""
+    return np.divide(a, b, out=np.full(np.shape(a), np.nan), where=b > 0)
+
+
+def group_moments(group: "np.ndarray", values: "np.ndarray", groups: int) -> Dict[str, "np.ndarray"]:
+    """Số lượng, tổng, tổng bình phương và số đạt của mỗi nhóm (bỏ NaN)."""
+    present = ~np.isnan(values)
+    g, v = group[present], values[present]
+    return {
+        "count": np.bincount(g, minlength=groups),
+        "sum": np.bincount(g, weights=v, minlength=groups),
+        "sumsq": np.bincount(g, weights=v * v, minlength=groups),
+        "passed": np.bincount(g, weights=v >= PASS_SCORE, minlength=groups),
+    }
+
+
+def _mean_std(moments: Dict[str, "np.ndarray"]) -> Tuple["np.ndarray", "np.ndarray"]:
+    mean = _divide(moments["sum"], moments["count"])
+    variance = _divide(moments["sumsq"], moments["count"]) - mean * mean
+    return mean, np.sqrt(np.clip(variance, 0, None))  # độ lệch chuẩn tổng thể
+
+
+def group_distribution(group: "np.ndarray", values: "np.ndarray", groups: int) -> Dict[str, "np.ndarray"]:
+    """
+    Phân bố của mỗi nhóm: mean / std / min / max / phân vị (nội suy tuyến tính như
+    np.percentile) / tỉ lệ đạt / histogram / học lực. Mỗi mảng có `groups` dòng.
+    """
+    moments = group_moments(group, values, groups)
+    count = moments["count"]
+    mean, std = _mean_std(moments)
+
+    present = ~np.isnan(values)
+    g, v = group[present], values[present]
+    # Theo nhóm, trong nhóm theo điểm tăng dần: một argsort trên khóa nhóm * span + điểm
+    # (nhanh hơn lexsort((v, g)) vài lần; khóa của hai nhóm không bao giờ chồng nhau)
+    lowest = v.min() if v.size else 0.0
+    span = (v.max() - lowest if v.size else 0.0) + 1
+    order = np.argsort(g * span + (v - lowest))
+    ordered = v[order]
+    starts = np.concatenate(([0], np.cumsum(count)[:-1]))
+    has = count > 0
+    last = np.where(has, starts + count - 1, 0)
+    first = np.where(has, starts, 0)
+
+    def pick(index):
+        return np.where(has, ordered[index] if ordered.size else np.nan, np.nan)
+
+    percentiles = {}
+    for q in PERCENTILES:
+        position = first + (q / 100) * np.maximum(count - 1, 0)
+        lower = np.floor(position).astype(np.int64)
+        upper = np.minimum(lower + 1, last)
+        fraction = position - lower
+        low, high = pick(lower), pick(upper)
+        percentiles[q] = low + (high - low) * fraction
+
+    bins = np.clip(np.floor(v).astype(np.int64), 0, HISTOGRAM_BINS - 1)
+    histogram = np.bincount(g * HISTOGRAM_BINS + bins, minlength=groups * HISTOGRAM_BINS)
+    bands = np.bincount(g * len(BANDS_ASCENDING) + np.searchsorted(_BAND_EDGES, v, side="right"),
+                        minlength=groups * len(BANDS_ASCENDING))
+    return {
+        "count": count, "mean": mean, "std": std, "min": pick(first), "max": pick(last),
+        "percentiles": percentiles, "pass_rate": _divide(moments["passed"], count),
+        "histogram": histogram.reshape(groups, HISTOGRAM_BINS),
+        "bands": bands.reshape(groups, len(BANDS_ASCENDING)),
+    }
+
+
+def group_correlation(group: "np.ndarray", x: "np.ndarray", y: "np.ndarray", groups: int) -> "np.ndarray":
+    """Hệ số Pearson giữa x và y trong mỗi nhóm (chỉ dòng có cả hai); NaN nếu < 3 dòng hoặc không đổi."""
+    present = ~(np.isnan(x) | np.isnan(y))
+    g, x, y = group[present], x[present], y[present]
+
+    def total(weights):
+        return np.bincount(g, weights=weights, minlength=groups)
+
+    n = np.bincount(g, minlength=groups).astype(np.float64)
+    sx, sy = total(x), total(y)
+    cov = n * total(x * y) - sx * sy
+    denominator = np.sqrt(np.clip(n * total(x * x) - sx * sx, 0, None) * np.clip(n * total(y * y) - sy * sy, 0, None))
+    r = _divide(cov, denominator)
+    r[n < 3] = np.nan
+    return r
+
+
+def correlation_matrix(scores: Dict[str, "np.ndarray"]) -> "np.ndarray":
+    """Ma trận Pearson giữa các FIELDS, trên các dòng có đủ điểm."""
+    table = np.vstack([scores[field] for field in FIELDS])
+    complete = table[:, ~np.isnan(table).any(axis=0)]
+    if complete.shape[1] < 3:
+        return np.full((len(FIELDS), len(FIELDS)), np.nan)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.corrcoef(complete)
+
+
+# =========================
+# BÁO CÁO
+# =========================
+def _num(value) -> Optional[float]:
+    value = float(value)
+    return None if np.isnan(value) else round(value, _DECIMALS)
+
+
+def _nums(values: "np.ndarray") -> List[Optional[float]]:
+    """Như _num cho cả mảng (làm tròn một lần, không gọi hàm cho từng phần tử)."""
+    rounded = np.round(values, _DECIMALS).astype(object)
+    rounded[np.isnan(values)] = None
+    return rounded.tolist()
+
+
+def _distribution_rows(dist: Dict[str, Any]) -> List[Dict[str, Any]]:
+    columns = {key: _nums(dist[key]) for key in ("mean", "std", "min", "max", "pass_rate")}
+    percentiles = {f"p{q}": _nums(values) for q, values in dist["percentiles"].items()}
+    return [
+        {
+            "count": count,
+            **{key: values[i] for key, values in columns.items()},
+            "percentiles": {name: values[i] for name, values in percentiles.items()},
+            "histogram": histogram,
+            "bands": dict(zip(BANDS_ASCENDING, bands)),
+        }
+        for i, (count, histogram, bands) in enumerate(zip(
+            dist["count"].tolist(), dist["histogram"].tolist(), dist["bands"].tolist()))
+    ]
+
+
+def build_report(data: TermData) -> Dict[str, Any]:
+    groups = len(data.class_ids)
+    weighted = data.scores["weighted"]
+    rows = np.bincount(data.group, minlength=groups)
+
+    per_class = group_distribution(data.group, weighted, groups)
+    term = group_distribution(np.zeros(len(weighted), dtype=np.int64), weighted, 1)
+    component_means = {
+        field: _nums(_mean_std(group_moments(data.group, data.scores[field], groups))[0])
+        for field in grade_aggregates.COMPONENTS
+    }
+    attendance_final = _nums(group_correlation(data.group, data.scores["attendance"], data.scores["final"], groups))
+
+    teacher_ids = [[] for _ in range(groups)]
+    for t, c in data.pairs.tolist():
+        teacher_ids[c].append(data.teachers[t][0])
+
+    classes = [
+        {
+            "class_id": class_id,
+            "class_name": data.class_names[i],
+            "teacher_ids": teacher_ids[i],
+            "students": students,                                       # có ít nhất 1 điểm thành phần
+            **distribution,
+            "component_means": {field: means[i] for field, means in component_means.items()},
+            "attendance_final_r": attendance_final[i],
+        }
+        for i, (class_id, students, distribution) in enumerate(zip(
+            data.class_ids.tolist(), rows.tolist(), _distribution_rows(per_class)))
+    ]
+
+    # Giảng viên: cộng moments của các lớp mình dạy (mỗi phân công một lần)
+    class_moments = group_moments(data.group, weighted, groups)
+    teacher_count = len(data.teachers)
+    t, c = data.pairs[:, 0], data.pairs[:, 1]
+    teacher_moments = {
+        key: np.bincount(t, weights=values[c], minlength=teacher_count) for key, values in class_moments.items()
+    }
+    teacher_mean, teacher_std = _mean_std(teacher_moments)
+    columns = {
+        "classes": np.bincount(t, minlength=teacher_count).tolist(),
+        "graded": teacher_moments["count"].astype(np.int64).tolist(),
+        "mean": _nums(teacher_mean),
+        "std": _nums(teacher_std),
+        "pass_rate": _nums(_divide(teacher_moments["passed"], teacher_moments["count"])),
+        "mean_vs_term": _nums(teacher_mean - term["mean"][0]),
+    }
+    teachers = sorted((
+        {"teacher_id": teacher_id, "name": name, **{key: values[i] for key, values in columns.items()}}
+        for i, (teacher_id, name) in enumerate(data.teachers)
+    ), key=lambda row: (row["mean"] is None, -(row["mean"] or 0), row["teacher_id"]))
+
+    matrix = correlation_matrix(data.scores)
+    return {
+        "classes_count": groups,
+        "histogram_edges": list(range(HISTOGRAM_BINS + 1)),
+        "pass_score": PASS_SCORE,
+        "term": {"students": int(len(weighted)), **_distribution_rows(term)[0]},
+        "components": {
+            "means": {field: _num(np.nanmean(data.scores[field])) if np.any(~np.isnan(data.scores[field]))
+                      else None for field in FIELDS},
+            "correlation": {a: {b: _num(matrix[i, j]) for j, b in enumerate(FIELDS)} for i, a in enumerate(FIELDS)},
+        },
+        "classes": classes,
+        "teachers": teachers,
+    }
+
+
+def term_report(db: Session, year: int, semester: int, version: Optional[TermVersion] = None) -> Dict[str, Any]:
+    """Báo cáo của học kỳ, cache theo term_version()."""
+    version = version or term_version(db, year, semester)
+    key = ("term", year, semester, version)
+    report = cache.analytics_cache.get(key)
+    if report is None:
+        report = {"year": year, "semester": semester, **build_report(load_term(db, year, semester))}
+        cache.analytics_cache.set(key, report)
+    return report
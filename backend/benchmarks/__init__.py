@@ -0,0 +1 @@
+# Các script đo hiệu năng, chạy bằng: python -m backend.benchmarks.<tên_script>
@@ -0,0 +1,124 @@
+"""
+Thời gian tính báo cáo thống kê học kỳ (analytics.term_report) trên ~1 triệu điểm.
+
+Dữ liệu sinh bằng db/synthetic_data (`--students` sinh viên x 5 lớp x 3 điểm thành
+phần), sau đó mọi lớp được gộp vào một học kỳ để báo cáo phải đọc toàn bộ điểm.
+Đo `--runs` lần:
+  cold      term_report() khi process chưa đọc học kỳ này (cache trống): 1 câu
+            truy vấn student_class_results -> mảng NumPy, rồi build_report()
+  edit      term_report() sau khi một giảng viên sửa điểm một lớp
+            (teacher_crud.save_grades): chỉ đọc lại lớp đó, tính lại báo cáo
+  cached    term_report() khi báo cáo của version hiện tại đã có trong cache
+Kiểm tra (❌ -> exit 1): p50 của edit dưới `--max-ms`, p50 của cold dưới
+`--max-cold-ms`, số liệu của `--verify` lớp đầu khớp với np.percentile /
+np.corrcoef tính riêng từng lớp từ cột weighted trong DB (cả các lớp vừa sửa).
+
+Chạy: python -m backend.benchmarks.analytics_load --students 66667 --max-ms 1000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from .. import analytics, cache
+from ..db import database, models, synthetic_data, teacher_crud
+
+YEAR, SEMESTER = synthetic_data.TERMS[0]
+
+
+def check(ok: bool, message: str) -> bool:
+    print(f"{'✅' if ok else '❌'} {message}")
+    return ok
+
+
+def verify(db, report, class_ids: set) -> bool:
+    """So sánh với cách tính trực tiếp trên từng lớp."""
+    fields = ("attendance", "final", "weighted")
+    for row in (row for row in report["classes"] if row["class_id"] in class_ids):
+        values = np.array(
+            db.query(*(getattr(models.StudentClassResult, f) for f in fields))
+            .filter(models.StudentClassResult.class_id == row["class_id"]).all(), dtype=float)
+        weighted = values[:, 2][~np.isnan(values[:, 2])]
+        expected = {"mean": weighted.mean(), "std": weighted.std(), "min": weighted.min(), "max": weighted.max(),
+                    "pass_rate": (weighted >= analytics.PASS_SCORE).mean(),
+                    "attendance_final_r": np.corrcoef(values[:, 0], values[:, 1])[0, 1],
+                    **{f"p{q}": np.percentile(weighted, q) for q in analytics.PERCENTILES}}
+        got = {**row, **row["percentiles"]}
+        wrong = [k for k, v in expected.items() if abs(v - got[k]) > 10 ** -analytics._DECIMALS]
+        histogram = np.histogram(weighted, bins=report["histogram_edges"])[0].tolist()
+        if wrong or histogram != row["histogram"]:
+            print(f"   lớp {row['class_id']}: lệch {wrong or 'histogram'}")
+            return False
+    return True
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, default=66667, help="x 5 lớp x 3 điểm = số điểm")
+    parser.add_argument("--teachers", type=int, default=1000)
+    parser.add_argument("--classes", type=int, default=2500)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--verify", type=int, default=20, help="số lớp kiểm tra lại")
+    parser.add_argument("--max-ms", type=float, default=1000, help="sau khi sửa điểm")
+    parser.add_argument("--max-cold-ms", type=float, default=2000, help="lần đầu trong process")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = database.make_engine(f"sqlite:///{os.path.join(tmp, 'analytics.db')}")
+        start = time.perf_counter()
+        layout, counts = synthetic_data.generate(engine, args.students, args.teachers, args.classes,
+                                                 password_hash="x")
+        with engine.begin() as conn:
+            conn.execute(update(models.Class).values(year=YEAR, semester=SEMESTER))
+        print(f"Sinh {counts['grades']:,d} điểm ({counts['student_class_results']:,d} dòng kết quả) "
+              f"trong {time.perf_counter() - start:.1f} s, tất cả thuộc học kỳ {SEMESTER}/{YEAR}")
+
+        def timed(name: str):
+            start = time.perf_counter()
+            report = analytics.term_report(db, YEAR, SEMESTER)
+            timings[name].append((time.perf_counter() - start) * 1000)
+            return report
+
+        timings = {"cold": [], "edit": [], "cached": []}
+        rnd = random.Random(1)
+        edited = set()
+        with Session(bind=engine) as db:
+            for _ in range(args.runs):
+                analytics._blocks.clear()
+                cache.analytics_cache.clear()
+                timed("cold")
+                timed("cached")
+
+                k = rnd.randrange(layout.classes)
+                student = rnd.choice(layout.class_students(k))
+                teacher_crud.save_grades(db, layout.class_id(k), [
+                    {"student_id": layout.student_id(student), "subject": "final", "score": round(rnd.uniform(0, 10), 1)}
+                ])
+                report = timed("edit")
+                edited.add(layout.class_id(k))
+
+            print(f"\n{report['classes_count']} lớp, {len(report['teachers'])} giảng viên, "
+                  f"{report['term']['count']:,d} điểm tổng kết")
+            for name, values in timings.items():
+                print(f"  {name:8s} p50={statistics.median(values):8.1f} ms  max={max(values):8.1f} ms")
+            print()
+            checked = {row["class_id"] for row in report["classes"][:args.verify]} | edited
+            ok = check(verify(db, report, checked),
+                       f"{len(checked)} lớp (có {len(edited)} lớp vừa sửa điểm) khớp với np.percentile / np.corrcoef")
+        engine.dispose()
+
+    for name, limit in (("edit", args.max_ms), ("cold", args.max_cold_ms)):
+        p50 = statistics.median(timings[name])
+        ok &= check(p50 < limit, f"{name}: p50 {p50:.0f} ms < {limit:.0f} ms")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
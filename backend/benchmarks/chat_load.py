@@ -0,0 +1,139 @@
+"""
+Load test: các endpoint khác có bị chậm khi chatbot đang chờ LLM không?
+
+1. Bật server LLM giả lập (stub_llm) trong thread riêng với độ trễ `--delay`.
+2. Đo độ trễ GET /api/check-auth khi không có chat nào (baseline).
+3. Gửi `--chats` tin nhắn chatbot đồng thời, trong lúc đó đo lại GET /api/check-auth.
+
+Nếu event loop bị chặn, p99 ở bước 3 sẽ xấp xỉ `--delay`.
+
+Chạy: python -m backend.benchmarks.chat_load --chats 20 --delay 2
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import threading
+import time
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    k = min(len(values) - 1, max(0, round(pct / 100 * (len(values) - 1))))
+    return values[k]
+
+
+def start_server(app, port: int):
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+def start_stub(port: int, delay: float):
+    from .stub_llm import create_app
+
+    return start_server(create_app(delay), port)
+
+
+async def probe(client, path: str, count: int, interval: float, headers=None):
+    latencies = []
+    for _ in range(count):
+        start = time.perf_counter()
+        res = await client.get(path, headers=headers)
+        latencies.append((time.perf_counter() - start) * 1000)
+        assert res.status_code == 200, res.status_code
+        await asyncio.sleep(interval)
+    return latencies
+
+
+def summary(label, latencies):
+    print(f"{label:28s} n={len(latencies):3d}  p50={percentile(latencies, 50):8.2f} ms  "
+          f"p99={percentile(latencies, 99):8.2f} ms  max={max(latencies):8.2f} ms")
+
+
+def prepare_app():
+    """Trỏ app sang DB SQLite in-memory có sẵn 1 sinh viên. Trả về (app, token)."""
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from sqlalchemy.pool import StaticPool
+
+    from ..main import app
+    from ..db import database, models
+    from ..routers import jwt_auth
+
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    models.Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine, autoflush=False)
+
+    def get_test_db():
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[database.get_db] = get_test_db
+    with Session() as db:
+        user = models.User(username="loadtest", password="x", full_name="Load Test", role=models.UserRole.student)
+        db.add(user)
+        db.flush()
+        db.add(models.Student(student_id=user.user_id, student_code="LT0001"))
+        db.commit()
+        token = jwt_auth.create_token({"username": user.username, "id": user.user_id, "role": "student"})
+    return app, token
+
+
+def configure_gateway(port: int, concurrency: int):
+    # Cấu hình gateway trỏ về stub trước khi import app
+    os.environ["OLLAMA_URL"] = f"http://127.0.0.1:{port}"
+    os.environ["USE_GEMINI"] = "False"
+    os.environ.setdefault("OLLAMA_MAX_CONCURRENCY", str(concurrency))
+
+
+async def run(args):
+    import httpx
+
+    app, token = prepare_app()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=None) as client:
+        auth = {"Authorization": f"Bearer {token}"}
+        baseline = await probe(client, "/api/check-auth", args.probes, 0.01, auth)
+
+        async def chat():
+            start = time.perf_counter()
+            res = await client.post("/api/chatbot/chat", json={"message": "xin chào"}, headers=auth)
+            return (time.perf_counter() - start) * 1000, res.json().get("response", "")
+
+        chats = [asyncio.create_task(chat()) for _ in range(args.chats)]
+        await asyncio.sleep(0.1)
+        loaded = await probe(client, "/api/check-auth", args.probes, args.delay / args.probes, auth)
+        chat_results = await asyncio.gather(*chats)
+
+    summary("GET /api/check-auth (idle)", baseline)
+    summary(f"GET /api/check-auth ({args.chats} chats)", loaded)
+    summary("POST /api/chatbot/chat", [ms for ms, _ in chat_results])
+    print(f"Câu trả lời mẫu: {chat_results[0][1][:60]!r}")
+    print(f"Trung vị chat: {statistics.median(ms for ms, _ in chat_results) / 1000:.2f}s (stub delay {args.delay}s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chats", type=int, default=20)
+    parser.add_argument("--delay", type=float, default=2.0)
+    parser.add_argument("--probes", type=int, default=50)
+    parser.add_argument("--port", type=int, default=11435)
+    args = parser.parse_args()
+
+    configure_gateway(args.port, args.chats)
+    start_stub(args.port, args.delay)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
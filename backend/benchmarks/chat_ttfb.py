@@ -0,0 +1,62 @@
+"""
+Benchmark time-to-first-byte: POST /api/chatbot/chat so với /api/chatbot/chat/stream.
+
+Chạy app thật bằng uvicorn (để response được stream qua socket), LLM là stub_llm
+với độ trễ `--delay`. Đo cả câu hỏi gửi AI và câu hỏi theo ý định (xem điểm).
+
+Chạy: python -m backend.benchmarks.chat_ttfb --delay 2 --runs 5
+"""
+import argparse
+import asyncio
+import time
+
+from .chat_load import configure_gateway, percentile, prepare_app, start_server, start_stub
+
+MESSAGES = {
+    "AI": "xin chào",
+    "intent": "xem điểm của tôi",
+}
+
+
+async def measure(client, path: str, message: str, headers):
+    start = time.perf_counter()
+    ttfb = None
+    async with client.stream("POST", path, json={"message": message}, headers=headers) as res:
+        async for chunk in res.aiter_bytes():
+            if ttfb is None and chunk:
+                ttfb = time.perf_counter() - start
+    total = time.perf_counter() - start
+    return ttfb * 1000, total * 1000
+
+
+async def run(args, token):
+    import httpx
+
+    headers = {"Authorization": f"Bearer {token}"}
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.app_port}", timeout=None) as client:
+        for kind, message in MESSAGES.items():
+            for path in ("/api/chatbot/chat", "/api/chatbot/chat/stream"):
+                results = [await measure(client, path, message, headers) for _ in range(args.runs)]
+                ttfb = [r[0] for r in results]
+                total = [r[1] for r in results]
+                print(f"{kind:7s} {path:28s} TTFB p50={percentile(ttfb, 50):8.1f} ms  "
+                      f"total p50={percentile(total, 50):8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--delay", type=float, default=2.0)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--port", type=int, default=11435, help="cổng stub LLM")
+    parser.add_argument("--app-port", type=int, default=18000, help="cổng app")
+    args = parser.parse_args()
+
+    configure_gateway(args.port, 4)
+    start_stub(args.port, args.delay)
+    app, token = prepare_app()
+    start_server(app, args.app_port)
+    asyncio.run(run(args, token))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""
+Xóa / lưu trữ một lớp lớn (mặc định 2000 sinh viên) trong lúc giảng viên khác ghi điểm.
+
+Dữ liệu sinh bằng db/synthetic_data (`--students` sinh viên, `--classes` lớp,
+mỗi sinh viên 5 lớp -> mỗi lớp students * 5 / classes sinh viên, có đủ điểm).
+`--writers` luồng ghi điểm (teacher_crud.save_grades) vào các lớp khác chạy liên
+tục; giữa chừng, một lớp lớn bị xử lý theo từng chế độ:
+
+  explicit   cách cũ: DELETE từng bảng con (enrollment, phân công, mã, điểm,
+             tổng hợp) rồi xóa lớp
+  cascade    teacher_crud.delete_class: một câu DELETE, DB xóa bảng con
+  archive    teacher_crud.archive_class: INSERT ... SELECT sang archived_* rồi xóa
+  restore    teacher_crud.restore_class của bản vừa lưu trữ
+
+In thời gian thao tác và độ trễ ghi điểm của các request chồng lên thao tác đó.
+Kiểm tra (❌ -> exit 1): không còn dòng con sau khi xóa, bản lưu trữ / khôi phục
+đủ ghi danh, điểm và thống kê lớp, không request ghi điểm nào lỗi.
+
+Chạy: python -m backend.benchmarks.class_delete --students 10000 --classes 25
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from typing import Callable, Dict, List
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session, sessionmaker
+
+from ..db import database, grade_aggregates, migrations, models, synthetic_data, teacher_crud
+from .chat_load import percentile
+
+CHILDREN = (models.Enrollment, models.TeachingAssignment, models.JoinCode, models.Grade,
+            models.StudentClassResult, models.ClassGradeSummary)
+
+
+def check(ok: bool, message: str) -> bool:
+    print(f"{'✅' if ok else '❌'} {message}")
+    return ok
+
+
+def count(db: Session, model, **criteria) -> int:
+    query = select(func.count()).select_from(model)
+    for column, value in criteria.items():
+        query = query.where(getattr(model, column) == value)
+    return db.execute(query).scalar()
+
+
+def explicit_delete(db: Session, class_id: int):
+    """Cách xóa trước khi có ON DELETE CASCADE (để so sánh)."""
+    for model in CHILDREN:
+        db.query(model).filter(model.class_id == class_id).delete(synchronize_session=False)
+    db.query(models.Class).filter(models.Class.class_id == class_id).delete(synchronize_session=False)
+    db.commit()
+
+
+def run_with_writers(Session, layout, busy: set, writers: int, operation: Callable[[Session], object]) -> Dict:
+    """Chạy operation trong khi `writers` luồng ghi điểm vào các lớp không thuộc `busy`."""
+    stop = threading.Event()
+    saves: List[tuple] = []  # (bắt đầu, kết thúc)
+    errors = []
+    lock = threading.Lock()
+    others = [k for k in range(layout.classes) if k not in busy]
+
+    def writer(seed: int):
+        rnd = random.Random(seed)
+        with Session() as db:
+            while not stop.is_set():
+                k = rnd.choice(others)
+                student = rnd.choice(layout.class_students(k))
+                grades = [{"student_id": layout.student_id(student), "subject": s,
+                           "score": round(rnd.uniform(0, 10), 1)} for s in ("attendance", "mid", "final")]
+                start = time.perf_counter()
+                try:
+                    teacher_crud.save_grades(db, layout.class_id(k), grades)
+                except Exception as e:
+                    db.rollback()
+                    with lock:
+                        errors.append(repr(e))
+                    continue
+                with lock:
+                    saves.append((start, time.perf_counter()))
+
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+    for t in threads:
+        t.start()
+    time.sleep(0.5)
+    with Session() as db:
+        op_start = time.perf_counter()
+        result = operation(db)
+        op_end = time.perf_counter()
+    time.sleep(0.2)
+    stop.set()
+    for t in threads:
+        t.join()
+
+    during = [(end - start) * 1000 for start, end in saves if end >= op_start and start <= op_end]
+    return {"result": result, "op_ms": (op_end - op_start) * 1000, "saves": len(during),
+            "p50": percentile(during, 50) if during else 0.0, "max": max(during, default=0.0),
+            "errors": errors}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, default=10000)
+    parser.add_argument("--teachers", type=int, default=25)
+    parser.add_argument("--classes", type=int, default=25)
+    parser.add_argument("--writers", type=int, default=2)
+    args = parser.parse_args()
+
+    ok = True
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = database.make_engine(f"sqlite:///{os.path.join(tmp, 'class_delete.db')}")
+        start = time.perf_counter()
+        layout, _ = synthetic_data.generate(engine, args.students, args.teachers, args.classes)
+        migrations.prepare_database(engine)
+        print(f"Sinh dữ liệu trong {time.perf_counter() - start:.1f} s, "
+              f"mỗi lớp {len(layout.class_students(0))} sinh viên")
+        Session = sessionmaker(bind=engine, autoflush=False)
+        busy = {0, 1, 2}
+        explicit_id, cascade_id, archive_id = (layout.class_id(k) for k in sorted(busy))
+
+        with Session() as db:
+            before = {"enrollments": count(db, models.Enrollment, class_id=archive_id),
+                      "grades": count(db, models.Grade, class_id=archive_id)}
+            summary_before = grade_aggregates.summary_dict(db.get(models.ClassGradeSummary, archive_id))
+
+        runs = {
+            "explicit": run_with_writers(Session, layout, busy, args.writers,
+                                         lambda db: explicit_delete(db, explicit_id)),
+            "cascade": run_with_writers(Session, layout, busy, args.writers,
+                                        lambda db: teacher_crud.delete_class(db, cascade_id)),
+            "archive": run_with_writers(Session, layout, busy, args.writers,
+                                        lambda db: teacher_crud.archive_class(db, archive_id, 0)[0]),
+        }
+        archived = runs["archive"]["result"]
+        runs["restore"] = run_with_writers(
+            Session, layout, busy, args.writers,
+            lambda db: teacher_crud.restore_class(db, db.get(models.ArchivedClass, archived))[0])
+        restored_id = runs["restore"]["result"]
+
+        print(f"\n{'':10s} {'thao tác':>10s}   ghi điểm đồng thời ({args.writers} luồng)")
+        for name, r in runs.items():
+            print(f"{name:10s} {r['op_ms']:8.1f} ms   {r['saves']:4d} request  p50={r['p50']:7.1f}  "
+                  f"max={r['max']:7.1f} ms  lỗi {len(r['errors'])}")
+        print()
+
+        with Session() as db:
+            for name, class_id in (("explicit", explicit_id), ("cascade", cascade_id)):
+                left = sum(count(db, model, class_id=class_id) for model in CHILDREN)
+                ok &= check(left == 0 and db.get(models.Class, class_id) is None,
+                            f"{name}: lớp và mọi dòng con đã bị xóa (còn {left})")
+            ok &= check(not db.query(models.ArchivedClass).filter_by(archive_id=archived).count(),
+                        "restore: bản lưu trữ đã được xóa sau khi khôi phục")
+            after = {"enrollments": count(db, models.Enrollment, class_id=restored_id),
+                     "grades": count(db, models.Grade, class_id=restored_id)}
+            ok &= check(after == before, f"archive -> restore: {after} (trước khi lưu trữ {before})")
+            summary_after = grade_aggregates.summary_dict(db.get(models.ClassGradeSummary, restored_id))
+            ok &= check(count(db, models.StudentClassResult, class_id=restored_id) == before["enrollments"]
+                        and summary_after == summary_before,
+                        f"restore: điểm tổng kết và thống kê lớp như trước khi lưu trữ {summary_after['bands']}")
+        errors = [e for r in runs.values() for e in r["errors"]]
+        ok &= check(not errors, f"ghi điểm đồng thời: {len(errors)} lỗi {errors[:1]}")
+        engine.dispose()
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
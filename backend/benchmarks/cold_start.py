@@ -0,0 +1,197 @@
+"""
+Đo cold start: từ lúc tiến trình Python mới được tạo tới response đầu tiên.
+
+Mỗi lần đo chạy một tiến trình con (DATABASE_URL = `--url`) và ghi lại:
+  import          import backend.main (không chạm DB, không import SDK LLM)
+  startup         lifespan của app (migrations.prepare_database khi AUTO_MIGRATE)
+  first_request   GET /api/check-auth đầu tiên (không token, không truy vấn DB)
+  first_api       POST /api/login đầu tiên (truy vấn DB)
+  total           từ lúc tạo tiến trình tới khi có first_api (gồm khởi động interpreter)
+Đồng thời kiểm tra các module nạp lười (LAZY_MODULES) chưa bị import sau khi
+import app; nếu có -> ❌.
+
+`--profile` in thêm bảng thời gian import theo package (python -X importtime).
+
+Chạy: python -m backend.benchmarks.cold_start --runs 5 --profile
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List
+
+from .chat_load import percentile
+
+ROOT = Path(__file__).resolve().parents[2]
+
+# Chỉ được import khi dùng tới (chatbot gọi LLM lần đầu, xem thống kê lần đầu)
+LAZY_MODULES = ("google.generativeai", "httpx", "numpy")
+
+PHASES = ("import", "startup", "first_request", "first_api")
+
+# Chạy trong tiến trình con; in 1 dòng JSON: mốc thời gian (time.time()) của từng bước
+CHILD = r"""
+import asyncio, json, sys, time
+marks = {"start": time.time()}
+import backend.main as main
+marks["import"] = time.time()
+lazy_loaded = [m for m in json.loads(sys.argv[1]) if m in sys.modules]
+
+async def first_requests():
+    async with main.app.router.lifespan_context(main.app):
+        marks["startup"] = time.time()
+        import httpx
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://cold") as client:
+            first = await client.get("/api/check-auth")
+            marks["first_request"] = time.time()
+            api = await client.post("/api/login", json={"username": "cold-start", "password": "x"})
+            marks["first_api"] = time.time()
+    return [first.status_code, api.status_code]
+
+statuses = asyncio.run(first_requests())
+print(json.dumps({"marks": marks, "statuses": statuses, "lazy_loaded": lazy_loaded}))
+"""
+
+
+def child_env(url: str) -> Dict[str, str]:
+    path = os.pathsep.join(p for p in (str(ROOT), os.environ.get("PYTHONPATH", "")) if p)
+    return {**os.environ, "DATABASE_URL": url, "PYTHONPATH": path, "LOG_LEVEL": "ERROR"}
+
+
+def run_once(url: str) -> Dict:
+    """Một lần cold start. Trả về {phase: ms tính từ lúc tạo tiến trình, ...}."""
+    spawned = time.time()
+    proc = subprocess.run([sys.executable, "-c", CHILD, json.dumps(LAZY_MODULES)], cwd=ROOT,
+                          env=child_env(url), capture_output=True, text=True)
+    if proc.returncode != 0:
+        return {"error": proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else str(proc.returncode)}
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    marks = result["marks"]
+    timings = {"interpreter": (marks["start"] - spawned) * 1000}
+    previous = marks["start"]
+    for phase in PHASES:
+        timings[phase] = (marks[phase] - previous) * 1000
+        previous = marks[phase]
+    timings["total"] = (marks["first_api"] - spawned) * 1000
+    return {"timings": timings, "statuses": result["statuses"], "lazy_loaded": result["lazy_loaded"]}
+
+
+def measure(url: str, runs: int) -> Dict:
+    """
+    `runs` lần cold start liên tiếp. Kết quả cùng dạng với một luồng của suite
+    (p50 / p95 / ... của total) kèm trung vị từng bước.
+    """
+    totals: List[float] = []
+    phases: Dict[str, List[float]] = defaultdict(list)
+    error_codes: Dict[str, int] = {}
+    lazy_loaded = set()
+    for _ in range(runs):
+        r = run_once(url)
+        if "error" in r:
+            error_codes[r["error"]] = error_codes.get(r["error"], 0) + 1
+            continue
+        if any(code >= 500 for code in r["statuses"]):
+            key = str(max(r["statuses"]))
+            error_codes[key] = error_codes.get(key, 0) + 1
+        lazy_loaded.update(r["lazy_loaded"])
+        totals.append(r["timings"]["total"])
+        for phase, ms in r["timings"].items():
+            phases[phase].append(ms)
+    if lazy_loaded:
+        error_codes["lazy_module_imported"] = runs
+    result = {"requests": runs, "errors": sum(error_codes.values()), "error_codes": error_codes,
+              "lazy_loaded": sorted(lazy_loaded)}
+    if totals:
+        result.update({
+            "mean_ms": round(sum(totals) / len(totals), 2),
+            "p50_ms": round(percentile(totals, 50), 2),
+            "p95_ms": round(percentile(totals, 95), 2),
+            "p99_ms": round(percentile(totals, 99), 2),
+            "max_ms": round(max(totals), 2),
+            "phases_p50_ms": {phase: round(statistics.median(v), 2) for phase, v in phases.items()},
+        })
+    return result
+
+
+def import_profile(top: int = 15) -> Dict[str, float]:
+    """
+    Thời gian import backend.main theo package (tổng thời gian "self" của
+    python -X importtime). Module của app tách theo backend.<module>.
+    """
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", "import backend.main"], cwd=ROOT,
+                          env=child_env(os.environ.get("DATABASE_URL", "sqlite://")),
+                          capture_output=True, text=True, check=True)
+    by_package: Dict[str, float] = defaultdict(float)
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        own, _, name = line[len("import time:"):].split("|")
+        if not own.strip().isdigit():
+            continue  # dòng tiêu đề
+        parts = name.strip().split(".")
+        package = ".".join(parts[:2]) if parts[0] == "backend" else parts[0]
+        by_package[package] += int(own) / 1000
+    ranked = sorted(by_package.items(), key=lambda kv: kv[1], reverse=True)
+    return {name: round(ms, 1) for name, ms in ranked[:top]}
+
+
+def print_summary(result: Dict, file=None):
+    file = file or sys.stdout
+    if "p50_ms" not in result:
+        print(f"❌ cold start lỗi: {result['error_codes']}", file=file)
+        return
+    phases = result["phases_p50_ms"]
+    print(f"cold start ({result['requests']} lần)  p50={result['p50_ms']:.0f} ms  "
+          f"p95={result['p95_ms']:.0f} ms  max={result['max_ms']:.0f} ms", file=file)
+    for phase in ("interpreter",) + PHASES:
+        print(f"  {phase:12s} {phases[phase]:8.1f} ms", file=file)
+    if result["lazy_loaded"]:
+        print(f"❌ import lúc khởi động: {', '.join(result['lazy_loaded'])}", file=file)
+    else:
+        print(f"✅ không import lúc khởi động: {', '.join(LAZY_MODULES)}", file=file)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=None, help="DB dùng khi khởi động (mặc định: SQLite tạm đã tạo bảng)")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--profile", action="store_true", help="in thời gian import theo package")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--max-ms", type=float, default=0, help="p50 tối đa của total (0 = không kiểm tra)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = args.url or f"sqlite:///{os.path.join(tmp, 'cold_start.db')}"
+        if not args.url:
+            # DB đã có bảng: đo lần khởi động lại thường gặp, không phải lần deploy đầu
+            from ..db import database, migrations
+
+            engine = database.make_engine(url)
+            migrations.prepare_database(engine)
+            engine.dispose()
+        result = measure(url, args.runs)
+
+    print_summary(result)
+    if args.profile:
+        profile = import_profile(args.top)
+        total = sum(profile.values())
+        print(f"\nimport backend.main theo package (top {args.top}, {total:.0f} ms):")
+        for name, ms in profile.items():
+            print(f"  {name:32s} {ms:8.1f} ms")
+
+    ok = not result["errors"]
+    if args.max_ms and result.get("p50_ms", float("inf")) > args.max_ms:
+        print(f"❌ p50 {result.get('p50_ms')} ms > {args.max_ms} ms")
+        ok = False
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
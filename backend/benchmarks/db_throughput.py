@@ -0,0 +1,130 @@
+"""
+So sánh thông lượng đọc/ghi đồng thời giữa các cấu hình DB.
+
+`--readers` luồng đọc chi tiết lớp (teacher_crud.get_class_detail) và `--writers`
+luồng ghi điểm (teacher_crud.save_grades, mỗi lần 1 commit) chạy song song trong
+`--seconds` giây trên cùng 1 DB. Các chế độ:
+
+- sqlite-default: journal_mode=DELETE, synchronous=FULL (giống engine cũ)
+- sqlite-wal:     cấu hình mặc định của backend/db/database.py
+- postgres:       chỉ chạy khi có `--postgres-url`
+
+Chạy: python -m backend.benchmarks.db_throughput --readers 8 --writers 2 --seconds 5
+"""
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+
+from sqlalchemy import insert
+from sqlalchemy.orm import sessionmaker
+
+from ..db import database, models, teacher_crud
+from .chat_load import percentile
+
+CLASSES = 20
+STUDENTS_PER_CLASS = 40
+
+
+def seed(engine):
+    models.Base.metadata.drop_all(bind=engine)
+    models.Base.metadata.create_all(bind=engine)
+    students = CLASSES * STUDENTS_PER_CLASS
+    with engine.begin() as conn:
+        conn.execute(insert(models.User), [
+            {"user_id": i, "username": f"sv{i}", "password": "x", "full_name": f"Sinh viên {i}",
+             "role": models.UserRole.student} for i in range(1, students + 1)
+        ])
+        conn.execute(insert(models.Student), [{"student_id": i, "student_code": f"SV{i:06d}"}
+                                              for i in range(1, students + 1)])
+        conn.execute(insert(models.Class), [{"class_id": c, "class_name": f"Lớp {c}", "year": 2025, "semester": 1}
+                                            for c in range(1, CLASSES + 1)])
+        conn.execute(insert(models.Enrollment), [
+            {"student_id": (c - 1) * STUDENTS_PER_CLASS + k, "class_id": c}
+            for c in range(1, CLASSES + 1) for k in range(1, STUDENTS_PER_CLASS + 1)
+        ])
+
+
+def run_mode(name: str, engine, args):
+    seed(engine)
+    Session = sessionmaker(bind=engine, autoflush=False)
+    stop = threading.Event()
+    stats = {"read": [], "write": [], "errors": 0}
+    lock = threading.Lock()
+
+    def record(kind, start, ok):
+        with lock:
+            if ok:
+                stats[kind].append(time.perf_counter() - start)
+            else:
+                stats["errors"] += 1
+
+    def reader():
+        with Session() as db:
+            while not stop.is_set():
+                start = time.perf_counter()
+                try:
+                    teacher_crud.get_class_detail(db, random.randint(1, CLASSES))
+                    db.rollback()
+                    ok = True
+                except Exception:
+                    db.rollback()
+                    ok = False
+                record("read", start, ok)
+
+    def writer():
+        with Session() as db:
+            while not stop.is_set():
+                class_id = random.randint(1, CLASSES)
+                student_id = (class_id - 1) * STUDENTS_PER_CLASS + random.randint(1, STUDENTS_PER_CLASS)
+                grades = [{"student_id": student_id, "subject": s, "score": round(random.uniform(0, 10), 1)}
+                          for s in ("attendance", "mid", "final")]
+                start = time.perf_counter()
+                try:
+                    teacher_crud.save_grades(db, class_id, grades)
+                    ok = True
+                except Exception:
+                    db.rollback()
+                    ok = False
+                record("write", start, ok)
+
+    threads = [threading.Thread(target=reader) for _ in range(args.readers)]
+    threads += [threading.Thread(target=writer) for _ in range(args.writers)]
+    for t in threads:
+        t.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    engine.dispose()
+
+    for kind in ("read", "write"):
+        ms = [v * 1000 for v in stats[kind]]
+        print(f"{name:15s} {kind:5s} {len(ms) / args.seconds:8.1f} ops/s  "
+              f"p50={percentile(ms, 50):7.2f} ms  p99={percentile(ms, 99):8.2f} ms")
+    print(f"{name:15s} errors {stats['errors']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--postgres-url", default=os.getenv("BENCH_POSTGRES_URL"))
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        legacy = database.make_engine(url, journal_mode="DELETE", synchronous="FULL",
+                                      mmap_size=0, cache_size=-2000)
+        run_mode("sqlite-default", legacy, args)
+        os.remove(os.path.join(tmp, "bench.db"))
+        run_mode("sqlite-wal", database.make_engine(url), args)
+    if args.postgres_url:
+        run_mode("postgres", database.make_engine(args.postgres_url), args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Đo bộ nhớ đỉnh (tracemalloc) của export CSV theo số dòng.
+
+Tạo DB SQLite tạm với 1 lớp gồm N sinh viên có đủ điểm, rồi tiêu thụ toàn bộ
+generator của export lớp (giống StreamingResponse). Bộ nhớ đỉnh phải gần như
+không đổi khi N tăng; thoát với mã 1 nếu tăng quá `--max-growth` lần.
+
+Chạy: python -m backend.benchmarks.export_memory --sizes 50 5000 500000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import Session
+
+from ..db import grade_aggregates, models
+from ..routers import teacher
+
+INSERT_BATCH = 10000
+
+
+def build_db(path: str, n: int):
+    engine = create_engine(f"sqlite:///{path}")
+    models.Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(insert(models.Class), [{"class_id": 1, "class_name": "Lớp export", "year": 2025, "semester": 1}])
+        for start in range(0, n, INSERT_BATCH):
+            ids = range(start + 1, min(start + INSERT_BATCH, n) + 1)
+            conn.execute(insert(models.User), [
+                {"user_id": i, "username": f"sv{i}", "password": "x", "full_name": f"Sinh viên {i}",
+                 "role": models.UserRole.student} for i in ids
+            ])
+            conn.execute(insert(models.Student), [{"student_id": i, "student_code": f"SV{i:07d}"} for i in ids])
+            conn.execute(insert(models.Enrollment), [{"student_id": i, "class_id": 1} for i in ids])
+            conn.execute(insert(models.StudentClassResult), [
+                {"student_id": i, "class_id": 1, "attendance": 8.0, "mid": 7.0, "final": 6.5,
+                 "weighted": grade_aggregates.weighted_average(8.0, 7.0, 6.5)} for i in ids
+            ])
+    return engine
+
+
+def measure(engine, class_id: int = 1):
+    with Session(bind=engine) as db:
+        body = teacher.stream_export(db, [models.Enrollment.class_id == class_id],
+                                     teacher.EXPORT_HEADER, teacher.class_csv_rows)
+        tracemalloc.start()
+        start = time.perf_counter()
+        first = None
+        size = 0
+        for chunk in body:
+            if first is None:
+                first = time.perf_counter() - start
+            size += len(chunk)
+        total = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return peak, size, first, total
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 5000, 100000])
+    parser.add_argument("--max-growth", type=float, default=3.0, help="tỉ lệ bộ nhớ đỉnh lớn nhất / nhỏ nhất cho phép")
+    args = parser.parse_args()
+
+    peaks = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in args.sizes:
+            engine = build_db(os.path.join(tmp, f"export_{n}.db"), n)
+            peak, size, first, total = measure(engine)
+            engine.dispose()
+            peaks.append(peak)
+            print(f"n={n:>8d}  csv={size / 1e6:8.2f} MB  peak={peak / 1e6:6.2f} MB  "
+                  f"first chunk={first * 1000:7.1f} ms  total={total * 1000:9.1f} ms")
+
+    growth = max(peaks) / min(peaks)
+    ok = growth <= args.max_growth
+    print(f"{'✅' if ok else '❌'} peak memory growth x{growth:.2f}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,77 @@
+"""
+Benchmark import danh sách sinh viên (POST /api/teacher/classes/{class_id}/import).
+
+Tạo DB SQLite tạm có sẵn `--existing` sinh viên, sinh file CSV N dòng (một nửa
+là sinh viên đã có, một nửa mới, kèm vài dòng lỗi / trùng), rồi chạy pipeline
+import: parse stream + bulk_add_students_to_class. In thời gian và số câu SQL.
+
+Chạy: python -m backend.benchmarks.import_roster --rows 10000
+"""
+import argparse
+import io
+import os
+import tempfile
+import time
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import Session
+
+from ..db import models, teacher_crud
+from ..routers import teacher
+from .query_counts import StatementCounter
+
+
+def build_db(path: str, existing: int):
+    engine = create_engine(f"sqlite:///{path}")
+    models.Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(insert(models.Class), [{"class_id": 1, "class_name": "Lớp import", "year": 2025, "semester": 1}])
+        if existing:
+            conn.execute(insert(models.User), [
+                {"user_id": i, "username": f"OLD{i:06d}", "password": "x", "full_name": f"Sinh viên {i}",
+                 "role": models.UserRole.student} for i in range(1, existing + 1)
+            ])
+            conn.execute(insert(models.Student), [
+                {"student_id": i, "student_code": f"OLD{i:06d}"} for i in range(1, existing + 1)
+            ])
+    return engine
+
+
+def build_csv(rows: int, existing: int) -> bytes:
+    out = io.StringIO()
+    out.write("STT,Họ và tên,Mã sinh viên\n")
+    for i in range(1, rows + 1):
+        if i % 1000 == 0:
+            out.write(f"{i},,\n")                                   # thiếu mã
+        elif i % 2 and existing:
+            out.write(f"{i},Sinh viên {i},OLD{(i % existing) + 1:06d}\n")
+        else:
+            out.write(f"{i},Nguyễn Văn {i},NEW{i:06d}\n")
+    return out.getvalue().encode("utf-8-sig")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--existing", type=int, default=3000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = build_db(os.path.join(tmp, "import.db"), args.existing)
+        payload = io.BytesIO(build_csv(args.rows, args.existing))
+        counter = StatementCounter(engine)
+        with Session(bind=engine, autoflush=False) as db:
+            start = time.perf_counter()
+            rows, errors, total = teacher.parse_roster(payload)
+            parsed = time.perf_counter() - start
+            added, import_errors = teacher_crud.bulk_add_students_to_class(db, 1, rows)
+            elapsed = time.perf_counter() - start
+        engine.dispose()
+
+    print(f"rows={total}  added={added}  errors={len(errors) + len(import_errors)}")
+    print(f"parse={parsed * 1000:.1f} ms  total={elapsed * 1000:.1f} ms  "
+          f"({total / elapsed:,.0f} rows/s)  sql statements={counter.count}")
+
+
+if __name__ == "__main__":
+    main()
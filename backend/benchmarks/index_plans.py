@@ -0,0 +1,122 @@
+"""
+Benchmark: query plan và thời gian của các truy vấn nóng trước/sau migration index.
+
+Tạo một DB SQLite tạm với schema cũ (không có index phụ), nạp N dòng điểm,
+in EXPLAIN QUERY PLAN + thời gian từng truy vấn, chạy migrations.apply_migrations
+rồi đo lại.
+
+Chạy: python -m backend.benchmarks.index_plans --rows 1000000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+
+from ..db import migrations
+
+# Schema trước khi có index phụ (giống bảng do create_all cũ tạo ra)
+LEGACY_SCHEMA = """
+CREATE TABLE classes (class_id INTEGER PRIMARY KEY, class_name VARCHAR NOT NULL,
+                      year INTEGER NOT NULL, semester INTEGER NOT NULL);
+CREATE TABLE enrollments (student_id INTEGER NOT NULL, class_id INTEGER NOT NULL, enroll_date DATE,
+                          PRIMARY KEY (student_id, class_id));
+CREATE TABLE teaching_assignments (teacher_id INTEGER NOT NULL, class_id INTEGER NOT NULL, assigned_date DATE,
+                                   PRIMARY KEY (teacher_id, class_id));
+CREATE TABLE grades (grade_id INTEGER PRIMARY KEY AUTOINCREMENT, student_id INTEGER NOT NULL,
+                     class_id INTEGER NOT NULL, subject VARCHAR NOT NULL, score FLOAT NOT NULL,
+                     updated_at DATETIME);
+"""
+
+SUBJECTS = ("attendance", "mid", "final")
+
+# (tên, SQL, tham số) — khớp với các truy vấn trong routers/teacher.py và db/crud.py
+HOT_QUERIES = [
+    ("teacher assignment check",
+     "SELECT * FROM teaching_assignments WHERE class_id = ? AND teacher_id = ?", (17, 3)),
+    ("class enrollment count",
+     "SELECT COUNT(*) FROM enrollments WHERE class_id = ?", (17,)),
+    ("class grades (get_class_detail)",
+     "SELECT * FROM grades WHERE class_id = ?", (17,)),
+    ("grade lookup (save_grades)",
+     "SELECT * FROM grades WHERE class_id = ? AND student_id = ? AND subject = ?", (17, 1234, "mid")),
+    ("student grades (get_student_grades)",
+     "SELECT * FROM grades WHERE student_id = ? AND class_id = ?", (1234, 17)),
+]
+
+
+def load_data(conn: sqlite3.Connection, rows: int, students_per_class: int = 100):
+    classes = max(1, rows // (students_per_class * len(SUBJECTS)))
+    rnd = random.Random(42)
+    conn.executemany("INSERT INTO classes VALUES (?, ?, 2025, 1)",
+                     ((c, f"Lớp {c}") for c in range(1, classes + 1)))
+    conn.executemany("INSERT INTO teaching_assignments VALUES (?, ?, NULL)",
+                     ((c % 50 + 1, c) for c in range(1, classes + 1)))
+
+    def enrollments():
+        for c in range(1, classes + 1):
+            for s in rnd.sample(range(1, classes * 10 + students_per_class), students_per_class):
+                yield s, c
+
+    pairs = list(enrollments())
+    conn.executemany("INSERT OR IGNORE INTO enrollments VALUES (?, ?, NULL)", pairs)
+
+    def grades():
+        n = 0
+        for s, c in pairs:
+            for subject in SUBJECTS:
+                if n >= rows:
+                    return
+                yield s, c, subject, round(rnd.uniform(0, 10), 1)
+                n += 1
+
+    conn.executemany("INSERT INTO grades (student_id, class_id, subject, score) VALUES (?, ?, ?, ?)", grades())
+    conn.commit()
+
+
+def measure(conn: sqlite3.Connection, label: str, repeat: int):
+    print(f"\n=== {label} ===")
+    for name, sql, params in HOT_QUERIES:
+        plan = " | ".join(row[-1] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params))
+        start = time.perf_counter()
+        for _ in range(repeat):
+            conn.execute(sql, params).fetchall()
+        ms = (time.perf_counter() - start) * 1000 / repeat
+        print(f"{name:40s} {ms:9.3f} ms  {plan}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000, help="số dòng điểm")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    try:
+        conn = sqlite3.connect(path)
+        conn.executescript(LEGACY_SCHEMA)
+        start = time.perf_counter()
+        load_data(conn, args.rows)
+        print(f"Đã nạp {args.rows} điểm trong {time.perf_counter() - start:.1f}s")
+        measure(conn, "TRƯỚC migration", args.repeat)
+
+        engine = create_engine(f"sqlite:///{path}")
+        start = time.perf_counter()
+        created = migrations.apply_migrations(engine)
+        engine.dispose()
+        print(f"\nĐã tạo {len(created)} index trong {time.perf_counter() - start:.1f}s: "
+              + ", ".join(spec.name for spec in created))
+
+        conn.execute("ANALYZE")
+        measure(conn, "SAU migration", args.repeat)
+        conn.close()
+    finally:
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
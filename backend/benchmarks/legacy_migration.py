@@ -0,0 +1,130 @@
+"""
+Nâng cấp một database tạo từ schema gốc (chưa có unique key điểm, chưa có ON
+DELETE CASCADE) có sẵn điểm trùng (class_id, student_id, subject).
+
+Hai đường nâng cấp, mỗi đường trên một bản DB riêng:
+  startup      migrations.prepare_database (lifespan của app)
+  migrations   migrations.apply_migrations (python -m backend.db.migrations)
+
+Kiểm tra (❌ -> exit 1): không lỗi, điểm trùng bị xóa (giữ bản mới nhất), có
+unique key của bảng grades và ON DELETE CASCADE, xóa lớp xóa luôn điểm, lớp tạo
+sau đó không dùng lại id của lớp đã xóa (AUTOINCREMENT, ETag theo (id, version)).
+
+Chạy: python -m backend.benchmarks.legacy_migration
+"""
+import os
+import sys
+import tempfile
+from typing import Callable
+
+from sqlalchemy import text
+
+from ..db import database, migrations
+
+# Schema của các bảng trước khi có migrations (bản đầu tiên của models.py)
+LEGACY_SCHEMA = """
+CREATE TABLE classes (
+    class_id INTEGER NOT NULL, class_name VARCHAR NOT NULL, year INTEGER NOT NULL, semester INTEGER NOT NULL,
+    PRIMARY KEY (class_id)
+);
+CREATE INDEX ix_classes_class_id ON classes (class_id);
+CREATE TABLE users (
+    user_id INTEGER NOT NULL, username VARCHAR NOT NULL, password VARCHAR NOT NULL, full_name VARCHAR,
+    email VARCHAR, role VARCHAR(7) NOT NULL,
+    PRIMARY KEY (user_id), UNIQUE (email)
+);
+CREATE UNIQUE INDEX ix_users_username ON users (username);
+CREATE TABLE join_codes (
+    code VARCHAR NOT NULL, class_id INTEGER NOT NULL,
+    PRIMARY KEY (code), FOREIGN KEY(class_id) REFERENCES classes (class_id)
+);
+CREATE TABLE students (
+    student_id INTEGER NOT NULL, student_code VARCHAR, birthdate DATE,
+    PRIMARY KEY (student_id), FOREIGN KEY(student_id) REFERENCES users (user_id), UNIQUE (student_code)
+);
+CREATE TABLE teachers (
+    teacher_id INTEGER NOT NULL, department VARCHAR, title VARCHAR,
+    PRIMARY KEY (teacher_id), FOREIGN KEY(teacher_id) REFERENCES users (user_id)
+);
+CREATE TABLE enrollments (
+    student_id INTEGER NOT NULL, class_id INTEGER NOT NULL, enroll_date DATE DEFAULT CURRENT_DATE,
+    PRIMARY KEY (student_id, class_id), FOREIGN KEY(student_id) REFERENCES students (student_id),
+    FOREIGN KEY(class_id) REFERENCES classes (class_id)
+);
+CREATE TABLE grades (
+    grade_id INTEGER NOT NULL, student_id INTEGER NOT NULL, class_id INTEGER NOT NULL, subject VARCHAR NOT NULL,
+    score FLOAT NOT NULL, updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (grade_id), FOREIGN KEY(student_id) REFERENCES students (student_id),
+    FOREIGN KEY(class_id) REFERENCES classes (class_id)
+);
+CREATE TABLE teaching_assignments (
+    teacher_id INTEGER NOT NULL, class_id INTEGER NOT NULL, assigned_date DATE DEFAULT CURRENT_DATE,
+    PRIMARY KEY (teacher_id, class_id), FOREIGN KEY(teacher_id) REFERENCES teachers (teacher_id),
+    FOREIGN KEY(class_id) REFERENCES classes (class_id)
+);
+INSERT INTO classes VALUES (1, 'Toán', 2024, 1);
+INSERT INTO users VALUES (1, 'gv', 'x', 'Giảng viên', NULL, 'teacher'), (2, 'sv', 'x', 'Sinh viên', NULL, 'student');
+INSERT INTO teachers VALUES (1, NULL, NULL);
+INSERT INTO students VALUES (2, 'SV2', NULL);
+INSERT INTO teaching_assignments (teacher_id, class_id) VALUES (1, 1);
+INSERT INTO enrollments (student_id, class_id) VALUES (2, 1);
+INSERT INTO grades (grade_id, student_id, class_id, subject, score) VALUES
+    (1, 2, 1, 'attendance', 8), (2, 2, 1, 'mid', 6), (3, 2, 1, 'final', 5), (4, 2, 1, 'final', 7);
+"""
+
+
+def check(ok: bool, message: str) -> bool:
+    print(f"{'✅' if ok else '❌'} {message}")
+    return ok
+
+
+def upgrade(path: str, name: str, step: Callable) -> bool:
+    engine = database.make_engine(f"sqlite:///{path}")
+    raw = engine.raw_connection()
+    try:
+        raw.driver_connection.executescript(LEGACY_SCHEMA)
+    finally:
+        raw.close()
+
+    try:
+        step(engine)
+    except Exception as e:
+        engine.dispose()
+        return check(False, f"{name}: {e!r}")
+
+    with engine.connect() as conn:
+        finals = conn.execute(text(
+            "SELECT grade_id, score FROM grades WHERE student_id = 2 AND class_id = 1 AND subject = 'final'"
+        )).all()
+        grades = conn.execute(text("SELECT count(*) FROM grades")).scalar()
+    ok = check(finals == [(4, 7.0)] and grades == 3, f"{name}: điểm trùng đã xóa, giữ bản mới nhất {finals}")
+    missing = [spec.name for spec in migrations.find_missing_indexes(engine) if spec.table == "grades" and spec.unique]
+    ok &= check(not missing, f"{name}: grades có unique key (thiếu {missing})")
+    cascades = migrations.find_missing_cascades(engine)
+    ok &= check(not cascades, f"{name}: đủ ON DELETE CASCADE (thiếu {len(cascades)})")
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM classes WHERE class_id = 1"))
+        left = conn.execute(text("SELECT count(*) FROM grades")).scalar()
+    ok &= check(left == 0, f"{name}: xóa lớp xóa luôn điểm (còn {left})")
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO classes (class_name, year, semester) VALUES ('Lý', 2024, 1)"))
+        new_id = conn.execute(text("SELECT MAX(class_id) FROM classes")).scalar()
+    ok &= check(new_id != 1, f"{name}: lớp mới không dùng lại id của lớp đã xóa (id {new_id})")
+    engine.dispose()
+    return ok
+
+
+def main() -> int:
+    def migrate(engine):
+        migrations.models.Base.metadata.create_all(bind=engine)
+        migrations.apply_migrations(engine)
+
+    ok = True
+    with tempfile.TemporaryDirectory() as tmp:
+        ok &= upgrade(os.path.join(tmp, "startup.db"), "startup", migrations.prepare_database)
+        ok &= upgrade(os.path.join(tmp, "migrations.db"), "migrations", migrate)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
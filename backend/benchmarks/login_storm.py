@@ -0,0 +1,99 @@
+"""
+Load test đầu kỳ: `--logins` sinh viên đăng nhập cùng lúc.
+
+Trong lúc POST /api/login đang băm bcrypt, đo lại GET /api/check-auth. Việc băm
+chạy trong passwords.hasher (PASSWORD_HASH_WORKERS luồng) nên các request khác
+không phải chờ; quá PASSWORD_HASH_MAX_PENDING thì login nhận 503 ngay.
+Với `--old-rounds`, mật khẩu được lưu ở cost cũ để kiểm tra việc băm lại khi đăng nhập.
+
+Chạy: python -m backend.benchmarks.login_storm --logins 100
+"""
+import argparse
+import asyncio
+import collections
+import time
+
+from .chat_load import percentile, probe, summary
+
+PASSWORD = "student123"
+
+
+def prepare_app(users: int, rounds: int):
+    """Trỏ app sang DB SQLite in-memory có sẵn `users` sinh viên. Trả về (app, Session, token)."""
+    from sqlalchemy import create_engine, insert
+    from sqlalchemy.orm import sessionmaker
+    from sqlalchemy.pool import StaticPool
+
+    from ..main import app
+    from ..db import database, models
+    from ..routers import jwt_auth
+    from .. import passwords
+
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    models.Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine, autoflush=False)
+
+    def get_test_db():
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[database.get_db] = get_test_db
+    hashed = passwords.hash_password(PASSWORD, rounds)
+    with engine.begin() as conn:
+        conn.execute(insert(models.User), [
+            {"user_id": i, "username": f"sv{i}", "password": hashed, "full_name": f"Sinh viên {i}",
+             "role": models.UserRole.student} for i in range(1, users + 1)
+        ])
+    token = jwt_auth.create_token({"username": "sv1", "id": 1, "role": "student"})
+    return app, Session, token
+
+
+async def run(args):
+    import httpx
+    from ..db import models
+    from .. import passwords
+
+    app, Session, token = prepare_app(args.logins, args.old_rounds or passwords.BCRYPT_ROUNDS)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=None) as client:
+        auth = {"Authorization": f"Bearer {token}"}
+        baseline = await probe(client, "/api/check-auth", args.probes, 0.01, auth)
+
+        async def login(i):
+            start = time.perf_counter()
+            res = await client.post("/api/login", json={"username": f"sv{i}", "password": PASSWORD})
+            return (time.perf_counter() - start) * 1000, res.status_code
+
+        started = time.perf_counter()
+        logins = [asyncio.create_task(login(i)) for i in range(1, args.logins + 1)]
+        await asyncio.sleep(0.05)
+        loaded = await probe(client, "/api/check-auth", args.probes, 0.02, auth)
+        results = await asyncio.gather(*logins)
+        elapsed = time.perf_counter() - started
+
+    statuses = collections.Counter(code for _, code in results)
+    summary("GET /api/check-auth (idle)", baseline)
+    summary(f"GET /api/check-auth ({args.logins} logins)", loaded)
+    summary("POST /api/login", [ms for ms, code in results if code == 200] or [0.0])
+    print(f"status: {dict(statuses)}  ({args.logins / elapsed:.1f} logins/s)")
+    print(f"hasher: {passwords.hasher.stats()}")
+    if args.old_rounds:
+        with Session() as db:
+            costs = collections.Counter(passwords.hash_cost(p) for (p,) in db.query(models.User.password))
+        print(f"cost sau khi đăng nhập: {dict(costs)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--logins", type=int, default=100)
+    parser.add_argument("--probes", type=int, default=50)
+    parser.add_argument("--old-rounds", type=int, default=0, help="cost của mật khẩu đã lưu (0 = BCRYPT_ROUNDS)")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+"""
+Chạy app thật bằng uvicorn nhiều worker (cùng DB, cùng SHARED_STATE_PATH) và kiểm tra:
+
+1. shared_state (không qua HTTP, `--processes` process):
+     lock      tăng bộ đếm trong file dưới state.lock() -> không mất lần tăng nào
+     cache     xóa key ở process này -> process khác đọc được None
+     events    publish ở process này -> process khác poll() thấy
+2. Tính nhất quán qua HTTP. Mỗi request mở kết nối mới nên rơi vào worker bất kỳ;
+   mỗi bước gửi `--probes` request:
+     search    giảng viên thêm sinh viên mới -> mọi worker đều tìm thấy
+     chat      sửa điểm -> câu trả lời "xem điểm" đã cache ở mọi worker được cập nhật
+     join_code nhiều lớp được tạo đồng thời -> không lỗi, mã tham gia không trùng;
+               đổi mã -> sinh viên tham gia bằng mã mới ở mọi worker
+3. Thông lượng GET /api/student/dashboard với 1 worker và với `--workers` worker.
+
+Với `--backend memory` (cache / lock riêng từng process), bước 2 thường báo ❌:
+đó là lỗi mà chế độ sqlite sửa.
+
+Chạy: python -m backend.benchmarks.multi_worker --workers 4
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Dict, List
+
+from .chat_load import percentile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def check(ok: bool, message: str) -> bool:
+    print(f"{'✅' if ok else '❌'} {message}")
+    return ok
+
+
+# =========================
+# 1. SHARED STATE (process con)
+# =========================
+def _locked_increments(path: str, counter_file: str, n: int):
+    from ..shared import SQLiteState
+
+    state = SQLiteState(path)
+    for _ in range(n):
+        with state.lock("counter"):
+            with open(counter_file) as f:
+                value = int(f.read())
+            time.sleep(0.001)  # nới rộng khoảng đọc-ghi để lộ race nếu lock hỏng
+            with open(counter_file, "w") as f:
+                f.write(str(value + 1))
+
+
+def _cache_get(path: str, key: str):
+    from ..shared import SQLiteState
+
+    return SQLiteState(path).cache("check", 100, 60).get(key)
+
+
+def _poll_events(path: str) -> List[Dict]:
+    from ..shared import SQLiteState
+
+    return SQLiteState(path).poll("check", 0)[1]
+
+
+def check_shared_state(tmp: str, processes: int, increments: int) -> bool:
+    from ..shared import SQLiteState
+
+    path = os.path.join(tmp, "check_state.db")
+    state = SQLiteState(path)
+    counter_file = os.path.join(tmp, "counter.txt")
+    with open(counter_file, "w") as f:
+        f.write("0")
+
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Pool(processes) as pool:
+        pool.starmap(_locked_increments, [(path, counter_file, increments)] * processes)
+        with open(counter_file) as f:
+            total = int(f.read())
+        ok = check(total == processes * increments,
+                   f"lock: {total}/{processes * increments} lần tăng từ {processes} process")
+
+        cache = state.cache("check", 100, 60)
+        cache.set("k", {"v": 1})
+        seen = pool.starmap(_cache_get, [(path, "k")] * processes)
+        cache.delete("k")
+        after = pool.starmap(_cache_get, [(path, "k")] * processes)
+        ok &= check(all(v == {"v": 1} for v in seen) and all(v is None for v in after),
+                    "cache: set / delete ở process cha, process con thấy ngay")
+
+        state.publish("check", {"users": [1]})
+        polled = pool.starmap(_poll_events, [(path,)] * processes)
+        ok &= check(all(events == [{"users": [1]}] for events in polled),
+                    "events: process con poll() thấy sự kiện của process cha")
+    return ok
+
+
+# =========================
+# 2-3. UVICORN NHIỀU WORKER
+# =========================
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@contextmanager
+def server(url: str, workers: int, backend: str, state_path: str):
+    import httpx
+
+    port = free_port()
+    env = {**os.environ, "DATABASE_URL": url, "WEB_CONCURRENCY": str(workers), "SHARED_BACKEND": backend,
+           "SHARED_STATE_PATH": state_path, "LOG_LEVEL": "ERROR", "BCRYPT_ROUNDS": "4",
+           "PYTHONPATH": ROOT}
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=ROOT, env=env,
+    )
+    base = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.monotonic() + 60
+        ready = 0
+        # Đợi tới khi nhiều request liên tiếp (kết nối mới) đều có trả lời
+        while ready < 3 * workers:
+            if proc.poll() is not None or time.monotonic() > deadline:
+                raise RuntimeError("uvicorn không khởi động được")
+            try:
+                httpx.get(base + "/api/check-auth", timeout=2)
+                ready += 1
+            except httpx.HTTPError:
+                ready = 0
+                time.sleep(0.2)
+        yield base
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(30)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+async def probe(base: str, method: str, path: str, headers: Dict[str, str], n: int, **kwargs) -> list:
+    """n request, mỗi request một kết nối mới (worker bất kỳ)."""
+    import httpx
+
+    async def one():
+        async with httpx.AsyncClient(base_url=base, timeout=30) as client:
+            return await client.request(method, path, headers=headers, **kwargs)
+
+    return await asyncio.gather(*(one() for _ in range(n)))
+
+
+async def check_coherence(base: str, layout, bearer, probes: int) -> bool:
+    import httpx
+
+    rnd = random.Random(7)
+    ok = True
+
+    # --- search: mọi worker dựng index trước, rồi mới thêm sinh viên ---
+    k = rnd.randrange(layout.classes)
+    teacher = layout.class_teacher(k)
+    t_headers = bearer(layout.teacher_username(teacher), layout.teacher_id(teacher), "teacher")
+    await probe(base, "GET", "/api/search", t_headers, probes, params={"q": "nguyen"})
+    # ... và index mã tham gia (mã không tồn tại, không ghi gì), dùng cho bước đổi mã
+    s0 = layout.class_students(k)[0]
+    await probe(base, "POST", f"/api/student/{layout.student_id(s0)}/join",
+                bearer(layout.student_username(s0), layout.student_id(s0), "student"), probes, json={"code": "------"})
+    name = f"Kiểm Tra Đồng Bộ {rnd.randrange(10**6):06d}"
+    async with httpx.AsyncClient(base_url=base, timeout=30) as client:
+        res = await client.post(f"/api/teacher/classes/{layout.class_id(k)}/students", headers=t_headers,
+                                json={"full_name": name, "student_code": f"MW{rnd.randrange(10**8):08d}"})
+        res.raise_for_status()
+    found = await probe(base, "GET", "/api/search", t_headers, probes, params={"q": name})
+    hits = sum(any(r["name"] == name for r in res.json()["results"]) for res in found)
+    ok &= check(hits == probes, f"search: {hits}/{probes} request tìm thấy sinh viên vừa thêm")
+
+    # --- chat: câu trả lời "xem điểm" được cache ở mọi worker, rồi sửa điểm ---
+    s = layout.class_students(k)[0]
+    s_headers = bearer(layout.student_username(s), layout.student_id(s), "student")
+    cid = layout.class_id(k)
+
+    async def set_attendance(score: float):
+        async with httpx.AsyncClient(base_url=base, timeout=30) as client:
+            res = await client.post(f"/api/teacher/classes/{cid}/grades", headers=t_headers, json=[
+                {"student_id": layout.student_id(s), "class_id": cid, "subject": "attendance", "score": score}])
+            res.raise_for_status()
+
+    chat = {"message": "Xem điểm của tôi"}
+    await set_attendance(1.5)
+    await probe(base, "POST", "/api/chatbot/chat", s_headers, probes, json=chat)
+    await set_attendance(8.5)
+    replies = await probe(base, "POST", "/api/chatbot/chat", s_headers, probes, json=chat)
+    fresh = sum("Chuyên cần: 8.5/10" in r.json().get("response", "") for r in replies)
+    ok &= check(fresh == probes, f"chat: {fresh}/{probes} câu trả lời có điểm mới")
+
+    # --- join code: tạo lớp đồng thời từ nhiều giảng viên ---
+    async def create_class(i: int):
+        t = rnd.randrange(layout.teachers)
+        headers = bearer(layout.teacher_username(t), layout.teacher_id(t), "teacher")
+        async with httpx.AsyncClient(base_url=base, timeout=30) as client:
+            return await client.post("/api/teacher/classes", headers=headers,
+                                     json={"class_name": f"Lớp đồng thời {i}", "year": 2026, "semester": 1})
+
+    created = await asyncio.gather(*(create_class(i) for i in range(probes)))
+    good = sum(r.status_code == 200 for r in created)
+    ok &= check(good == probes, f"join_code: {good}/{probes} lớp tạo đồng thời thành công")
+
+    # --- đổi mã: mỗi worker đã nạp index mã, rồi sinh viên (khác nhau) tham gia bằng mã mới ---
+    async with httpx.AsyncClient(base_url=base, timeout=30) as client:
+        res = await client.post(f"/api/teacher/classes/{cid}/join-code", headers=t_headers, json={})
+        res.raise_for_status()
+    code = res.json()["join_code"]
+    enrolled = set(layout.class_students(k))
+    others = [i for i in range(layout.students) if i not in enrolled][:probes]
+
+    async def join(i: int):
+        headers = bearer(layout.student_username(i), layout.student_id(i), "student")
+        async with httpx.AsyncClient(base_url=base, timeout=30) as client:
+            res = await client.post(f"/api/student/{layout.student_id(i)}/join", headers=headers, json={"code": code})
+            return res.json().get("message")
+
+    joined = await asyncio.gather(*(join(i) for i in others))
+    good = sum(m == "Class joined successfully" for m in joined)
+    ok &= check(good == len(others), f"join_code: {good}/{len(others)} sinh viên tham gia bằng mã vừa đổi")
+    return ok
+
+
+async def dashboard_throughput(base: str, layout, bearer, requests: int, concurrency: int) -> Dict[str, float]:
+    import httpx
+
+    rnd = random.Random(11)
+    latencies: List[float] = []
+    errors = 0
+    remaining = iter(range(requests))
+
+    async def worker(client):
+        nonlocal errors
+        for _ in remaining:
+            i = rnd.randrange(layout.students)
+            headers = bearer(layout.student_username(i), layout.student_id(i), "student")
+            start = time.perf_counter()
+            res = await client.get("/api/student/dashboard", headers=headers)
+            latencies.append((time.perf_counter() - start) * 1000)
+            errors += res.status_code != 200
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base, timeout=60, limits=limits) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return {"rps": requests / elapsed, "p50": percentile(latencies, 50), "p95": percentile(latencies, 95),
+            "errors": errors}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--backend", default="sqlite", choices=("sqlite", "memory"))
+    parser.add_argument("--processes", type=int, default=4, help="số process kiểm tra shared state")
+    parser.add_argument("--increments", type=int, default=50)
+    parser.add_argument("--probes", type=int, default=24, help="số request mỗi bước kiểm tra nhất quán")
+    parser.add_argument("--students", type=int, default=5000)
+    parser.add_argument("--teachers", type=int, default=100)
+    parser.add_argument("--classes", type=int, default=250)
+    parser.add_argument("--requests", type=int, default=1000, help="số request đo thông lượng")
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+
+    from ..db import database, synthetic_data
+    from ..routers import jwt_auth
+
+    def bearer(username: str, user_id: int, role: str) -> Dict[str, str]:
+        token = jwt_auth.create_token({"username": username, "id": user_id, "role": role})
+        return {"Authorization": f"Bearer {token}"}
+
+    print(f"CPU: {os.cpu_count()}")
+    with tempfile.TemporaryDirectory() as tmp:
+        ok = check_shared_state(tmp, args.processes, args.increments)
+
+        url = f"sqlite:///{os.path.join(tmp, 'multi_worker.db')}"
+        engine = database.make_engine(url)
+        layout, _ = synthetic_data.generate(engine, args.students, args.teachers, args.classes)
+        engine.dispose()
+
+        results = {}
+        for workers in sorted({1, args.workers}):
+            state_path = os.path.join(tmp, f"state_{workers}.db")
+            with server(url, workers, args.backend, state_path) as base:
+                if workers == args.workers:
+                    print(f"\n{workers} worker, SHARED_BACKEND={args.backend}:")
+                    ok &= asyncio.run(check_coherence(base, layout, bearer, args.probes))
+                results[workers] = asyncio.run(
+                    dashboard_throughput(base, layout, bearer, args.requests, args.concurrency))
+
+    print("\nGET /api/student/dashboard:")
+    for workers, r in results.items():
+        print(f"  {workers:2d} worker  {r['rps']:8.1f} req/s  p50={r['p50']:7.1f}  p95={r['p95']:7.1f} ms  "
+              f"lỗi {r['errors']}")
+        ok &= r["errors"] == 0
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,128 @@
+"""
+Kiểm tra số câu SQL mỗi request không tăng theo kích thước dữ liệu (chống N+1).
+
+Mỗi kịch bản được chạy với dữ liệu kích thước tăng dần trên DB SQLite in-memory;
+số câu lệnh phải giữ nguyên. Thoát với mã 1 nếu có kịch bản bị N+1.
+
+Chạy: python -m backend.benchmarks.query_counts
+"""
+import sys
+from contextlib import contextmanager
+from typing import Callable, Dict
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from ..db import crud, models
+from ..routers import chatbot, teacher
+
+SIZES = (1, 10, 50)
+
+
+class StatementCounter:
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+
+@contextmanager
+def fresh_db():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    models.Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine, autoflush=False)()
+    try:
+        yield engine, db
+    finally:
+        db.close()
+        engine.dispose()
+
+
+def _make_user(db: Session, username: str, role: models.UserRole) -> models.User:
+    user = models.User(username=username, password="x", full_name=username, role=role)
+    db.add(user)
+    db.flush()
+    if role == models.UserRole.teacher:
+        db.add(models.Teacher(teacher_id=user.user_id))
+    elif role == models.UserRole.student:
+        db.add(models.Student(student_id=user.user_id, student_code=f"SV{user.user_id:06d}"))
+    return user
+
+
+# --- Kịch bản: GET /api/teacher/classes ---
+def scenario_teacher_classes(db: Session, n: int) -> Callable[[], object]:
+    t = _make_user(db, "teacher", models.UserRole.teacher)
+    students = [_make_user(db, f"student{i}", models.UserRole.student) for i in range(5)]
+    for i in range(n):
+        c = models.Class(class_name=f"Lớp {i}", year=2025, semester=1)
+        db.add(c)
+        db.flush()
+        db.add(models.TeachingAssignment(teacher_id=t.user_id, class_id=c.class_id))
+        for s in students[: i % 5 + 1]:
+            db.add(models.Enrollment(student_id=s.user_id, class_id=c.class_id))
+    db.commit()
+    return lambda: teacher.list_classes(current_user=t, db=db)
+
+
+# --- Kịch bản: ngữ cảnh profile cho chatbot ---
+def scenario_chat_profile(db: Session, n: int) -> Callable[[], object]:
+    t = _make_user(db, "teacher", models.UserRole.teacher)
+    s = _make_user(db, "student", models.UserRole.student)
+    for i in range(n):
+        c = models.Class(class_name=f"Lớp {i}", year=2025, semester=1)
+        db.add(c)
+        db.flush()
+        db.add(models.TeachingAssignment(teacher_id=t.user_id, class_id=c.class_id))
+        db.add(models.Enrollment(student_id=s.user_id, class_id=c.class_id))
+        for subject, score in (("attendance", 9), ("mid", 7), ("final", 8)):
+            db.add(models.Grade(student_id=s.user_id, class_id=c.class_id, subject=subject, score=score))
+    db.commit()
+    return lambda: chatbot.format_profile_context(chatbot.get_user_profile(db, s.user_id))
+
+
+# --- Kịch bản: GET /api/student/dashboard ---
+def scenario_student_dashboard(db: Session, n: int) -> Callable[[], object]:
+    t = _make_user(db, "teacher", models.UserRole.teacher)
+    s = _make_user(db, "student", models.UserRole.student)
+    for i in range(n):
+        c = models.Class(class_name=f"Lớp {i}", year=2025, semester=1)
+        db.add(c)
+        db.flush()
+        db.add(models.TeachingAssignment(teacher_id=t.user_id, class_id=c.class_id))
+        db.add(models.Enrollment(student_id=s.user_id, class_id=c.class_id))
+        db.add(models.StudentClassResult(student_id=s.user_id, class_id=c.class_id,
+                                         attendance=9, mid=7, final=8, weighted=7.9))
+    db.commit()
+    return lambda: crud.get_student_dashboard(db, s.user_id)
+
+
+SCENARIOS: Dict[str, Callable[[Session, int], Callable[[], object]]] = {
+    "GET /api/teacher/classes": scenario_teacher_classes,
+    "chatbot get_user_profile": scenario_chat_profile,
+    "GET /api/student/dashboard": scenario_student_dashboard,
+}
+
+
+def main() -> int:
+    failed = False
+    for name, setup in SCENARIOS.items():
+        counts = []
+        for n in SIZES:
+            with fresh_db() as (engine, db):
+                call = setup(db, n)
+                db.expire_all()
+                counter = StatementCounter(engine)
+                call()
+                counts.append(counter.count)
+        ok = len(set(counts)) == 1
+        failed = failed or not ok
+        detail = ", ".join(f"n={n}: {c}" for n, c in zip(SIZES, counts))
+        print(f"{'✅' if ok else '❌'} {name:45s} {detail}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,164 @@
+"""
+Load test các route đọc của sinh viên: `--students` sinh viên cùng lúc, mỗi người
+gọi GET /api/students/{id}/enrollments, /api/classes/{id} và /api/students/{id}/grades.
+
+So sánh 2 đường:
+- async:  các route trong api.py (AsyncSession, không dùng threadpool)
+- sync:   cùng truy vấn bằng Session đồng bộ trong route `def` (cách cũ), mount
+          tạm dưới /legacy cho benchmark
+
+App chạy bằng uvicorn thật trên DB SQLite (WAL) tạm. Với SQLite cục bộ mỗi truy
+vấn gần như không chờ I/O nên 2 đường chủ yếu tốn CPU như nhau; khác biệt rõ khi
+DB ở xa (PostgreSQL): đường sync bị giới hạn ~40 luồng, đường async thì không.
+Với `--p99-ms`, thoát mã 1 nếu p99 của đường async vượt ngưỡng.
+
+Chạy: python -m backend.benchmarks.read_load --students 500
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+from .chat_load import percentile, start_server
+
+CLASSES = 10
+CLASSES_PER_STUDENT = 5
+
+
+def seed(engine, students: int):
+    from sqlalchemy import insert
+    from ..db import models
+
+    models.Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(insert(models.User), [
+            {"user_id": i, "username": f"sv{i}", "password": "x", "full_name": f"Sinh viên {i}",
+             "role": models.UserRole.student} for i in range(1, students + 1)
+        ])
+        conn.execute(insert(models.Student), [{"student_id": i, "student_code": f"SV{i:06d}"}
+                                              for i in range(1, students + 1)])
+        conn.execute(insert(models.Class), [{"class_id": c, "class_name": f"Lớp {c}", "year": 2025, "semester": 1}
+                                            for c in range(1, CLASSES + 1)])
+        enrollments = [(i, (i + k) % CLASSES + 1) for i in range(1, students + 1) for k in range(CLASSES_PER_STUDENT)]
+        conn.execute(insert(models.Enrollment), [{"student_id": s, "class_id": c} for s, c in enrollments])
+        conn.execute(insert(models.Grade), [
+            {"student_id": s, "class_id": c, "subject": subject, "score": 7.5}
+            for s, c in enrollments for subject in ("attendance", "mid", "final")
+        ])
+
+
+def legacy_router():
+    """Các route đọc viết theo kiểu cũ (def + Session đồng bộ) để so sánh."""
+    from fastapi import APIRouter, Depends
+    from sqlalchemy.orm import Session
+    from ..db import crud, database, schemas
+    from ..routers import jwt_auth
+
+    router = APIRouter(prefix="/legacy")
+
+    @router.get("/students/{student_id}/enrollments", response_model=list[schemas.EnrollmentRead])
+    def enrollments(student_id: int, db: Session = Depends(database.get_db), user: dict = Depends(jwt_auth.auth)):
+        return crud.get_student_enrollments(db, student_id)
+
+    @router.get("/classes/{class_id}", response_model=schemas.ClassRead)
+    def class_detail(class_id: int, db: Session = Depends(database.get_db), user: dict = Depends(jwt_auth.auth)):
+        return crud.get_class(db, class_id)
+
+    @router.get("/students/{student_id}/grades", response_model=list[schemas.GradeRead])
+    def grades(student_id: int, db: Session = Depends(database.get_db), user: dict = Depends(jwt_auth.auth)):
+        return crud.get_student_grades(db, student_id)
+
+    return router
+
+
+def prepare_app(path: str, students: int):
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+    from sqlalchemy.orm import sessionmaker
+
+    from ..main import app
+    from ..db import database
+
+    url = f"sqlite:///{path}"
+    engine = database.make_engine(url)
+    seed(engine, students)
+    async_engine = database.make_async_engine(str(database.async_url(url)))
+    Session = sessionmaker(bind=engine, autoflush=False)
+    AsyncSession = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+    def get_test_db():
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    async def get_test_async_db():
+        async with AsyncSession() as db:
+            yield db
+
+    app.dependency_overrides[database.get_db] = get_test_db
+    app.dependency_overrides[database.get_async_db] = get_test_async_db
+    app.include_router(legacy_router(), prefix="/api")
+    return app
+
+
+async def student_session(client, prefix: str, student_id: int, token: str):
+    headers = {"Authorization": f"Bearer {token}"}
+    class_id = student_id % CLASSES + 1
+    latencies = []
+    for path in (f"/students/{student_id}/enrollments", f"/classes/{class_id}", f"/students/{student_id}/grades"):
+        start = time.perf_counter()
+        res = await client.get(prefix + path, headers=headers)
+        latencies.append((time.perf_counter() - start) * 1000)
+        assert res.status_code == 200, (path, res.status_code, res.text[:200])
+    return latencies
+
+
+async def run(args, tokens):
+    import httpx
+
+    limits = httpx.Limits(max_connections=args.students, max_keepalive_connections=args.students)
+    results = {}
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", timeout=None, limits=limits) as client:
+        for name, prefix in (("sync", "/api/legacy"), ("async", "/api")):
+            # làm nóng cache xác thực + connection pool
+            await asyncio.gather(*(student_session(client, prefix, i, tokens[i]) for i in range(1, 11)))
+            start = time.perf_counter()
+            sessions = await asyncio.gather(*(
+                student_session(client, prefix, i, tokens[i]) for i in range(1, args.students + 1)
+            ))
+            elapsed = time.perf_counter() - start
+            latencies = [ms for s in sessions for ms in s]
+            results[name] = percentile(latencies, 99)
+            print(f"{name:5s} {args.students} students  {len(latencies) / elapsed:8.1f} req/s  "
+                  f"p50={percentile(latencies, 50):8.1f} ms  p99={results[name]:8.1f} ms")
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--students", type=int, default=500)
+    parser.add_argument("--port", type=int, default=18001)
+    parser.add_argument("--p99-ms", type=float, default=0, help="ngưỡng p99 cho đường async (0 = không kiểm tra)")
+    args = parser.parse_args()
+
+    from ..routers import jwt_auth
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = prepare_app(os.path.join(tmp, "read_load.db"), args.students)
+        tokens = {i: jwt_auth.create_token({"username": f"sv{i}", "id": i, "role": "student"})
+                  for i in range(1, args.students + 1)}
+        start_server(app, args.port)
+        results = asyncio.run(run(args, tokens))
+
+    if not args.p99_ms:
+        return 0
+    ok = results["async"] <= args.p99_ms
+    print(f"{'✅' if ok else '❌'} async p99 {results['async']:.1f} ms (ngưỡng {args.p99_ms:.0f} ms)")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
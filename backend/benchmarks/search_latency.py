@@ -0,0 +1,96 @@
+"""
+Benchmark độ trễ tìm kiếm (search.SearchIndex) với N user.
+
+Tạo DB SQLite tạm có N user (95% sinh viên, 5% giảng viên) với họ tên tiếng Việt
+ngẫu nhiên và N/50 lớp, dựng index rồi đo từng loại câu tìm: tên có / không dấu,
+tiền tố, sai chính tả, mã sinh viên, tên lớp. Thoát với mã 1 nếu p99 của một
+loại vượt `--p99-ms`.
+
+Chạy: python -m backend.benchmarks.search_latency --users 100000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import Session
+
+from .. import search
+from ..db import models
+from ..db.synthetic_data import DEM, HO, KHOA, MON, TEN
+from .chat_load import percentile
+
+QUERIES = {
+    "họ tên có dấu": ["Nguyễn Văn Hùng", "Trần Thị Lan", "Phạm Minh Tuấn", "Đỗ Ngọc Hà"],
+    "không dấu": ["nguyen van hung", "tran thi lan", "do ngoc ha", "vu quang son"],
+    "tiền tố": ["nguy", "huon", "tran th", "le v"],
+    "sai chính tả": ["nguyn van hung", "tarn thi lan", "phamm tuan", "hoangg"],
+    "mã sinh viên": ["SV012345", "sv0123", "SV09"],
+    "lớp / khoa": ["lap trinh python", "co so du lieu", "cong nghe"],
+}
+
+
+def build_db(path: str, users: int, seed: int = 42):
+    rnd = random.Random(seed)
+    engine = create_engine(f"sqlite:///{path}")
+    models.Base.metadata.create_all(bind=engine)
+    teachers = max(1, users // 20)
+    with engine.begin() as conn:
+        conn.execute(insert(models.User), [
+            {"user_id": i, "username": f"u{i:06d}", "password": "x",
+             "full_name": f"{rnd.choice(HO)} {rnd.choice(DEM)} {rnd.choice(TEN)}",
+             "role": models.UserRole.teacher if i <= teachers else models.UserRole.student}
+            for i in range(1, users + 1)
+        ])
+        conn.execute(insert(models.Teacher), [
+            {"teacher_id": i, "department": rnd.choice(KHOA)} for i in range(1, teachers + 1)
+        ])
+        conn.execute(insert(models.Student), [
+            {"student_id": i, "student_code": f"SV{i:06d}"} for i in range(teachers + 1, users + 1)
+        ])
+        conn.execute(insert(models.Class), [
+            {"class_id": i, "class_name": f"{rnd.choice(MON)} {i}", "year": 2025, "semester": 1 + i % 2}
+            for i in range(1, users // 50 + 2)
+        ])
+    return engine
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--runs", type=int, default=50, help="số lần chạy mỗi câu tìm")
+    parser.add_argument("--p99-ms", type=float, default=20.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = build_db(os.path.join(tmp, "search.db"), args.users)
+        index = search.SearchIndex()
+        start = time.perf_counter()
+        with Session(engine) as db:
+            docs = index.build(db)
+        print(f"Dựng index: {docs} tài liệu, {index.stats()['tokens']} từ, "
+              f"{time.perf_counter() - start:.2f} s")
+
+        failed = False
+        for kind, queries in QUERIES.items():
+            times, hits = [], 0
+            for query in queries:
+                for _ in range(args.runs):
+                    start = time.perf_counter()
+                    results = index.search(query)
+                    times.append((time.perf_counter() - start) * 1000)
+                hits += bool(results)
+            p99 = percentile(times, 99)
+            ok = p99 <= args.p99_ms
+            failed = failed or not ok
+            print(f"{'✅' if ok else '❌'} {kind:16s} p50={percentile(times, 50):6.2f} ms  "
+                  f"p99={p99:6.2f} ms  có kết quả {hits}/{len(queries)}")
+        engine.dispose()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,60 @@
+"""
+Server LLM giả lập API /api/chat của Ollama, dùng cho load test chatbot.
+
+Trả lời sau `--delay` giây (asyncio.sleep, không tốn CPU) nên có thể giữ
+hàng trăm request "đang chạy" cùng lúc. Với "stream": true, câu trả lời được
+gửi từng từ dạng NDJSON, các từ rải đều trong `--delay` giây.
+
+Chạy: python -m backend.benchmarks.stub_llm --port 11435 --delay 5
+Sau đó đặt OLLAMA_URL=http://127.0.0.1:11435 và USE_GEMINI=False.
+"""
+import argparse
+import asyncio
+import json
+
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+STUB_REPLY = "Xin chào! Mình là trợ lý giả lập dùng để đo hiệu năng."
+
+
+def create_app(delay: float) -> FastAPI:
+    app = FastAPI()
+
+    async def stream_reply(model):
+        words = STUB_REPLY.split(" ")
+        for i, word in enumerate(words):
+            await asyncio.sleep(delay / len(words))
+            content = word if i == 0 else " " + word
+            yield json.dumps({"model": model, "message": {"role": "assistant", "content": content},
+                              "done": False}) + "\n"
+        yield json.dumps({"model": model, "message": {"role": "assistant", "content": ""}, "done": True}) + "\n"
+
+    @app.post("/api/chat")
+    async def chat(request: Request):
+        body = await request.json()
+        if body.get("stream"):
+            return StreamingResponse(stream_reply(body.get("model")), media_type="application/x-ndjson")
+        await asyncio.sleep(delay)
+        return {
+            "model": body.get("model"),
+            "message": {"role": "assistant", "content": STUB_REPLY},
+            "done": True,
+        }
+
+    return app
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--delay", type=float, default=5.0, help="độ trễ mỗi câu trả lời (giây)")
+    args = parser.parse_args()
+    uvicorn.run(create_app(args.delay), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,339 @@
+"""
+Bộ benchmark các luồng chính trên dữ liệu cỡ thật, kết quả JSON để so sánh giữa các lần chạy.
+
+1. Sinh dữ liệu bằng db/synthetic_data (hoặc dùng lại DB có sẵn qua `--url`).
+2. Chạy app FastAPI thật trong cùng process (httpx.ASGITransport, đủ middleware,
+   xác thực, route sync / async) qua các luồng:
+     login                    POST /api/login (bcrypt theo BCRYPT_ROUNDS)
+     student_dashboard        GET  /api/student/dashboard
+     teacher_class_detail     GET  /api/teacher/classes/{id}
+     teacher_class_detail_304 như trên, gửi If-None-Match (client đã có bản mới nhất)
+     grade_save               POST /api/teacher/classes/{id}/grades (5 điểm / request)
+     import                   POST /api/teacher/classes/{id}/import (CSV `--import-rows` dòng)
+     export                   GET  /api/teacher/classes/{id}/export
+     chat_intent              POST /api/chatbot/chat (xem điểm / lớp / phân tích, không gọi LLM)
+   Mỗi luồng chạy `--requests` request với `--concurrency` request đồng thời.
+   Thêm "cold_start": `--cold-starts` lần khởi động tiến trình mới trên cùng DB
+   tới response đầu tiên (xem cold_start.py), và thời gian import theo package.
+3. In JSON ra stdout (và `--output`): thông lượng, p50 / p95 / p99 / max từng luồng,
+   số dòng dữ liệu và tham số chạy. Bảng tóm tắt in ra stderr.
+
+Với `--baseline run_cu.json`, in chênh lệch p95 so với lần chạy cũ; thêm
+`--max-regression 20` để thoát mã 1 khi p95 của một luồng chậm hơn quá 20%.
+
+Chạy: python -m backend.benchmarks.suite --students 20000 --teachers 400 --classes 1000 --output run.json
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, NamedTuple, Optional, Tuple
+
+from . import cold_start
+from .chat_load import percentile
+
+CHAT_MESSAGES = ("Xem điểm của tôi", "Tôi đang học những lớp nào?", "Phân tích kết quả học tập của tôi")
+
+
+class Flow(NamedTuple):
+    name: str
+    call: Callable[..., Awaitable]  # (client, n) -> httpx.Response
+    ok: Tuple[int, ...] = (200,)
+    setup: Optional[Callable[..., Awaitable]] = None  # (client) -> None, chạy trước khi đo
+
+
+def log(message: str):
+    print(message, file=sys.stderr)
+
+
+def prepare_app(url: str):
+    """Trỏ get_db / get_async_db của app sang `url`. Trả về (app, engine)."""
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+    from sqlalchemy.orm import sessionmaker
+
+    from ..main import app
+    from ..db import database
+
+    engine = database.make_engine(url)
+    async_engine = database.make_async_engine(str(database.async_url(url)))
+    Session = sessionmaker(bind=engine, autoflush=False)
+    AsyncSession = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+    def get_test_db():
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    async def get_test_async_db():
+        async with AsyncSession() as db:
+            yield db
+
+    app.dependency_overrides[database.get_db] = get_test_db
+    app.dependency_overrides[database.get_async_db] = get_test_async_db
+    return app, engine
+
+
+def build_flows(layout, args) -> Dict[str, Flow]:
+    from ..db import synthetic_data
+    from ..routers import jwt_auth
+
+    rnd = random.Random(args.seed)
+
+    def bearer(username: str, user_id: int, role: str) -> Dict[str, str]:
+        token = jwt_auth.create_token({"username": username, "id": user_id, "role": role})
+        return {"Authorization": f"Bearer {token}"}
+
+    def student(n: int):
+        i = rnd.randrange(layout.students)
+        return i, bearer(layout.student_username(i), layout.student_id(i), "student")
+
+    def teacher_class(n: int):
+        k = rnd.randrange(layout.classes)
+        t = layout.class_teacher(k)
+        return k, bearer(layout.teacher_username(t), layout.teacher_id(t), "teacher")
+
+    async def login(client, n):
+        i = rnd.randrange(layout.students)
+        return await client.post("/api/login", json={"username": layout.student_username(i),
+                                                     "password": synthetic_data.PASSWORD})
+
+    async def student_dashboard(client, n):
+        _, headers = student(n)
+        return await client.get("/api/student/dashboard", headers=headers)
+
+    async def class_detail(client, n):
+        k, headers = teacher_class(n)
+        return await client.get(f"/api/teacher/classes/{layout.class_id(k)}", headers=headers)
+
+    # 304: client đã có bản mới nhất của một nhóm lớp (ETag lấy trước khi đo)
+    hot_classes = rnd.sample(range(layout.classes), min(50, layout.classes))
+    etags: Dict[int, str] = {}
+
+    def class_path(k: int):
+        t = layout.class_teacher(k)
+        headers = bearer(layout.teacher_username(t), layout.teacher_id(t), "teacher")
+        return f"/api/teacher/classes/{layout.class_id(k)}", headers
+
+    async def fetch_etags(client):
+        for k in hot_classes:
+            path, headers = class_path(k)
+            etags[k] = (await client.get(path, headers=headers)).headers.get("etag", "")
+
+    async def class_detail_304(client, n):
+        k = rnd.choice(hot_classes)
+        path, headers = class_path(k)
+        return await client.get(path, headers={**headers, "If-None-Match": etags[k]})
+
+    async def grade_save(client, n):
+        k, headers = teacher_class(n)
+        cid = layout.class_id(k)
+        members = layout.class_students(k)
+        body = [{"student_id": layout.student_id(rnd.choice(members)), "class_id": cid,
+                 "subject": rnd.choice(("attendance", "mid", "final")), "score": round(rnd.uniform(0, 10), 1)}
+                for _ in range(5)]
+        return await client.post(f"/api/teacher/classes/{cid}/grades", json=body, headers=headers)
+
+    async def import_roster(client, n):
+        k, headers = teacher_class(n)
+        lines = ["STT,Họ và tên,Mã sinh viên"] + [
+            f"{r + 1},{rnd.choice(synthetic_data.HO)} {rnd.choice(synthetic_data.TEN)},BM{args.seed:03d}{n:06d}{r:03d}"
+            for r in range(args.import_rows)
+        ]
+        files = {"file": ("roster.csv", "\n".join(lines).encode("utf-8"), "text/csv")}
+        return await client.post(f"/api/teacher/classes/{layout.class_id(k)}/import", files=files, headers=headers)
+
+    async def export(client, n):
+        k, headers = teacher_class(n)
+        return await client.get(f"/api/teacher/classes/{layout.class_id(k)}/export", headers=headers)
+
+    async def chat_intent(client, n):
+        _, headers = student(n)
+        return await client.post("/api/chatbot/chat", json={"message": rnd.choice(CHAT_MESSAGES)}, headers=headers)
+
+    flows = [
+        Flow("login", login),
+        Flow("student_dashboard", student_dashboard),
+        Flow("teacher_class_detail", class_detail),
+        Flow("teacher_class_detail_304", class_detail_304, (304,), fetch_etags),
+        Flow("grade_save", grade_save),
+        Flow("import", import_roster),
+        Flow("export", export),
+        Flow("chat_intent", chat_intent),
+    ]
+    return {flow.name: flow for flow in flows}
+
+
+async def run_flow(client, flow: Flow, requests: int, concurrency: int, warmup: int) -> Dict[str, float]:
+    if flow.setup is not None:
+        await flow.setup(client)
+    for n in range(warmup):
+        await flow.call(client, -1 - n)
+
+    latencies: list = []
+    error_codes: Dict[str, int] = {}  # status code (hoặc tên exception) -> số lần
+    counter = itertools.count()
+
+    async def worker():
+        while (n := next(counter)) < requests:
+            start = time.perf_counter()
+            try:
+                res = await flow.call(client, n)
+                await res.aread()
+                error = None if res.status_code in flow.ok else str(res.status_code)
+            except Exception as e:
+                error = type(e).__name__
+            latencies.append((time.perf_counter() - start) * 1000)
+            if error is not None:
+                error_codes[error] = error_codes.get(error, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {
+        "requests": requests,
+        "errors": sum(error_codes.values()),
+        "error_codes": error_codes,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(requests / elapsed, 1),
+        "mean_ms": round(sum(latencies) / len(latencies), 2),
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "max_ms": round(max(latencies), 2),
+    }
+
+
+async def run(app, flows: Dict[str, Flow], args) -> Dict[str, Dict[str, float]]:
+    import httpx
+
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        for name, flow in flows.items():
+            results[name] = await run_flow(client, flow, args.requests, args.concurrency, args.warmup)
+            r = results[name]
+            log(f"{'✅' if not r['errors'] else '❌'} {name:26s} {r['throughput_rps']:8.1f} req/s  "
+                f"p50={r['p50_ms']:8.2f}  p95={r['p95_ms']:8.2f}  p99={r['p99_ms']:8.2f} ms  "
+                f"lỗi {r['errors']}/{r['requests']} {r['error_codes'] or ''}")
+    return results
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline_path: str, max_regression: float) -> bool:
+    """In chênh lệch p95 so với baseline; False nếu có luồng chậm hơn quá max_regression %."""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)["flows"]
+    ok = True
+    log(f"\nSo với {baseline_path} (p95):")
+    for name, r in results.items():
+        old = baseline.get(name)
+        if not old or not old.get("p95_ms"):
+            continue
+        change = (r["p95_ms"] - old["p95_ms"]) / old["p95_ms"] * 100
+        regressed = bool(max_regression) and change > max_regression
+        ok = ok and not regressed
+        log(f"{'❌' if regressed else '  '} {name:26s} {old['p95_ms']:8.2f} -> {r['p95_ms']:8.2f} ms  ({change:+.1f}%)")
+    return ok
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=None,
+                        help="DB có sẵn (trống -> sinh dữ liệu); mặc định: SQLite tạm")
+    parser.add_argument("--students", type=int, default=20000)
+    parser.add_argument("--teachers", type=int, default=400)
+    parser.add_argument("--classes", type=int, default=1000)
+    parser.add_argument("--classes-per-student", type=int, default=5)
+    parser.add_argument("--requests", type=int, default=500, help="số request mỗi luồng")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--import-rows", type=int, default=30)
+    parser.add_argument("--flows", default="", help="chỉ chạy các luồng này (phân cách bởi dấu phẩy)")
+    parser.add_argument("--cold-starts", type=int, default=3, help="số lần đo cold start (0 = bỏ qua)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="", help="ghi JSON kết quả ra file")
+    parser.add_argument("--baseline", default="", help="file JSON của lần chạy trước để so sánh")
+    parser.add_argument("--max-regression", type=float, default=0, help="%% p95 chậm hơn tối đa (0 = không kiểm tra)")
+    args = parser.parse_args()
+
+    from ..db import synthetic_data
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = args.url or f"sqlite:///{os.path.join(tmp, 'suite.db')}"
+        app, engine = prepare_app(url)
+
+        start = time.perf_counter()
+        try:
+            layout = synthetic_data.detect_layout(engine)
+            rows, generated = None, False
+            log(f"Dùng dữ liệu có sẵn: {layout}")
+        except ValueError:
+            layout, rows = synthetic_data.generate(engine, args.students, args.teachers, args.classes,
+                                                   args.classes_per_student, seed=args.seed)
+            generated = True
+            log(f"Sinh {sum(rows.values()):,d} dòng trong {time.perf_counter() - start:.1f} s")
+        generate_s = time.perf_counter() - start
+
+        flows = build_flows(layout, args)
+        if args.flows:
+            selected = [name.strip() for name in args.flows.split(",") if name.strip()]
+            unknown = set(selected) - set(flows)
+            if unknown:
+                parser.error(f"luồng không tồn tại: {', '.join(sorted(unknown))}")
+            flows = {name: flows[name] for name in selected}
+
+        results = asyncio.run(run(app, flows, args))
+        engine.dispose()
+
+        import_profile = {}
+        if args.cold_starts:
+            results["cold_start"] = cold_start.measure(url, args.cold_starts)
+            import_profile = cold_start.import_profile()
+            cold_start.print_summary(results["cold_start"], file=sys.stderr)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "database": url.split(":", 1)[0] if args.url else "sqlite (tạm)",
+            "layout": layout._asdict(),
+            "rows": rows,
+            "generated": generated,
+            "generate_s": round(generate_s, 2),
+            "import_profile_ms": import_profile,
+            "args": {k: v for k, v in vars(args).items() if k not in ("output", "baseline")},
+        },
+        "flows": results,
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+
+    ok = all(not r["errors"] for r in results.values())
+    if args.baseline:
+        ok = compare(results, args.baseline, args.max_regression) and ok
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
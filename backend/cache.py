@@ -0,0 +1,116 @@
+"""
+Cache (TTL + LRU) dùng chung cho backend.
+
+intent_cache: câu trả lời Markdown của chatbot cho các ý định cố định
+(xem điểm, lớp học, phân tích), key = (student_id, intent). Các hàm ghi
+điểm / ghi danh gọi invalidate_students() để xóa dữ liệu cũ.
+
+token_cache / principal_cache: payload JWT đã kiểm tra và thông tin user
+dùng cho xác thực (xem routers/jwt_auth.py). Đổi role / profile gọi
+invalidate_principal().
+
+analytics_cache: báo cáo thống kê học kỳ (xem analytics.py), key chứa phiên
+bản dữ liệu của học kỳ nên không cần xóa; dữ liệu đổi thì key đổi.
+
+Cache có xóa key khi dữ liệu đổi (intent, principal) được tạo qua
+shared.state, nên khi chạy nhiều worker mọi worker cùng thấy lần xóa;
+analytics_cache cũng vậy để báo cáo chỉ tính một lần cho mọi worker.
+token_cache luôn nằm trong process: payload của một token không bao giờ đổi.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, Optional
+
+from . import shared
+from .config import (
+    CHAT_CACHE_TTL, CHAT_CACHE_MAXSIZE,
+    AUTH_TOKEN_CACHE_TTL, AUTH_TOKEN_CACHE_MAXSIZE,
+    AUTH_PRINCIPAL_CACHE_TTL, AUTH_PRINCIPAL_CACHE_MAXSIZE,
+    ANALYTICS_CACHE_TTL, ANALYTICS_CACHE_MAXSIZE,
+)
+
+
+class TTLCache:
+    """Dict có giới hạn kích thước (bỏ phần tử ít dùng nhất) và thời gian sống cho mỗi key."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[1] < time.monotonic():
+                if item is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: Hashable):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+# =========================
+# CHATBOT INTENT CACHE
+# =========================
+CACHED_INTENTS = ("grades", "classes", "analysis")
+
+intent_cache = shared.state.cache("intent", CHAT_CACHE_MAXSIZE, CHAT_CACHE_TTL)
+
+
+def invalidate_students(student_ids: Iterable[int]):
+    """Xóa câu trả lời đã cache của các sinh viên có điểm / lớp vừa thay đổi."""
+    for student_id in set(student_ids):
+        for intent in CACHED_INTENTS:
+            intent_cache.delete((student_id, intent))
+
+
+# =========================
+# AUTH CACHE
+# =========================
+token_cache = TTLCache(AUTH_TOKEN_CACHE_MAXSIZE, AUTH_TOKEN_CACHE_TTL)
+principal_cache = shared.state.cache("principal", AUTH_PRINCIPAL_CACHE_MAXSIZE, AUTH_PRINCIPAL_CACHE_TTL)
+
+
+def invalidate_principal(username: str):
+    """Xóa thông tin xác thực đã cache của user (sau khi đổi role / profile)."""
+    principal_cache.delete(username)
+
+
+# =========================
+# ANALYTICS CACHE
+# =========================
+analytics_cache = shared.state.cache("analytics", ANALYTICS_CACHE_MAXSIZE, ANALYTICS_CACHE_TTL)
@@ -1,6 +1,12 @@
+import base64
+import json
+
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from fastapi import HTTPException
-from . import models, schemas
+from . import models, schemas, grade_aggregates
+from .. import cache
 from typing import List, Optional
 from datetime import date
 
@@ -19,6 +25,97 @@ def get_user_by_username(db: Session, username: str) -> Optional[models.User]:
 def get_users(db: Session, skip: int = 0, limit: int = 100) -> List[models.User]:
     return db.query(models.User).offset(skip).limit(limit).all()
 
+# --- Danh sách user cho admin: lọc + phân trang keyset ---
+USER_PAGE_MAX = 200
+# Đếm tối đa ngần này dòng; nhiều hơn thì tổng chỉ là ước lượng (>= cap)
+USER_COUNT_CAP = 10000
+
+
+def encode_cursor(key: list) -> str:
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> list:
+    """Ngược lại encode_cursor; ValueError nếu cursor hỏng."""
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except Exception:
+        raise ValueError("invalid cursor")
+    if not isinstance(key, list):
+        raise ValueError("invalid cursor")
+    return key
+
+
+def _prefix_range(column, prefix: str):
+    """column LIKE 'prefix%' viết dạng khoảng [prefix, prefix+1) để dùng được index (phân biệt hoa thường)."""
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return and_(column >= prefix, column < upper)
+
+
+def _user_filters(role: Optional[str], name_prefix: Optional[str], username_prefix: Optional[str]) -> list:
+    criteria = []
+    if role:
+        criteria.append(models.User.role == role)
+    if name_prefix:
+        criteria.append(_prefix_range(models.User.full_name, name_prefix))
+    if username_prefix:
+        criteria.append(_prefix_range(models.User.username, username_prefix))
+    return criteria
+
+
+def list_users_page(db: Session, role: Optional[str] = None, name_prefix: Optional[str] = None,
+                    username_prefix: Optional[str] = None, cursor: Optional[str] = None,
+                    limit: int = 50) -> tuple:
+    """
+    Một trang user theo thứ tự của index đang dùng để lọc:
+    username_prefix -> username, name_prefix -> (full_name, user_id), còn lại -> user_id.
+    cursor là khóa sắp xếp của dòng cuối trang trước. Trả về (users, next_cursor).
+    """
+    User = models.User
+    query = db.query(User.user_id, User.username, User.role, User.full_name).filter(
+        *_user_filters(role, name_prefix, username_prefix)
+    )
+    key = decode_cursor(cursor) if cursor else None
+
+    if username_prefix:
+        if key:
+            query = query.filter(User.username > key[0])
+        query = query.order_by(User.username)
+        key_of = lambda row: [row.username]
+    elif name_prefix:
+        if key:
+            query = query.filter(or_(User.full_name > key[0], and_(User.full_name == key[0], User.user_id > key[1])))
+        query = query.order_by(User.full_name, User.user_id)
+        key_of = lambda row: [row.full_name, row.user_id]
+    else:
+        if key:
+            query = query.filter(User.user_id > key[0])
+        query = query.order_by(User.user_id)
+        key_of = lambda row: [row.user_id]
+
+    rows = query.limit(limit + 1).all()
+    next_cursor = encode_cursor(key_of(rows[limit - 1])) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+def count_users(db: Session, role: Optional[str] = None, name_prefix: Optional[str] = None,
+                username_prefix: Optional[str] = None, cap: int = USER_COUNT_CAP) -> tuple:
+    """Số user khớp bộ lọc, đếm tối đa cap + 1 dòng. Trả về (total, exact)."""
+    matched = db.query(models.User.user_id).filter(
+        *_user_filters(role, name_prefix, username_prefix)
+    ).limit(cap + 1).subquery()
+    total = db.query(func.count()).select_from(matched).scalar()
+    return min(total, cap), total <= cap
+
+
+def count_users_by_role(db: Session) -> dict:
+    """{role: số user}, 1 câu GROUP BY trên index (role, user_id)."""
+    counts = {role.value: 0 for role in models.UserRole}
+    for role, count in db.query(models.User.role, func.count()).group_by(models.User.role):
+        counts[role.value] = count
+    return counts
+
+
 def create_user(db: Session, user: schemas.UserCreate) -> models.User:
     db_user = models.User(
         username=user.username,
@@ -142,8 +239,10 @@ def enroll_student(db: Session, enrollment: schemas.EnrollmentCreate) -> models.
         enroll_date=date.today()
     )
     db.add(db_enroll)
+    grade_aggregates.refresh_results(db, enrollment.class_id, [enrollment.student_id])
     db.commit()
     db.refresh(db_enroll)
+    cache.invalidate_students([enrollment.student_id])
     return db_enroll
 
 
@@ -191,6 +290,7 @@ def create_grade(db: Session, grade: schemas.GradeCreate) -> models.Grade:
         score=grade.score,
     )
     db.add(db_grade)
+    grade_aggregates.refresh_results(db, grade.class_id, [grade.student_id])
     db.commit()
     db.refresh(db_grade)
     return db_grade
@@ -204,6 +304,7 @@ def update_grade(db: Session, grade_id: int, data: schemas.GradeUpdate) -> model
     for key, value in data.dict(exclude_unset=True).items():
         setattr(db_grade, key, value)
 
+    grade_aggregates.refresh_results(db, db_grade.class_id, [db_grade.student_id])
     db.commit()
     db.refresh(db_grade)
     return db_grade
@@ -241,3 +342,117 @@ def get_student_grades_by_subject(db: Session, student_id: int) -> dict[str, lis
         subject_scores[g.subject].append(g.score)
 
     return subject_scores
+
+
+# ==============================================================
+# STUDENT DASHBOARD - hồ sơ + lớp + điểm trong 3 câu query
+# ==============================================================
+
+def get_student_dashboard(db: Session, user_id: int) -> Optional[dict]:
+    """
+    Dữ liệu trang chủ sinh viên: hồ sơ, các lớp đã đăng ký (kèm tên giảng viên),
+    điểm thành phần và điểm tổng kết từng lớp (bảng student_class_results).
+    Số câu query cố định, không phụ thuộc số lớp.
+    """
+    row = db.query(models.User, models.Student).outerjoin(
+        models.Student, models.Student.student_id == models.User.user_id
+    ).filter(models.User.user_id == user_id).first()
+    if row is None:
+        return None
+    user, student = row
+    profile = {
+        "user_id": user.user_id,
+        "username": user.username,
+        "full_name": user.full_name,
+        "email": user.email,
+        "role": user.role.value,
+        "student_profile": {
+            "student_id": student.student_id,
+            "student_code": student.student_code,
+            "birthdate": student.birthdate.isoformat() if student.birthdate else None,
+        } if student else None,
+    }
+    if student is None:
+        return {"profile": profile, "classes": []}
+
+    class_rows = (
+        db.query(models.Class, models.StudentClassResult)
+        .join(models.Enrollment, models.Enrollment.class_id == models.Class.class_id)
+        .outerjoin(models.StudentClassResult, and_(
+            models.StudentClassResult.class_id == models.Enrollment.class_id,
+            models.StudentClassResult.student_id == models.Enrollment.student_id
+        ))
+        .filter(models.Enrollment.student_id == student.student_id)
+        .order_by(models.Class.year.desc(), models.Class.semester.desc(), models.Class.class_id)
+        .all()
+    )
+
+    teachers: dict[int, list[str]] = {}
+    for class_id, full_name, username in (
+        db.query(models.TeachingAssignment.class_id, models.User.full_name, models.User.username)
+        .join(models.User, models.User.user_id == models.TeachingAssignment.teacher_id)
+        .join(models.Enrollment, models.Enrollment.class_id == models.TeachingAssignment.class_id)
+        .filter(models.Enrollment.student_id == student.student_id)
+        .order_by(models.TeachingAssignment.class_id, models.User.user_id)
+    ):
+        teachers.setdefault(class_id, []).append(full_name or username)
+
+    classes = []
+    for cls, res in class_rows:
+        classes.append({
+            "class_id": cls.class_id,
+            "class_name": cls.class_name,
+            "year": cls.year,
+            "semester": cls.semester,
+            "teachers": teachers.get(cls.class_id, []),
+            "grades": {
+                "attendance": res.attendance if res else None,
+                "mid": res.mid if res else None,
+                "final": res.final if res else None,
+            },
+            "average": round(res.weighted, 2) if res and res.weighted is not None else None,
+        })
+    return {"profile": profile, "classes": classes}
+
+
+# ==============================================================
+# ASYNC READS (AsyncSession) - cho các route đọc nhiều của sinh viên
+# ==============================================================
+
+async def get_class_async(db: AsyncSession, class_id: int) -> Optional[models.Class]:
+    return await db.get(models.Class, class_id)
+
+
+async def get_student_enrollments_async(db: AsyncSession, student_id: int) -> List[models.Enrollment]:
+    """Lấy danh sách lớp học mà sinh viên đã đăng ký"""
+    result = await db.execute(
+        select(models.Enrollment).where(models.Enrollment.student_id == student_id)
+    )
+    return result.scalars().all()
+
+
+async def get_class_versions_async(db: AsyncSession, student_id: int,
+                                   class_id: Optional[int] = None) -> List[tuple]:
+    """
+    (class_id, version) của lớp class_id, hoặc của các lớp sinh viên đang học.
+    Dùng làm ETag cho danh sách điểm mà không đọc bảng grades.
+    """
+    stmt = select(models.Class.class_id, models.Class.version)
+    if class_id is not None:
+        stmt = stmt.where(models.Class.class_id == class_id)
+    else:
+        stmt = stmt.join(models.Enrollment, models.Enrollment.class_id == models.Class.class_id).where(
+            models.Enrollment.student_id == student_id
+        )
+    result = await db.execute(stmt.order_by(models.Class.class_id))
+    return [tuple(row) for row in result.all()]
+
+
+async def get_student_grades_async(db: AsyncSession, student_id: int,
+                                   class_id: Optional[int] = None) -> List[models.Grade]:
+    """Lấy điểm của sinh viên, có thể filter theo class_id"""
+    stmt = select(models.Grade).where(models.Grade.student_id == student_id)
+    if class_id is not None:
+        stmt = stmt.where(models.Grade.class_id == class_id)
+    result = await db.execute(stmt)
+    return result.scalars().all()
@@ -1,14 +1,135 @@
-from sqlalchemy import create_engine
+"""
+Engine / session dùng chung. Cấu hình qua biến môi trường (xem backend/config.py):
+
+- SQLite (mặc định sqlite:///./test.db): mỗi connection mới được đặt journal_mode
+  (WAL), synchronous, busy_timeout, mmap_size, cache_size và bật foreign_keys.
+- PostgreSQL và các DB server khác: pool_size, max_overflow, pool_timeout,
+  pool_recycle và pool_pre_ping.
+
+Mọi router dùng chung get_db() ở đây. Các route chỉ đọc, gọi nhiều (điểm, lớp
+của sinh viên) dùng get_async_db(): AsyncSession trên engine async cùng cấu hình,
+nên số request đồng thời không bị giới hạn bởi threadpool của Starlette.
+
+Cả hai engine được gắn metrics.instrument_engine() để đếm câu SQL theo request.
+"""
+from typing import Optional
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, URL, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
-
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
+from ..config import (
+    DATABASE_URL, DB_ECHO,
+    SQLITE_JOURNAL_MODE, SQLITE_SYNCHRONOUS, SQLITE_BUSY_TIMEOUT_MS, SQLITE_MMAP_SIZE, SQLITE_CACHE_SIZE,
+    DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE, DB_POOL_PRE_PING,
+    ASYNC_DATABASE_URL,
 )
+from ..metrics import instrument_engine
+
+SQLALCHEMY_DATABASE_URL = DATABASE_URL
+
+
+def sqlite_pragmas(journal_mode: str = SQLITE_JOURNAL_MODE, synchronous: str = SQLITE_SYNCHRONOUS,
+                   busy_timeout_ms: int = SQLITE_BUSY_TIMEOUT_MS, mmap_size: int = SQLITE_MMAP_SIZE,
+                   cache_size: int = SQLITE_CACHE_SIZE):
+    pragmas = {
+        "journal_mode": journal_mode,
+        "synchronous": synchronous,
+        "busy_timeout": busy_timeout_ms,
+        "mmap_size": mmap_size,
+        "cache_size": cache_size,
+        # SQLite mặc định bỏ qua khóa ngoại; xóa lớp dựa vào ON DELETE CASCADE
+        "foreign_keys": "ON",
+    }
+
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+    return on_connect
+
+
+def make_engine(url: str = DATABASE_URL, **sqlite_options) -> Engine:
+    """Tạo engine theo loại DB trong `url`; sqlite_options ghi đè các PRAGMA mặc định."""
+    if make_url(url).get_backend_name() == "sqlite":
+        engine = create_engine(
+            url,
+            echo=DB_ECHO,
+            connect_args={"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000},
+        )
+        event.listen(engine, "connect", sqlite_pragmas(**sqlite_options))
+        return instrument_engine(engine)
+
+    return instrument_engine(create_engine(
+        url,
+        echo=DB_ECHO,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+    ))
+
+
+# Driver async tương ứng với driver đồng bộ
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}
+
+
+def async_url(url: str) -> URL:
+    parsed = make_url(url)
+    driver = ASYNC_DRIVERS.get(parsed.get_backend_name())
+    if driver is None:
+        raise ValueError(f"Không có driver async cho {parsed.get_backend_name()}, hãy đặt ASYNC_DATABASE_URL")
+    return parsed.set(drivername=driver)
+
+
+def make_async_engine(url: str = ASYNC_DATABASE_URL or None, **sqlite_options) -> AsyncEngine:
+    """Như make_engine nhưng cho AsyncSession (cần aiosqlite / asyncpg)."""
+    url = make_url(url) if url else async_url(DATABASE_URL)
+    options = dict(echo=DB_ECHO, pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW,
+                   pool_timeout=DB_POOL_TIMEOUT, pool_recycle=DB_POOL_RECYCLE)
+    if url.get_backend_name() == "sqlite":
+        engine = create_async_engine(url, connect_args={"timeout": SQLITE_BUSY_TIMEOUT_MS / 1000}, **options)
+        event.listen(engine.sync_engine, "connect", sqlite_pragmas(**sqlite_options))
+    else:
+        engine = create_async_engine(url, pool_pre_ping=DB_POOL_PRE_PING, **options)
+    instrument_engine(engine.sync_engine)
+    return engine
+
+
+engine = make_engine()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Engine async tạo khi dùng lần đầu: app vẫn chạy được nếu chưa cài driver async
+async_engine: Optional[AsyncEngine] = None
+AsyncSessionLocal: Optional[async_sessionmaker] = None
+
+
+def get_async_sessionmaker() -> async_sessionmaker:
+    global async_engine, AsyncSessionLocal
+    if AsyncSessionLocal is None:
+        async_engine = make_async_engine()
+        AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession,
+                                               autoflush=False, expire_on_commit=False)
+    return AsyncSessionLocal
+
+def upsert_insert(db):
+    """insert() của dialect có ON CONFLICT (SQLite, PostgreSQL), None nếu dialect không hỗ trợ."""
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+        return insert
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+        return insert
+    return None
+
 Base = declarative_base()
 
 def get_db():
@@ -16,4 +137,12 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+async def get_async_db():
+    async with get_async_sessionmaker()() as db:
+        yield db
+
+async def close_async_engine():
+    if async_engine is not None:
+        await async_engine.dispose()
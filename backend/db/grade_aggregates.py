@@ -0,0 +1,231 @@
+"""
+Bảng tổng hợp điểm, cập nhật tăng dần mỗi khi ghi điểm / ghi danh.
+
+- student_class_results: điểm chuyên cần / giữa kỳ / cuối kỳ và điểm tổng kết
+  (20% - 30% - 50%) của mỗi sinh viên đang học trong lớp.
+- class_grade_summaries: số sinh viên có điểm tổng kết, tổng, min, max và số
+  lượng theo học lực của mỗi lớp.
+
+Bảng grades vẫn là nguồn dữ liệu gốc; các hàm ghi gọi refresh_results() cho
+những sinh viên bị ảnh hưởng trước khi commit. Các hàm đọc (export CSV, chatbot,
+thống kê sinh viên) dùng bảng tổng hợp thay vì quét lại grades.
+
+refresh_results() cũng tăng classes.version của lớp, nên mọi thay đổi ghi danh /
+điểm đều đổi version; các API đọc dùng version làm ETag (xem http_cache.py).
+"""
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import case, func, update
+from sqlalchemy.orm import Session
+
+from .. import logs
+from . import models
+
+log = logs.get_logger(__name__)
+
+COMPONENTS = ("attendance", "mid", "final")
+WEIGHTS = {"attendance": 0.2, "mid": 0.3, "final": 0.5}
+# (tên, ngưỡng dưới) theo thứ tự giảm dần
+BANDS = (("excellent", 8.5), ("good", 7.0), ("average", 5.0), ("weak", float("-inf")))
+
+# Giới hạn số tham số trong một câu IN (...)
+_CHUNK = 500
+
+
+def weighted_average(attendance: Optional[float], mid: Optional[float], final: Optional[float]) -> Optional[float]:
+    """Điểm tổng kết, chỉ tính khi có đủ 3 thành phần."""
+    if attendance is None or mid is None or final is None:
+        return None
+    return attendance * WEIGHTS["attendance"] + mid * WEIGHTS["mid"] + final * WEIGHTS["final"]
+
+
+def grade_band(score: float) -> str:
+    for name, lower in BANDS:
+        if score >= lower:
+            return name
+    return BANDS[-1][0]
+
+
+def _get_summary(db: Session, class_id: int) -> models.ClassGradeSummary:
+    summary = db.get(models.ClassGradeSummary, class_id)
+    if summary is None:
+        summary = models.ClassGradeSummary(
+            class_id=class_id, count=0, total=0.0, min_score=None, max_score=None,
+            band_excellent=0, band_good=0, band_average=0, band_weak=0
+        )
+        db.add(summary)
+    return summary
+
+
+def _apply_delta(summary: models.ClassGradeSummary, old: Optional[float], new: Optional[float]) -> bool:
+    """Cập nhật summary khi điểm tổng kết của 1 sinh viên đổi từ old -> new.
+    Trả về True nếu min/max có thể đã sai (giá trị cũ là min/max) và cần tính lại."""
+    if old == new:
+        return False
+    stale = False
+    if old is not None:
+        summary.count -= 1
+        summary.total -= old
+        band = "band_" + grade_band(old)
+        setattr(summary, band, getattr(summary, band) - 1)
+        stale = old == summary.min_score or old == summary.max_score
+    if new is not None:
+        summary.count += 1
+        summary.total += new
+        band = "band_" + grade_band(new)
+        setattr(summary, band, getattr(summary, band) + 1)
+        summary.min_score = new if summary.min_score is None else min(summary.min_score, new)
+        summary.max_score = new if summary.max_score is None else max(summary.max_score, new)
+    return stale
+
+
+def _recompute_extrema(db: Session, summary: models.ClassGradeSummary):
+    db.flush()
+    lo, hi = db.query(
+        func.min(models.StudentClassResult.weighted), func.max(models.StudentClassResult.weighted)
+    ).filter(models.StudentClassResult.class_id == summary.class_id).one()
+    summary.min_score, summary.max_score = lo, hi
+    if summary.count == 0:
+        summary.total = 0.0
+
+
+def bump_class_versions(db: Session, class_ids) -> None:
+    """Tăng version của các lớp (list id hoặc câu select class_id). Không commit."""
+    db.execute(
+        update(models.Class)
+        .where(models.Class.class_id.in_(class_ids))
+        .values(version=models.Class.version + 1)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def refresh_results(db: Session, class_id: int, student_ids: Iterable[int]) -> None:
+    """
+    Tính lại student_class_results của các sinh viên trong lớp từ bảng grades,
+    cập nhật class_grade_summaries theo chênh lệch và tăng version của lớp.
+    Không commit.
+    """
+    ids = list(set(student_ids))
+    if not ids:
+        return
+    db.flush()
+    bump_class_versions(db, [class_id])
+    summary = _get_summary(db, class_id)
+    stale = False
+
+    for start in range(0, len(ids), _CHUNK):
+        chunk = ids[start:start + _CHUNK]
+        enrolled = {
+            sid for (sid,) in db.query(models.Enrollment.student_id).filter(
+                models.Enrollment.class_id == class_id, models.Enrollment.student_id.in_(chunk)
+            )
+        }
+        scores: Dict[int, Dict[str, float]] = {}
+        if enrolled:
+            for sid, subject, score in db.query(
+                models.Grade.student_id, models.Grade.subject, models.Grade.score
+            ).filter(
+                models.Grade.class_id == class_id,
+                models.Grade.student_id.in_(enrolled),
+                func.lower(models.Grade.subject).in_(COMPONENTS)
+            ):
+                scores.setdefault(sid, {})[subject.lower()] = score
+        existing = {
+            r.student_id: r for r in db.query(models.StudentClassResult).filter(
+                models.StudentClassResult.class_id == class_id,
+                models.StudentClassResult.student_id.in_(chunk)
+            )
+        }
+
+        for sid in chunk:
+            row = existing.get(sid)
+            old = row.weighted if row is not None else None
+            comp = scores.get(sid)
+            if not comp:
+                if row is not None:
+                    db.delete(row)
+                new = None
+            else:
+                if row is None:
+                    row = models.StudentClassResult(student_id=sid, class_id=class_id)
+                    db.add(row)
+                row.attendance = comp.get("attendance")
+                row.mid = comp.get("mid")
+                row.final = comp.get("final")
+                new = row.weighted = weighted_average(row.attendance, row.mid, row.final)
+            stale = _apply_delta(summary, old, new) or stale
+
+    if stale:
+        _recompute_extrema(db, summary)
+
+
+def rebuild_class(db: Session, class_id: int) -> None:
+    """Tính lại toàn bộ bảng tổng hợp của 1 lớp. Không commit."""
+    db.query(models.StudentClassResult).filter(
+        models.StudentClassResult.class_id == class_id
+    ).delete(synchronize_session=False)
+    db.query(models.ClassGradeSummary).filter(
+        models.ClassGradeSummary.class_id == class_id
+    ).delete(synchronize_session=False)
+    db.flush()
+    student_ids = [
+        sid for (sid,) in db.query(models.Enrollment.student_id).filter(models.Enrollment.class_id == class_id)
+    ]
+    refresh_results(db, class_id, student_ids)
+
+
+def rebuild_summary(db: Session, class_id: int) -> None:
+    """
+    Tính lại class_grade_summaries của 1 lớp từ student_class_results bằng một
+    câu truy vấn gộp (dùng khi student_class_results được chép nguyên khối,
+    vd. khôi phục lớp đã lưu trữ). Không commit.
+    """
+    weighted = models.StudentClassResult.weighted
+    band = case(*((weighted >= lower, name) for name, lower in BANDS[:-1]), else_=BANDS[-1][0])
+    db.flush()
+    row = db.query(
+        func.count(weighted), func.coalesce(func.sum(weighted), 0.0), func.min(weighted), func.max(weighted),
+        *(func.coalesce(func.sum(case((band == name, 1), else_=0)), 0) for name, _ in BANDS)
+    ).filter(models.StudentClassResult.class_id == class_id, weighted.isnot(None)).one()
+    summary = _get_summary(db, class_id)
+    summary.count, summary.total, summary.min_score, summary.max_score = row[:4]
+    for (name, _), value in zip(BANDS, row[4:]):
+        setattr(summary, "band_" + name, value)
+
+
+def rebuild_all(db: Session) -> int:
+    """Tính lại bảng tổng hợp cho mọi lớp. Trả về số lớp."""
+    class_ids = [cid for (cid,) in db.query(models.Class.class_id)]
+    for class_id in class_ids:
+        rebuild_class(db, class_id)
+    db.commit()
+    return len(class_ids)
+
+
+def backfill_if_empty(db: Session) -> None:
+    """DB cũ đã có điểm nhưng chưa có bảng tổng hợp -> tính lần đầu."""
+    if db.query(models.ClassGradeSummary.class_id).first() is not None:
+        return
+    if db.query(models.Grade.grade_id).first() is None:
+        return
+    count = rebuild_all(db)
+    log.info("grade summaries backfilled", extra={"classes": count})
+
+
+def summary_dict(summary: Optional[models.ClassGradeSummary]) -> Dict:
+    if summary is None or not summary.count:
+        return {"count": 0, "mean": None, "min": None, "max": None,
+                "bands": {name: 0 for name, _ in BANDS}}
+    return {
+        "count": summary.count,
+        "mean": round(summary.total / summary.count, 2),
+        "min": round(summary.min_score, 2),
+        "max": round(summary.max_score, 2),
+        "bands": {name: getattr(summary, "band_" + name) for name, _ in BANDS},
+    }
+
+
+def get_student_results(db: Session, student_id: int) -> List[models.StudentClassResult]:
+    return db.query(models.StudentClassResult).filter(
+        models.StudentClassResult.student_id == student_id
+    ).order_by(models.StudentClassResult.class_id).all()
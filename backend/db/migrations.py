@@ -0,0 +1,286 @@
+"""
+Migration schema cho database đã tồn tại.
+
+models.Base.metadata.create_all() chỉ tạo bảng còn thiếu, không thêm cột, index
+hay unique key mới vào bảng cũ. Module này so sánh cột / index / khóa ngoại
+(ON DELETE) / AUTOINCREMENT (SQLite) khai báo trong models với DB thực tế và tạo
+phần còn thiếu.
+
+Chạy: python -m backend.db.migrations
+"""
+from typing import List, NamedTuple, Tuple
+
+from sqlalchemy import Column, ForeignKey, UniqueConstraint, inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from sqlalchemy.schema import CreateIndex, CreateTable
+
+from .. import logs
+from . import grade_aggregates, models
+
+log = logs.get_logger(__name__)
+
+
+class IndexSpec(NamedTuple):
+    table: str
+    name: str
+    columns: Tuple[str, ...]
+    unique: bool
+
+
+def expected_indexes() -> List[IndexSpec]:
+    """Tất cả index / unique key được khai báo trong models."""
+    specs = []
+    for table in models.Base.metadata.sorted_tables:
+        for idx in table.indexes:
+            specs.append(IndexSpec(table.name, idx.name, tuple(c.name for c in idx.columns), bool(idx.unique)))
+        for cons in table.constraints:
+            if isinstance(cons, UniqueConstraint) and cons.name:
+                specs.append(IndexSpec(table.name, cons.name, tuple(c.name for c in cons.columns), True))
+    return specs
+
+
+def find_missing_columns(engine: Engine) -> List[Tuple[str, Column]]:
+    """Các cột có trong models nhưng chưa có trong bảng cũ (bỏ qua bảng chưa tồn tại)."""
+    insp = inspect(engine)
+    tables = set(insp.get_table_names())
+    missing = []
+    for table in models.Base.metadata.sorted_tables:
+        if table.name not in tables:
+            continue
+        present = {c["name"] for c in insp.get_columns(table.name)}
+        missing.extend((table.name, col) for col in table.columns if col.name not in present)
+    return missing
+
+
+def add_missing_columns(engine: Engine) -> List[Tuple[str, Column]]:
+    """
+    ALTER TABLE ... ADD COLUMN cho các cột còn thiếu. Cột NOT NULL phải có
+    server_default để điền cho các dòng cũ. Trả về danh sách cột đã thêm.
+    """
+    missing = find_missing_columns(engine)
+    with engine.begin() as conn:
+        for table, col in missing:
+            ddl = f"ALTER TABLE {table} ADD COLUMN {col.name} {col.type.compile(dialect=engine.dialect)}"
+            if col.server_default is not None:
+                ddl += f" DEFAULT {col.server_default.arg}"
+            if not col.nullable:
+                ddl += " NOT NULL"
+            conn.execute(text(ddl))
+    return missing
+
+
+def find_missing_cascades(engine: Engine) -> List[Tuple[str, ForeignKey]]:
+    """Khóa ngoại có ondelete trong models nhưng bảng cũ chưa có (vd. ON DELETE CASCADE)."""
+    insp = inspect(engine)
+    tables = set(insp.get_table_names())
+    missing = []
+    for table in models.Base.metadata.sorted_tables:
+        if table.name not in tables:
+            continue
+        present = {
+            (tuple(fk["constrained_columns"]), fk["referred_table"]): (fk["options"].get("ondelete") or "").upper()
+            for fk in insp.get_foreign_keys(table.name)
+        }
+        for fk in table.foreign_keys:
+            key = ((fk.parent.name,), fk.column.table.name)
+            if fk.ondelete and present.get(key) != fk.ondelete.upper():
+                missing.append((table.name, fk))
+    return missing
+
+
+def _dedupe_grades(conn) -> int:
+    """Xóa điểm trùng (class_id, student_id, subject), giữ bản ghi mới nhất."""
+    result = conn.execute(text(
+        "DELETE FROM grades WHERE grade_id NOT IN ("
+        " SELECT MAX(grade_id) FROM grades GROUP BY class_id, student_id, subject)"
+    ))
+    return result.rowcount or 0
+
+
+def _rebuild_sqlite_tables(engine: Engine, names: List[str]) -> None:
+    """
+    SQLite không sửa được khóa ngoại của bảng có sẵn: tạo bảng mới theo models,
+    chép dữ liệu, xóa bảng cũ rồi đổi tên (quy trình trong tài liệu ALTER TABLE
+    của SQLite), tất cả trong một transaction với foreign_keys tắt.
+    """
+    tables = [t for t in models.Base.metadata.sorted_tables if t.name in names]
+    with engine.connect() as conn:
+        raw = conn.connection.dbapi_connection
+        isolation_level, raw.isolation_level = raw.isolation_level, None  # tự điều khiển BEGIN / COMMIT
+        try:
+            raw.execute("PRAGMA foreign_keys=OFF")  # không có tác dụng bên trong transaction
+            raw.execute("BEGIN")
+            for table in tables:
+                present = {row[1] for row in raw.execute(f"PRAGMA table_info({table.name})")}
+                columns = ", ".join(c.name for c in table.columns if c.name in present)
+                tmp = f"_new_{table.name}"
+                ddl = str(CreateTable(table).compile(dialect=engine.dialect))
+                raw.execute(ddl.replace(f"CREATE TABLE {table.name} ", f"CREATE TABLE {tmp} ", 1))
+                raw.execute(f"INSERT INTO {tmp} ({columns}) SELECT {columns} FROM {table.name}")
+                raw.execute(f"DROP TABLE {table.name}")
+                raw.execute(f"ALTER TABLE {tmp} RENAME TO {table.name}")
+                for idx in table.indexes:
+                    raw.execute(str(CreateIndex(idx).compile(dialect=engine.dialect)))
+            orphans = raw.execute("PRAGMA foreign_key_check").fetchall()
+            raw.execute("COMMIT")
+        except Exception:
+            raw.execute("ROLLBACK")
+            raise
+        finally:
+            raw.execute("PRAGMA foreign_keys=ON")
+            raw.isolation_level = isolation_level
+    if orphans:
+        # Dữ liệu cũ trỏ tới bản ghi không còn: giữ nguyên, chỉ báo
+        log.warning("rows reference missing parents", extra={"tables": sorted({row[0] for row in orphans}),
+                                                              "rows": len(orphans)})
+
+
+def add_missing_cascades(engine: Engine) -> List[Tuple[str, ForeignKey]]:
+    """Tạo lại các khóa ngoại thiếu ON DELETE. Trả về danh sách đã sửa."""
+    missing = find_missing_cascades(engine)
+    if not missing:
+        return missing
+    if engine.dialect.name == "sqlite":
+        tables = sorted({table for table, _ in missing})
+        if "grades" in tables:
+            # Bảng grades tạo lại có luôn unique key (class_id, student_id, subject):
+            # điểm trùng của DB cũ phải xóa trước khi chép sang
+            with engine.begin() as conn:
+                removed = _dedupe_grades(conn)
+            if removed:
+                log.info("duplicate grades removed", extra={"rows": removed})
+        _rebuild_sqlite_tables(engine, tables)
+        return missing
+    insp = inspect(engine)
+    with engine.begin() as conn:
+        for table, fk in missing:
+            for present in insp.get_foreign_keys(table):
+                if present["constrained_columns"] == [fk.parent.name] and present["name"]:
+                    conn.execute(text(f"ALTER TABLE {table} DROP CONSTRAINT {present['name']}"))
+            name = fk.constraint.name or f"fk_{table}_{fk.parent.name}"
+            conn.execute(text(
+                f"ALTER TABLE {table} ADD CONSTRAINT {name} FOREIGN KEY ({fk.parent.name}) "
+                f"REFERENCES {fk.column.table.name} ({fk.column.name}) ON DELETE {fk.ondelete}"
+            ))
+    return missing
+
+
+def find_missing_autoincrement(engine: Engine) -> List[str]:
+    """Bảng khai báo sqlite_autoincrement trong models nhưng bảng SQLite cũ chưa có AUTOINCREMENT."""
+    if engine.dialect.name != "sqlite":
+        return []
+    with engine.connect() as conn:
+        ddl = dict(conn.execute(text("SELECT name, sql FROM sqlite_master WHERE type = 'table'")).all())
+    return [
+        table.name for table in models.Base.metadata.sorted_tables
+        if table.dialect_options["sqlite"]["autoincrement"] and table.name in ddl
+        and "AUTOINCREMENT" not in (ddl[table.name] or "").upper()
+    ]
+
+
+def add_missing_autoincrement(engine: Engine) -> List[str]:
+    """
+    Tạo lại bảng với AUTOINCREMENT (id không bao giờ được dùng lại). Bộ đếm bắt đầu
+    sau id lớn nhất còn lại, kể cả id cũ của lớp đang lưu trữ. Trả về các bảng đã sửa.
+    """
+    missing = find_missing_autoincrement(engine)
+    if not missing:
+        return missing
+    _rebuild_sqlite_tables(engine, missing)
+    if "classes" in missing and "archived_classes" in inspect(engine).get_table_names():
+        with engine.begin() as conn:
+            archived = conn.execute(text("SELECT MAX(class_id) FROM archived_classes")).scalar()
+            if archived is not None:
+                conn.execute(text("DELETE FROM sqlite_sequence WHERE name = 'classes'"))
+                conn.execute(text(
+                    "INSERT INTO sqlite_sequence (name, seq) "
+                    "SELECT 'classes', MAX(COALESCE((SELECT MAX(class_id) FROM classes), 0), :archived)"
+                ), {"archived": archived})
+    return missing
+
+
+def find_missing_indexes(engine: Engine) -> List[IndexSpec]:
+    """Trả về các index có trong models nhưng chưa có trong DB (bỏ qua bảng chưa tồn tại)."""
+    insp = inspect(engine)
+    tables = set(insp.get_table_names())
+    missing = []
+    for spec in expected_indexes():
+        if spec.table not in tables:
+            continue
+        present = insp.get_indexes(spec.table) + insp.get_unique_constraints(spec.table)
+        names = {i.get("name") for i in present}
+        columns = {tuple(i.get("column_names") or ()) for i in present}
+        if spec.name not in names and spec.columns not in columns:
+            missing.append(spec)
+    return missing
+
+
+def _upgrade_tables(engine: Engine) -> None:
+    """Thêm cột mới, ON DELETE và AUTOINCREMENT còn thiếu vào các bảng cũ."""
+    for table, col in add_missing_columns(engine):
+        log.info("column added", extra={"column": f"{table}.{col.name}"})
+    for table, fk in add_missing_cascades(engine):
+        log.info("foreign key rebuilt", extra={"column": f"{table}.{fk.parent.name}", "ondelete": fk.ondelete})
+    for table in add_missing_autoincrement(engine):
+        log.info("table rebuilt with autoincrement", extra={"table": table})
+
+
+def apply_migrations(engine: Engine) -> List[IndexSpec]:
+    """Thêm các cột và tạo các index còn thiếu. Trả về danh sách index đã tạo."""
+    _upgrade_tables(engine)
+    missing = find_missing_indexes(engine)
+    with engine.begin() as conn:
+        for spec in missing:
+            if spec.table == "grades" and spec.unique:
+                removed = _dedupe_grades(conn)
+                if removed:
+                    log.info("duplicate grades removed", extra={"rows": removed, "index": spec.name})
+            unique = "UNIQUE " if spec.unique else ""
+            cols = ", ".join(spec.columns)
+            conn.execute(text(f"CREATE {unique}INDEX IF NOT EXISTS {spec.name} ON {spec.table} ({cols})"))
+            log.info("index created", extra={"index": f"{spec.table}.{spec.name}"})
+    return missing
+
+
+def prepare_database(engine: Engine) -> None:
+    """
+    Bước khởi động của app (lifespan, không chạy lúc import): tạo bảng còn thiếu,
+    thêm cột mới, thêm ON DELETE CASCADE cho khóa ngoại cũ (xóa lớp cần nó) và
+    AUTOINCREMENT cho classes (ETag của lớp cần id không bị dùng lại), tính bảng
+    tổng hợp điểm lần đầu. Index thiếu chỉ được cảnh báo (tạo index trên
+    bảng lớn có thể lâu, chạy riêng bằng lệnh migration).
+    """
+    models.Base.metadata.create_all(bind=engine)
+    _upgrade_tables(engine)
+    check_indexes(engine)
+    with Session(bind=engine) as db:
+        grade_aggregates.backfill_if_empty(db)
+
+
+def check_indexes(engine: Engine) -> List[IndexSpec]:
+    """Kiểm tra lúc khởi động: ghi log cảnh báo nếu DB thiếu index."""
+    missing = find_missing_indexes(engine)
+    if missing:
+        log.warning("database is missing indexes, run: python -m backend.db.migrations", extra={
+            "indexes": [f"{spec.table}.{spec.name} ({', '.join(spec.columns)})" for spec in missing],
+        })
+    return missing
+
+
+if __name__ == "__main__":
+    from .database import engine
+
+    models.Base.metadata.create_all(bind=engine)
+    created = apply_migrations(engine)
+    if created:
+        for spec in created:
+            print(f"✅ Đã tạo index {spec.table}.{spec.name}")
+    else:
+        print("✅ Database đã đủ index")
+
+    from .database import SessionLocal
+
+    with SessionLocal() as db:
+        count = grade_aggregates.rebuild_all(db)
+    print(f"✅ Đã tính lại bảng tổng hợp điểm cho {count} lớp")
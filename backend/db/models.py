@@ -1,5 +1,6 @@
 from sqlalchemy import (
-    Column, Integer, String, Date, ForeignKey, Enum, Float, DateTime, func
+    Column, Integer, String, Date, ForeignKey, Enum, Float, DateTime, func,
+    UniqueConstraint, Index
 )
 from sqlalchemy.orm import relationship
 from .database import Base
@@ -22,6 +23,13 @@ class User(Base):
     email = Column(String, unique=True)
     role = Column(Enum(UserRole), nullable=False, default=UserRole.student)
 
+    __table_args__ = (
+        # Danh sách user của admin: lọc theo role / tiền tố tên, phân trang keyset
+        Index("ix_users_role_user_id", "role", "user_id"),
+        Index("ix_users_full_name_user_id", "full_name", "user_id"),
+        Index("ix_users_role_full_name_user_id", "role", "full_name", "user_id"),
+    )
+
     # Relationships
     teacher_profile = relationship("Teacher", back_populates="user", uselist=False)
     student_profile = relationship("Student", back_populates="user", uselist=False)
@@ -52,46 +60,62 @@ class Student(Base):
 # -------- CLASS --------
 class Class(Base):
     __tablename__ = "classes"
+    # Không dùng lại id của lớp đã xóa / lưu trữ: lớp mới bắt đầu từ version 1, nên id
+    # dùng lại sẽ cho cùng ETag (class_id, version) với lớp cũ. PostgreSQL (SERIAL) vốn vậy.
+    __table_args__ = {"sqlite_autoincrement": True}
 
     class_id = Column(Integer, primary_key=True, index=True)
     class_name = Column(String, nullable=False)
     year = Column(Integer, nullable=False)
     semester = Column(Integer, nullable=False)
+    # Tăng mỗi khi ghi danh / điểm của lớp thay đổi (dùng làm ETag)
+    version = Column(Integer, nullable=False, default=1, server_default="1")
 
-    enrollments = relationship("Enrollment", back_populates="class_")
-    teaching_assignments = relationship("TeachingAssignment", back_populates="class_")
-    grades = relationship("Grade", back_populates="class_")
-    join_codes = relationship("JoinCode", back_populates="class_")
+    # Xóa lớp: DB tự xóa các bảng con (ON DELETE CASCADE), ORM không nạp chúng ra
+    enrollments = relationship("Enrollment", back_populates="class_", passive_deletes=True)
+    teaching_assignments = relationship("TeachingAssignment", back_populates="class_", passive_deletes=True)
+    grades = relationship("Grade", back_populates="class_", passive_deletes=True)
+    join_codes = relationship("JoinCode", back_populates="class_", passive_deletes=True)
 
 # -------- ENROLLMENT (Học sinh - lớp) --------
 class Enrollment(Base):
     __tablename__ = "enrollments"
 
     student_id = Column(Integer, ForeignKey("students.student_id"), primary_key=True)
-    class_id = Column(Integer, ForeignKey("classes.class_id"), primary_key=True)
+    class_id = Column(Integer, ForeignKey("classes.class_id", ondelete="CASCADE"), primary_key=True)
     enroll_date = Column(Date, server_default=func.current_date())
 
     student = relationship("Student", back_populates="enrollments")
     class_ = relationship("Class", back_populates="enrollments")
 
+    # PK (student_id, class_id) phục vụ tra cứu theo sinh viên; index này cho tra cứu theo lớp
+    __table_args__ = (
+        Index("ix_enrollments_class_student", "class_id", "student_id"),
+    )
+
 # -------- TEACHING ASSIGNMENT (Giáo viên - lớp) --------
 class TeachingAssignment(Base):
     __tablename__ = "teaching_assignments"
 
     teacher_id = Column(Integer, ForeignKey("teachers.teacher_id"), primary_key=True)
-    class_id = Column(Integer, ForeignKey("classes.class_id"), primary_key=True)
+    class_id = Column(Integer, ForeignKey("classes.class_id", ondelete="CASCADE"), primary_key=True)
     assigned_date = Column(Date, server_default=func.current_date())
 
     teacher = relationship("Teacher", back_populates="assignments")
     class_ = relationship("Class", back_populates="teaching_assignments")
 
+    # Các route giáo viên lọc theo (class_id, teacher_id)
+    __table_args__ = (
+        Index("ix_teaching_assignments_class_teacher", "class_id", "teacher_id"),
+    )
+
 # -------- GRADE (Điểm học sinh) --------
 class Grade(Base):
     __tablename__ = "grades"
 
     grade_id = Column(Integer, primary_key=True, autoincrement=True)
     student_id = Column(Integer, ForeignKey("students.student_id"), nullable=False)
-    class_id = Column(Integer, ForeignKey("classes.class_id"), nullable=False)
+    class_id = Column(Integer, ForeignKey("classes.class_id", ondelete="CASCADE"), nullable=False)
     subject = Column(String, nullable=False)
     score = Column(Float, nullable=False)
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
@@ -99,11 +123,117 @@ class Grade(Base):
     student = relationship("Student", back_populates="grades")
     class_ = relationship("Class", back_populates="grades")
 
+    # Mỗi sinh viên chỉ có 1 điểm cho mỗi thành phần trong 1 lớp
+    # (cần cho INSERT ... ON CONFLICT trong teacher_crud.save_grades)
+    __table_args__ = (
+        UniqueConstraint("class_id", "student_id", "subject", name="uq_grades_class_student_subject"),
+        # crud.get_student_grades / get_grades_by_student lọc theo student_id (+ class_id)
+        Index("ix_grades_student_class", "student_id", "class_id"),
+    )
+
 #Luu code tham gia lop học
 class JoinCode(Base):
     __tablename__="join_codes"
 
     code= Column(String, primary_key=True, index=True)
-    class_id=Column(Integer, ForeignKey("classes.class_id"), nullable=False)
+    class_id=Column(Integer, ForeignKey("classes.class_id", ondelete="CASCADE"), nullable=False, index=True)
+    # NULL = không hết hạn; đổi mã (rotate) thì mã cũ nhận thời điểm hết hạn
+    expires_at = Column(DateTime, nullable=True)
+
+    class_=relationship("Class", back_populates="join_codes")
+
+# -------- BỘ ĐẾM (cấp số thứ tự trong cùng transaction, vd. mã tham gia lớp) --------
+class Counter(Base):
+    __tablename__ = "counters"
+
+    name = Column(String, primary_key=True)
+    value = Column(Integer, nullable=False, default=0, server_default="0")
+
+# -------- KẾT QUẢ HỌC TẬP (bảng tổng hợp, cập nhật bởi grade_aggregates) --------
+class StudentClassResult(Base):
+    """Điểm thành phần + điểm tổng kết (20-30-50) của 1 sinh viên trong 1 lớp."""
+    __tablename__ = "student_class_results"
+
+    student_id = Column(Integer, ForeignKey("students.student_id"), primary_key=True)
+    class_id = Column(Integer, ForeignKey("classes.class_id", ondelete="CASCADE"), primary_key=True)
+    attendance = Column(Float, nullable=True)
+    mid = Column(Float, nullable=True)
+    final = Column(Float, nullable=True)
+    weighted = Column(Float, nullable=True)  # chỉ có khi đủ 3 thành phần
+
+    __table_args__ = (
+        Index("ix_student_class_results_class_student", "class_id", "student_id"),
+    )
+
+
+class ClassGradeSummary(Base):
+    """Thống kê điểm tổng kết của 1 lớp (chỉ tính sinh viên đủ 3 thành phần)."""
+    __tablename__ = "class_grade_summaries"
+
+    class_id = Column(Integer, ForeignKey("classes.class_id", ondelete="CASCADE"), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+    total = Column(Float, nullable=False, default=0.0)
+    min_score = Column(Float, nullable=True)
+    max_score = Column(Float, nullable=True)
+    band_excellent = Column(Integer, nullable=False, default=0)  # >= 8.5
+    band_good = Column(Integer, nullable=False, default=0)       # 7.0 - 8.5
+    band_average = Column(Integer, nullable=False, default=0)    # 5.0 - 7.0
+    band_weak = Column(Integer, nullable=False, default=0)       # < 5.0
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+
+# -------- LƯU TRỮ LỚP ĐÃ XÓA (soft delete, xem teacher_crud.archive_class) --------
+class ArchivedClass(Base):
+    __tablename__ = "archived_classes"
+
+    archive_id = Column(Integer, primary_key=True, autoincrement=True)
+    class_id = Column(Integer, nullable=False, index=True)  # id cũ; khôi phục thì dùng lại nếu còn trống
+    class_name = Column(String, nullable=False)
+    year = Column(Integer, nullable=False)
+    semester = Column(Integer, nullable=False)
+    version = Column(Integer, nullable=False, default=1)
+    archived_at = Column(DateTime, nullable=False, server_default=func.now())
+    archived_by = Column(Integer, nullable=True)  # user_id người lưu trữ
+
+
+class ArchivedEnrollment(Base):
+    __tablename__ = "archived_enrollments"
+
+    archive_id = Column(Integer, ForeignKey("archived_classes.archive_id", ondelete="CASCADE"), primary_key=True)
+    student_id = Column(Integer, primary_key=True)
+    enroll_date = Column(Date)
+
+
+class ArchivedTeachingAssignment(Base):
+    __tablename__ = "archived_teaching_assignments"
+
+    archive_id = Column(Integer, ForeignKey("archived_classes.archive_id", ondelete="CASCADE"), primary_key=True)
+    teacher_id = Column(Integer, primary_key=True)
+    assigned_date = Column(Date)
 
-    class_=relationship("Class", back_populates="join_codes")
\ No newline at end of file
+    # Danh sách lớp đã lưu trữ của giảng viên
+    __table_args__ = (
+        Index("ix_archived_teaching_assignments_teacher", "teacher_id", "archive_id"),
+    )
+
+
+class ArchivedClassResult(Base):
+    """Bản chép student_class_results: khôi phục lớp không phải tính lại điểm tổng kết."""
+    __tablename__ = "archived_class_results"
+
+    archive_id = Column(Integer, ForeignKey("archived_classes.archive_id", ondelete="CASCADE"), primary_key=True)
+    student_id = Column(Integer, primary_key=True)
+    attendance = Column(Float, nullable=True)
+    mid = Column(Float, nullable=True)
+    final = Column(Float, nullable=True)
+    weighted = Column(Float, nullable=True)
+
+
+class ArchivedGrade(Base):
+    __tablename__ = "archived_grades"
+
+    archive_id = Column(Integer, ForeignKey("archived_classes.archive_id", ondelete="CASCADE"), primary_key=True)
+    student_id = Column(Integer, primary_key=True)
+    subject = Column(String, primary_key=True)
+    score = Column(Float, nullable=False)
+    updated_at = Column(DateTime)
@@ -2,7 +2,7 @@
 Script để tạo dữ liệu mẫu cho sinh viên
 Chạy: python -m backend.seed_student_data
 """
-from . import database, models
+from . import database, models, grade_aggregates
 from ..routers import jwt_auth
 from sqlalchemy.orm import Session
 from datetime import date
@@ -10,6 +10,8 @@ from datetime import date
 def clear_data(db: Session):
     """Xóa dữ liệu cũ"""
     print("🗑️  Đang xóa dữ liệu cũ...")
+    db.query(models.StudentClassResult).delete()
+    db.query(models.ClassGradeSummary).delete()
     db.query(models.Grade).delete()
     db.query(models.Enrollment).delete()
     db.query(models.TeachingAssignment).delete()
@@ -285,6 +287,7 @@ def main():
         classes = seed_classes(db, teachers)
         enrollments = seed_enrollments(db, students, classes)
         grades = seed_grades(db, students, classes)
+        grade_aggregates.rebuild_all(db)
         
         print("=" * 50)
         print("✅ HOÀN THÀNH!")
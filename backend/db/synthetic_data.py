@@ -0,0 +1,260 @@
+"""
+Sinh dữ liệu giả lập cỡ một trường đại học cho load test / benchmark.
+
+Tạo 1 admin, `teachers` giảng viên, `students` sinh viên, `classes` lớp (chia
+đều cho 4 học kỳ, mỗi lớp 1 giảng viên), mỗi sinh viên học `classes_per_student`
+lớp và có đủ 3 điểm thành phần (chuyên cần / giữa kỳ / cuối kỳ) cho mỗi lớp.
+Bảng tổng hợp điểm (student_class_results, class_grade_summaries) được tính
+ngay khi sinh, không cần chạy grade_aggregates.rebuild_all().
+
+Mọi bảng được ghi bằng insert() của SQLAlchemy Core theo lô `batch` dòng,
+trong 1 transaction; bộ nhớ chỉ phụ thuộc kích thước lô và số lớp, nên chạy
+được tới hàng triệu dòng điểm. Dữ liệu xác định theo `seed`; Layout cho biết
+id / username của từng đối tượng để benchmark chọn dữ liệu mà không cần query.
+
+Mọi tài khoản dùng chung mật khẩu PASSWORD (chỉ băm bcrypt 1 lần).
+
+Chạy: python -m backend.db.synthetic_data --students 100000 --teachers 2000 --classes 5000 \\
+          --url sqlite:///./bench.db --reset
+"""
+import argparse
+import random
+import time
+from typing import Dict, Iterator, List, NamedTuple, Tuple
+
+from sqlalchemy import func, insert, inspect, select
+from sqlalchemy.engine import Engine
+
+from . import grade_aggregates, models
+
+PASSWORD = "bench123"
+BATCH = 10000
+TERMS = ((2024, 1), (2024, 2), (2025, 1), (2025, 2))
+
+HO = ["Nguyễn", "Trần", "Lê", "Phạm", "Hoàng", "Huỳnh", "Phan", "Vũ", "Võ", "Đặng", "Bùi", "Đỗ",
+      "Hồ", "Ngô", "Dương", "Lý"]
+DEM = ["Văn", "Thị", "Hữu", "Đức", "Minh", "Ngọc", "Thanh", "Quang", "Gia", "Bảo", "Xuân", "Thu"]
+TEN = ["An", "Bình", "Chi", "Dũng", "Giang", "Hà", "Hải", "Hạnh", "Hiếu", "Hoa", "Hùng", "Hương",
+       "Khánh", "Lan", "Linh", "Long", "Mai", "Nam", "Nga", "Phong", "Phúc", "Quân", "Quỳnh", "Sơn",
+       "Tâm", "Thảo", "Trang", "Trung", "Tuấn", "Tùng", "Uyên", "Việt", "Vy", "Yến"]
+MON = ["Toán cao cấp", "Lập trình Python", "Cơ sở dữ liệu", "Mạng máy tính", "Hệ điều hành",
+       "Kinh tế vi mô", "Tiếng Anh chuyên ngành", "Xác suất thống kê", "Trí tuệ nhân tạo"]
+KHOA = ["Công nghệ thông tin", "Toán - Tin", "Kinh tế", "Ngoại ngữ", "Điện tử viễn thông"]
+HOC_HAM = ["ThS.", "TS.", "PGS.TS."]
+
+
+class Layout(NamedTuple):
+    """Cách đánh id của dữ liệu sinh ra (i bắt đầu từ 0)."""
+    students: int
+    teachers: int
+    classes: int
+    classes_per_student: int
+
+    admin_id = 1
+    admin_username = "admin"
+
+    def teacher_id(self, i: int) -> int:
+        return 2 + i
+
+    def teacher_username(self, i: int) -> str:
+        return f"gv{i:05d}"
+
+    def student_id(self, i: int) -> int:
+        return 2 + self.teachers + i
+
+    def student_username(self, i: int) -> str:
+        return f"sv{i:07d}"
+
+    def student_code(self, i: int) -> str:
+        return f"SV{i:07d}"
+
+    def class_id(self, k: int) -> int:
+        return 1 + k
+
+    def class_teacher(self, k: int) -> int:
+        """Chỉ số giảng viên dạy lớp k."""
+        return k % self.teachers
+
+    def teacher_classes(self, i: int) -> range:
+        """Chỉ số các lớp của giảng viên i."""
+        return range(i, self.classes, self.teachers)
+
+    def student_classes(self, i: int) -> List[int]:
+        """Chỉ số các lớp sinh viên i học (khác nhau vì classes_per_student <= classes)."""
+        start = i * self.classes_per_student
+        return [(start + j) % self.classes for j in range(self.classes_per_student)]
+
+    def class_students(self, k: int) -> List[int]:
+        """Chỉ số các sinh viên học lớp k: t = i * cps + j với t ≡ k (mod classes)."""
+        return [t // self.classes_per_student
+                for t in range(k, self.students * self.classes_per_student, self.classes)]
+
+
+def detect_layout(engine: Engine) -> Layout:
+    """Layout của DB đã sinh trước đó (vd. bằng CLI bên dưới), suy ra từ số dòng."""
+    if not inspect(engine).has_table(models.Enrollment.__tablename__):
+        raise ValueError("Database chưa có bảng")
+    with engine.connect() as conn:
+        def count(model):
+            return conn.execute(select(func.count()).select_from(model)).scalar()
+
+        students, teachers, classes = count(models.Student), count(models.Teacher), count(models.Class)
+        enrollments = count(models.Enrollment)
+    layout = Layout(students, teachers, classes, enrollments // students if students else 0)
+    if not students or enrollments != students * layout.classes_per_student:
+        raise ValueError("Database không phải dữ liệu do synthetic_data sinh ra")
+    return layout
+
+
+def _batches(rows: Iterator[dict], size: int) -> Iterator[List[dict]]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _insert(conn, model, rows: Iterator[dict], batch: int) -> int:
+    count = 0
+    for chunk in _batches(rows, batch):
+        conn.execute(insert(model), chunk)
+        count += len(chunk)
+    return count
+
+
+def _score(rnd: random.Random, ability: float) -> float:
+    return round(min(10.0, max(0.0, rnd.gauss(ability, 1.2))), 1)
+
+
+def generate(engine: Engine, students: int, teachers: int, classes: int, classes_per_student: int = 5,
+             seed: int = 42, batch: int = BATCH, reset: bool = False, password_hash: str = None
+             ) -> Tuple[Layout, Dict[str, int]]:
+    """
+    Sinh dữ liệu vào `engine`. DB phải trống (hoặc reset=True để xóa toàn bộ bảng).
+    Trả về (Layout, số dòng đã ghi theo bảng).
+    """
+    if min(students, teachers, classes) < 1:
+        raise ValueError("students, teachers và classes phải >= 1")
+    if not 1 <= classes_per_student <= classes:
+        raise ValueError("classes_per_student phải nằm trong [1, classes]")
+
+    if reset:
+        models.Base.metadata.drop_all(bind=engine)
+    models.Base.metadata.create_all(bind=engine)
+    with engine.connect() as conn:
+        if conn.execute(select(func.count()).select_from(models.User)).scalar():
+            raise ValueError("Database đã có dữ liệu, dùng reset=True (--reset) để xóa")
+
+    if password_hash is None:
+        from ..passwords import hash_password
+        password_hash = hash_password(PASSWORD)
+
+    layout = Layout(students, teachers, classes, classes_per_student)
+    rnd = random.Random(seed)
+    counts: Dict[str, int] = {}
+
+    def name() -> str:
+        return f"{rnd.choice(HO)} {rnd.choice(DEM)} {rnd.choice(TEN)}"
+
+    def users():
+        yield {"user_id": layout.admin_id, "username": layout.admin_username, "password": password_hash,
+               "full_name": "Quản trị viên", "email": None, "role": models.UserRole.admin}
+        for i in range(teachers):
+            yield {"user_id": layout.teacher_id(i), "username": layout.teacher_username(i),
+                   "password": password_hash, "full_name": name(),
+                   "email": f"{layout.teacher_username(i)}@school.edu.vn", "role": models.UserRole.teacher}
+        for i in range(students):
+            yield {"user_id": layout.student_id(i), "username": layout.student_username(i),
+                   "password": password_hash, "full_name": name(),
+                   "email": f"{layout.student_username(i)}@student.edu.vn", "role": models.UserRole.student}
+
+    # Tổng hợp theo lớp: [count, total, min, max, excellent, good, average, weak]
+    summaries = [[0, 0.0, None, None, 0, 0, 0, 0] for _ in range(classes)]
+    band_index = {band: 4 + n for n, (band, _) in enumerate(grade_aggregates.BANDS)}
+
+    def student_rows(kind: str):
+        # Sinh lại cùng chuỗi ngẫu nhiên cho enrollments / grades / results
+        srnd = random.Random(seed + 1)
+        for i in range(students):
+            ability = srnd.uniform(4.0, 9.5)
+            sid = layout.student_id(i)
+            for k in layout.student_classes(i):
+                cid = layout.class_id(k)
+                scores = {subject: _score(srnd, ability) for subject in grade_aggregates.COMPONENTS}
+                if kind == "enrollments":
+                    yield {"student_id": sid, "class_id": cid}
+                elif kind == "grades":
+                    for subject, score in scores.items():
+                        yield {"student_id": sid, "class_id": cid, "subject": subject, "score": score}
+                else:
+                    weighted = grade_aggregates.weighted_average(**scores)
+                    s = summaries[k]
+                    s[0] += 1
+                    s[1] += weighted
+                    s[2] = weighted if s[2] is None else min(s[2], weighted)
+                    s[3] = weighted if s[3] is None else max(s[3], weighted)
+                    s[band_index[grade_aggregates.grade_band(weighted)]] += 1
+                    yield {"student_id": sid, "class_id": cid, "weighted": weighted, **scores}
+
+    with engine.begin() as conn:
+        counts["users"] = _insert(conn, models.User, users(), batch)
+        counts["teachers"] = _insert(conn, models.Teacher, (
+            {"teacher_id": layout.teacher_id(i), "department": rnd.choice(KHOA), "title": rnd.choice(HOC_HAM)}
+            for i in range(teachers)
+        ), batch)
+        counts["students"] = _insert(conn, models.Student, (
+            {"student_id": layout.student_id(i), "student_code": layout.student_code(i), "birthdate": None}
+            for i in range(students)
+        ), batch)
+        counts["classes"] = _insert(conn, models.Class, (
+            {"class_id": layout.class_id(k), "class_name": f"{MON[k % len(MON)]} {k + 1:05d}",
+             "year": TERMS[k % len(TERMS)][0], "semester": TERMS[k % len(TERMS)][1]}
+            for k in range(classes)
+        ), batch)
+        counts["teaching_assignments"] = _insert(conn, models.TeachingAssignment, (
+            {"teacher_id": layout.teacher_id(layout.class_teacher(k)), "class_id": layout.class_id(k)}
+            for k in range(classes)
+        ), batch)
+        counts["enrollments"] = _insert(conn, models.Enrollment, student_rows("enrollments"), batch)
+        counts["grades"] = _insert(conn, models.Grade, student_rows("grades"), batch)
+        counts["student_class_results"] = _insert(conn, models.StudentClassResult, student_rows("results"), batch)
+        counts["class_grade_summaries"] = _insert(conn, models.ClassGradeSummary, (
+            {"class_id": layout.class_id(k), "count": s[0], "total": s[1], "min_score": s[2], "max_score": s[3],
+             "band_excellent": s[4], "band_good": s[5], "band_average": s[6], "band_weak": s[7]}
+            for k, s in enumerate(summaries)
+        ), batch)
+    return layout, counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=None, help="database URL (mặc định DATABASE_URL)")
+    parser.add_argument("--students", type=int, default=10000)
+    parser.add_argument("--teachers", type=int, default=200)
+    parser.add_argument("--classes", type=int, default=500)
+    parser.add_argument("--classes-per-student", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--batch", type=int, default=BATCH)
+    parser.add_argument("--reset", action="store_true", help="xóa toàn bộ bảng trước khi sinh")
+    args = parser.parse_args()
+
+    from .database import make_engine
+
+    engine = make_engine(args.url) if args.url else make_engine()
+    start = time.perf_counter()
+    layout, counts = generate(engine, args.students, args.teachers, args.classes, args.classes_per_student,
+                              seed=args.seed, batch=args.batch, reset=args.reset)
+    elapsed = time.perf_counter() - start
+    total = sum(counts.values())
+    for table, n in counts.items():
+        print(f"  {table:24s} {n:>10,d}")
+    print(f"✅ Đã ghi {total:,d} dòng trong {elapsed:.1f} s ({total / elapsed:,.0f} dòng/s)")
+    print(f"📝 Đăng nhập: {layout.admin_username}, {layout.teacher_username(0)}, "
+          f"{layout.student_username(0)} / {PASSWORD}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,11 @@
 # backend/db/teacher_crud.py
-from typing import List, Dict, Optional, Tuple
+from typing import List, Dict, Iterable, Iterator, Optional, Tuple
 import secrets
 from sqlalchemy.orm import Session
-from sqlalchemy import and_
-import random
-from . import models, schemas, crud  # assumes crud.get_user_by_username and crud.create_user exist
+from sqlalchemy import and_, delete, func, insert, literal, select
+from . import models, schemas, crud, grade_aggregates  # assumes crud.get_user_by_username and crud.create_user exist
+from .. import cache, join_codes, passwords, search
+from . import database
 from .database import SessionLocal
 
 # --- Helper ---
@@ -19,53 +20,246 @@ def _ensure_student_profile(db: Session, user):
     return student
 
 # --- Get classes that a teacher is assigned to ---
-def get_teacher_classes(db: Session, teacher_id: int) -> List[models.Class]:
+def get_teacher_classes(db: Session, teacher_id: int) -> List[Dict]:
     """
-    Return list of Class models assigned to teacher_id via TeachingAssignment.
+    Return classes assigned to teacher_id via TeachingAssignment, each with its
+    enrolled student count (current_students) and the class average stored in
+    class_grade_summaries. One query for all classes.
     """
-    classes = (
-        db.query(models.Class)
+    student_count = (
+        db.query(func.count(models.Enrollment.student_id))
+        .filter(models.Enrollment.class_id == models.Class.class_id)
+        .correlate(models.Class)
+        .scalar_subquery()
+    )
+    rows = (
+        db.query(models.Class, student_count, models.ClassGradeSummary)
         .join(models.TeachingAssignment, models.Class.class_id == models.TeachingAssignment.class_id)
+        .outerjoin(models.ClassGradeSummary, models.ClassGradeSummary.class_id == models.Class.class_id)
         .filter(models.TeachingAssignment.teacher_id == teacher_id)
         .all()
     )
-    return classes
+    return [
+        {
+            "class_id": c.class_id,
+            "class_name": c.class_name,
+            "year": c.year,
+            "semester": c.semester,
+            "current_students": count,
+            "average": grade_aggregates.summary_dict(summary)["mean"]
+        }
+        for c, count, summary in rows
+    ]
 
 # --- Create a class and assign to teacher ---
 def create_class_for_teacher(db: Session, teacher_id: int, class_in: schemas.ClassCreate) -> models.Class:
+    """Lớp, mã tham gia và phân công được ghi trong cùng một transaction."""
+    join_codes.index.ensure_built(db)
     new_class = models.Class(
         class_name=class_in.class_name,
         year=class_in.year,
         semester=class_in.semester
     )
     db.add(new_class)
+    db.flush()  # cần class_id
+
+    join_codes.allocate(db, new_class.class_id)
+    db.add(models.TeachingAssignment(teacher_id=teacher_id, class_id=new_class.class_id))
     db.commit()
     db.refresh(new_class)
+    return new_class
+
+
+def rotate_join_code(db: Session, class_id: int, ttl: Optional[float] = None, grace: float = 0) -> models.JoinCode:
+    """Cấp mã tham gia mới cho lớp; mã cũ hết hạn sau `grace` giây."""
+    join_code = join_codes.rotate(db, class_id, ttl, grace)
+    grade_aggregates.bump_class_versions(db, [class_id])  # chi tiết lớp (ETag) hiện mã mới
+    db.commit()
+    db.refresh(join_code)
+    return join_code
+
+# --- Delete / archive / restore a class ---
+def _class_student_ids(db: Session, class_id: int) -> List[int]:
+    return [sid for (sid,) in db.query(models.Enrollment.student_id).filter(models.Enrollment.class_id == class_id)]
+
+
+def _delete_class_rows(db: Session, class_id: int):
+    """
+    Một câu DELETE: enrollment, phân công, mã tham gia, điểm và bảng tổng hợp
+    của lớp bị DB xóa theo (ON DELETE CASCADE).
+    """
+    db.execute(delete(models.Class).where(models.Class.class_id == class_id))
+    search.touch(db, class_ids=[class_id])
+    join_codes.touch(db, [class_id])
+
+
+def delete_class(db: Session, class_id: int) -> List[int]:
+    """Xóa hẳn lớp. Trả về id các sinh viên từng học lớp (để xóa cache)."""
+    student_ids = _class_student_ids(db, class_id)
+    _delete_class_rows(db, class_id)
+    db.commit()
+    return student_ids
+
+
+def archive_class(db: Session, class_id: int, archived_by: int) -> Tuple[int, List[int]]:
+    """
+    Soft delete: chép lớp, ghi danh, phân công, điểm và điểm tổng kết sang các bảng archived_*
+    (mỗi bảng một câu INSERT ... SELECT) rồi xóa lớp, tất cả trong một
+    transaction. Trả về (archive_id, id các sinh viên của lớp).
+    """
+    cls = db.get(models.Class, class_id)
+    archived = models.ArchivedClass(class_id=cls.class_id, class_name=cls.class_name, year=cls.year,
+                                    semester=cls.semester, version=cls.version, archived_by=archived_by)
+    db.add(archived)
+    db.flush()
+    archive_id = literal(archived.archive_id)
+
+    db.execute(insert(models.ArchivedEnrollment).from_select(
+        ["archive_id", "student_id", "enroll_date"],
+        select(archive_id, models.Enrollment.student_id, models.Enrollment.enroll_date)
+        .where(models.Enrollment.class_id == class_id)
+    ))
+    db.execute(insert(models.ArchivedTeachingAssignment).from_select(
+        ["archive_id", "teacher_id", "assigned_date"],
+        select(archive_id, models.TeachingAssignment.teacher_id, models.TeachingAssignment.assigned_date)
+        .where(models.TeachingAssignment.class_id == class_id)
+    ))
+    db.execute(insert(models.ArchivedGrade).from_select(
+        ["archive_id", "student_id", "subject", "score", "updated_at"],
+        select(archive_id, models.Grade.student_id, models.Grade.subject, models.Grade.score, models.Grade.updated_at)
+        .where(models.Grade.class_id == class_id)
+    ))
+    db.execute(insert(models.ArchivedClassResult).from_select(
+        ["archive_id", "student_id", "attendance", "mid", "final", "weighted"],
+        select(archive_id, models.StudentClassResult.student_id, models.StudentClassResult.attendance,
+               models.StudentClassResult.mid, models.StudentClassResult.final, models.StudentClassResult.weighted)
+        .where(models.StudentClassResult.class_id == class_id)
+    ))
+    student_ids = _class_student_ids(db, class_id)
+    _delete_class_rows(db, class_id)
+    db.commit()
+    return archived.archive_id, student_ids
 
-    # Tao code vao lop
-    def generate_code():
-        characters = "1234567890QWERTYUIOPASDFGHJKLZXCVBNM"
-        while True:
-            code = ""
-            for i in range(6):
-                code += random.choice(characters)
-            if db.query(models.JoinCode).filter(models.JoinCode.code == code).first() is None:
-                return code
-
-    random_code = generate_code()
-    db_joincode = models.JoinCode(
-        code=random_code,
-        class_id=new_class.class_id
+
+def archived_class_for_teacher(db: Session, teacher_id: int, archive_id: int) -> Optional[models.ArchivedClass]:
+    """Bản lưu trữ nếu giáo viên từng được phân công dạy lớp đó, ngược lại None."""
+    return (
+        db.query(models.ArchivedClass)
+        .join(models.ArchivedTeachingAssignment,
+              models.ArchivedTeachingAssignment.archive_id == models.ArchivedClass.archive_id)
+        .filter(models.ArchivedClass.archive_id == archive_id,
+                models.ArchivedTeachingAssignment.teacher_id == teacher_id)
+        .first()
+    )
+
+
+def get_archived_classes(db: Session, teacher_id: int) -> List[Dict]:
+    """Các lớp đã lưu trữ của giáo viên, mới nhất trước."""
+    student_count = (
+        db.query(func.count(models.ArchivedEnrollment.student_id))
+        .filter(models.ArchivedEnrollment.archive_id == models.ArchivedClass.archive_id)
+        .correlate(models.ArchivedClass)
+        .scalar_subquery()
+    )
+    rows = (
+        db.query(models.ArchivedClass, student_count)
+        .join(models.ArchivedTeachingAssignment,
+              models.ArchivedTeachingAssignment.archive_id == models.ArchivedClass.archive_id)
+        .filter(models.ArchivedTeachingAssignment.teacher_id == teacher_id)
+        .order_by(models.ArchivedClass.archive_id.desc())
+        .all()
     )
-    db.add(db_joincode)
+    return [
+        {
+            "archive_id": a.archive_id,
+            "class_id": a.class_id,
+            "class_name": a.class_name,
+            "year": a.year,
+            "semester": a.semester,
+            "students": count,
+            "archived_at": a.archived_at,
+        }
+        for a, count in rows
+    ]
+
+
+def restore_class(db: Session, archived: models.ArchivedClass) -> Tuple[int, List[int]]:
+    """
+    Khôi phục lớp đã lưu trữ (ngược lại của archive_class): giữ class_id cũ nếu
+    chưa bị lớp khác dùng. Sinh viên / giảng viên đã bị xóa thì bỏ qua. Điểm tổng
+    kết được chép lại, chỉ thống kê lớp được tính lại (một câu truy vấn). Lớp
+    nhận mã tham gia mới. Trả về (class_id, id các sinh viên được ghi danh lại).
+    """
+    archive_id = archived.archive_id
+    taken = db.get(models.Class, archived.class_id) is not None
+    cls = models.Class(class_id=None if taken else archived.class_id, class_name=archived.class_name,
+                       year=archived.year, semester=archived.semester, version=archived.version + 1)
+    db.add(cls)
+    db.flush()
+    class_id = literal(cls.class_id)
+
+    db.execute(insert(models.Enrollment).from_select(
+        ["class_id", "student_id", "enroll_date"],
+        select(class_id, models.ArchivedEnrollment.student_id, models.ArchivedEnrollment.enroll_date)
+        .join(models.Student, models.Student.student_id == models.ArchivedEnrollment.student_id)
+        .where(models.ArchivedEnrollment.archive_id == archive_id)
+    ))
+    db.execute(insert(models.TeachingAssignment).from_select(
+        ["class_id", "teacher_id", "assigned_date"],
+        select(class_id, models.ArchivedTeachingAssignment.teacher_id, models.ArchivedTeachingAssignment.assigned_date)
+        .join(models.Teacher, models.Teacher.teacher_id == models.ArchivedTeachingAssignment.teacher_id)
+        .where(models.ArchivedTeachingAssignment.archive_id == archive_id)
+    ))
+    db.execute(insert(models.Grade).from_select(
+        ["class_id", "student_id", "subject", "score", "updated_at"],
+        select(class_id, models.ArchivedGrade.student_id, models.ArchivedGrade.subject,
+               models.ArchivedGrade.score, models.ArchivedGrade.updated_at)
+        .join(models.Student, models.Student.student_id == models.ArchivedGrade.student_id)
+        .where(models.ArchivedGrade.archive_id == archive_id)
+    ))
+    db.execute(insert(models.StudentClassResult).from_select(
+        ["class_id", "student_id", "attendance", "mid", "final", "weighted"],
+        select(class_id, models.ArchivedClassResult.student_id, models.ArchivedClassResult.attendance,
+               models.ArchivedClassResult.mid, models.ArchivedClassResult.final, models.ArchivedClassResult.weighted)
+        .join(models.Student, models.Student.student_id == models.ArchivedClassResult.student_id)
+        .where(models.ArchivedClassResult.archive_id == archive_id)
+    ))
+    db.execute(delete(models.ArchivedClass).where(models.ArchivedClass.archive_id == archive_id))
+
+    join_codes.allocate(db, cls.class_id)
+    grade_aggregates.rebuild_summary(db, cls.class_id)
+    student_ids = _class_student_ids(db, cls.class_id)
     db.commit()
-    db.refresh(db_joincode)
-    
-    # create teaching assignment
-    ta = models.TeachingAssignment(teacher_id=teacher_id, class_id=new_class.class_id)
-    db.add(ta)
+    return cls.class_id, student_ids
+
+
+def purge_archived_class(db: Session, archive_id: int):
+    """Xóa hẳn bản lưu trữ (các bảng archived_* con bị xóa theo ON DELETE CASCADE)."""
+    db.execute(delete(models.ArchivedClass).where(models.ArchivedClass.archive_id == archive_id))
     db.commit()
-    return new_class
+
+# --- Class versions (ETag), không đọc bảng điểm ---
+def assigned_class_version(db: Session, teacher_id: int, class_id: int) -> Optional[int]:
+    """classes.version nếu giáo viên được phân công dạy lớp, ngược lại None."""
+    return (
+        db.query(models.Class.version)
+        .join(models.TeachingAssignment, models.TeachingAssignment.class_id == models.Class.class_id)
+        .filter(models.Class.class_id == class_id, models.TeachingAssignment.teacher_id == teacher_id)
+        .scalar()
+    )
+
+def term_class_versions(db: Session, teacher_id: int, year: int, semester: int) -> List[Tuple[int, int]]:
+    """(class_id, version) của các lớp giáo viên dạy trong năm học / học kỳ."""
+    return [
+        tuple(row) for row in db.query(models.Class.class_id, models.Class.version)
+        .join(models.TeachingAssignment, models.TeachingAssignment.class_id == models.Class.class_id)
+        .filter(
+            models.TeachingAssignment.teacher_id == teacher_id,
+            models.Class.year == year,
+            models.Class.semester == semester
+        )
+        .order_by(models.Class.class_id)
+    ]
 
 # --- Get detailed class info: class + enrolled students + grades ---
 def get_class_detail(db: Session, class_id: int) -> Optional[Dict]:
@@ -73,25 +267,24 @@ def get_class_detail(db: Session, class_id: int) -> Optional[Dict]:
     if not cls:
         return None
 
-    # students via enrollments
+    # students via enrollments, component scores from the aggregate table
     enroll_rows = (
-        db.query(models.Enrollment, models.Student, models.User)
+        db.query(models.Enrollment, models.Student, models.User, models.StudentClassResult)
         .join(models.Student, models.Enrollment.student_id == models.Student.student_id)
         .join(models.User, models.User.user_id == models.Student.student_id)
+        .outerjoin(models.StudentClassResult, and_(
+            models.StudentClassResult.class_id == models.Enrollment.class_id,
+            models.StudentClassResult.student_id == models.Enrollment.student_id
+        ))
         .filter(models.Enrollment.class_id == class_id)
         .all()
     )
 
-    # fetch all grades for this class
-    grade_rows = db.query(models.Grade).filter(models.Grade.class_id == class_id).all()
-    # build mapping (student_id -> { subject: score, ... })
-    grade_map = {}
-    for g in grade_rows:
-        grade_map.setdefault(g.student_id, {})[g.subject] = g.score
+    def score(value):
+        return "" if value is None else value
 
     students = []
-    for enroll, student, user in enroll_rows:
-        g = grade_map.get(student.student_id, {})
+    for enroll, student, user, res in enroll_rows:
         students.append({
             "student_id": student.student_id,
             "full_name": user.full_name or user.username,
@@ -99,10 +292,11 @@ def get_class_detail(db: Session, class_id: int) -> Optional[Dict]:
             # Map to the three fields expected by the frontend (attendance, mid, final).
             # If you support arbitrary subjects later, adapt frontend or return list form.
             "grades": {
-                "attendance": g.get("attendance", "") if g.get("attendance", None) is not None else "",
-                "mid": g.get("mid", "") if g.get("mid", None) is not None else "",
-                "final": g.get("final", "") if g.get("final", None) is not None else ""
-            }
+                "attendance": score(res.attendance) if res else "",
+                "mid": score(res.mid) if res else "",
+                "final": score(res.final) if res else ""
+            },
+            "average": round(res.weighted, 2) if res and res.weighted is not None else None
         })
 
     result = {
@@ -110,13 +304,63 @@ def get_class_detail(db: Session, class_id: int) -> Optional[Dict]:
         "class_name": cls.class_name,
         "year": cls.year,
         "semester": cls.semester,
-        "join_code":cls.join_codes[0].code if cls.join_codes else None,
+        "join_code": join_codes.active_code(cls.join_codes),
         # optional: expose max_students or other metadata; if not in model you can set None
         "max_students": getattr(cls, "max_students", None),
-        "students": students
+        "students": students,
+        "summary": grade_aggregates.summary_dict(db.get(models.ClassGradeSummary, class_id))
     }
     return result
 
+# --- Rows for CSV export (streamed) ---
+EXPORT_BATCH_SIZE = 1000
+
+def iter_export_rows(db: Session, *criteria) -> Iterator[Tuple]:
+    """
+    Yield (class_id, class_name, full_name, student_code, attendance, mid, final, weighted)
+    for the enrollments matching `criteria`, ordered by class then student.
+    Uses a server-side cursor (stream_results) fetched EXPORT_BATCH_SIZE rows at a time,
+    so memory stays flat regardless of how many rows are exported.
+    """
+    result = models.StudentClassResult
+    query = (
+        db.query(
+            models.Class.class_id,
+            models.Class.class_name,
+            func.coalesce(models.User.full_name, models.User.username),
+            models.Student.student_code,
+            result.attendance,
+            result.mid,
+            result.final,
+            result.weighted
+        )
+        .select_from(models.Enrollment)
+        .join(models.Class, models.Class.class_id == models.Enrollment.class_id)
+        .join(models.Student, models.Student.student_id == models.Enrollment.student_id)
+        .join(models.User, models.User.user_id == models.Enrollment.student_id)
+        .outerjoin(result, and_(
+            result.class_id == models.Enrollment.class_id,
+            result.student_id == models.Enrollment.student_id
+        ))
+        .filter(*criteria)
+        .order_by(models.Enrollment.class_id, models.Enrollment.student_id)
+        .execution_options(stream_results=True, yield_per=EXPORT_BATCH_SIZE)
+    )
+    for row in query:
+        yield tuple(row)
+
+def teacher_term_class_ids(teacher_id: int, year: int, semester: int):
+    """Subquery: ids of the teacher's classes in a given year/semester."""
+    return (
+        select(models.Class.class_id)
+        .join(models.TeachingAssignment, models.TeachingAssignment.class_id == models.Class.class_id)
+        .where(
+            models.TeachingAssignment.teacher_id == teacher_id,
+            models.Class.year == year,
+            models.Class.semester == semester
+        )
+    )
+
 # --- Add (or create) a student and enroll into class ---
 def add_student_to_class(db: Session, class_id: int, full_name: str, student_code: str) -> Dict:
     """
@@ -149,11 +393,13 @@ def add_student_to_class(db: Session, class_id: int, full_name: str, student_cod
             )
             user = crud.create_user(db, uc)
 
-        # Create student profile
-        student = models.Student(student_id=user.user_id, student_code=student_code)
-        db.add(student)
-        db.commit()
-        db.refresh(student)
+        # create_user already created the profile for a new user; an existing user may lack one
+        student = db.get(models.Student, user.user_id)
+        if student is None:
+            student = models.Student(student_id=user.user_id, student_code=student_code)
+            db.add(student)
+            db.commit()
+            db.refresh(student)
 
     # Ensure enrollment (student can be enrolled in multiple classes)
     enrollment = db.query(models.Enrollment).filter(
@@ -163,7 +409,10 @@ def add_student_to_class(db: Session, class_id: int, full_name: str, student_cod
     if not enrollment:
         enrollment = models.Enrollment(student_id=student.student_id, class_id=class_id)
         db.add(enrollment)
+        # Sinh viên ghi danh lại có thể đã có điểm cũ trong lớp
+        grade_aggregates.refresh_results(db, class_id, [student.student_id])
         db.commit()
+        cache.invalidate_students([student.student_id])
     else:
         # Student already enrolled in this class
         raise Exception(f"Student {student_code} is already enrolled in this class")
@@ -174,6 +423,117 @@ def add_student_to_class(db: Session, class_id: int, full_name: str, student_cod
         "student_code": student.student_code
     }
 
+# --- Bulk add students to class (CSV import) ---
+# Số dòng CSV xử lý mỗi lượt (giữ câu IN (...) dưới giới hạn tham số của SQLite)
+IMPORT_BATCH_SIZE = 500
+
+def bulk_add_students_to_class(db: Session, class_id: int,
+                               rows: Iterable[Tuple[int, str, str]]) -> Tuple[int, List[Tuple[int, str]]]:
+    """
+    Batch version of add_student_to_class for CSV import.
+    rows: (row_no, full_name, student_code) in file order.
+
+    Each batch of IMPORT_BATCH_SIZE rows resolves student codes, usernames and existing
+    enrollments with one set-based query each, then bulk-inserts the missing users,
+    student profiles and enrollments. Everything is committed once at the end.
+    Returns (added_count, errors) with one (row_no, message) per rejected row.
+    """
+    added: List[int] = []
+    errors: List[Tuple[int, str]] = []
+    enrolled = set()  # student_id đã có trong lớp (trong DB hoặc vừa thêm từ file)
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            _import_batch(db, class_id, batch, enrolled, added, errors)
+            batch = []
+    if batch:
+        _import_batch(db, class_id, batch, enrolled, added, errors)
+
+    # Sinh viên ghi danh lại có thể đã có điểm cũ trong lớp
+    grade_aggregates.refresh_results(db, class_id, added)
+    db.commit()
+    cache.invalidate_students(added)
+    return len(added), errors
+
+def _import_batch(db: Session, class_id: int, batch: List[Tuple[int, str, str]],
+                  enrolled: set, added: List[int], errors: List[Tuple[int, str]]):
+    codes = {code for _, _, code in batch}
+
+    # student_code -> (student_id, user_id or None)
+    students = {
+        code: (student_id, user_id)
+        for code, student_id, user_id in db.query(
+            models.Student.student_code, models.Student.student_id, models.User.user_id
+        ).outerjoin(models.User, models.User.user_id == models.Student.student_id)
+        .filter(models.Student.student_code.in_(codes))
+    }
+
+    # Mã chưa có hồ sơ sinh viên: tìm user có username == mã (có thể đã có hồ sơ với mã khác)
+    missing = codes - students.keys()
+    users = {
+        username: (user_id, profile_id)
+        for username, user_id, profile_id in db.query(
+            models.User.username, models.User.user_id, models.Student.student_id
+        ).outerjoin(models.Student, models.Student.student_id == models.User.user_id)
+        .filter(models.User.username.in_(missing))
+    } if missing else {}
+
+    # Tạo user mới (chưa có mật khẩu dùng được) cho mã chưa có user, tên lấy từ dòng đầu tiên
+    names = {}
+    for _, full_name, code in batch:
+        names.setdefault(code, full_name)
+    new_usernames = [code for code in missing if code not in users]
+    if new_usernames:
+        db.execute(insert(models.User), [
+            {"username": code, "password": passwords.UNUSABLE_PASSWORD,
+             "full_name": names[code], "email": None, "role": models.UserRole.student}
+            for code in new_usernames
+        ])
+        users.update(
+            (username, (user_id, None))
+            for username, user_id in db.query(models.User.username, models.User.user_id)
+            .filter(models.User.username.in_(new_usernames))
+        )
+
+    new_profiles = [
+        {"student_id": user_id, "student_code": code}
+        for code, (user_id, profile_id) in users.items() if profile_id is None
+    ]
+    if new_profiles:
+        db.execute(insert(models.Student), new_profiles)
+        # INSERT hàng loạt không qua ORM: báo cho index tìm kiếm
+        search.touch(db, [profile["student_id"] for profile in new_profiles])
+        for profile in new_profiles:
+            students[profile["student_code"]] = (profile["student_id"], profile["student_id"])
+
+    candidate_ids = [student_id for student_id, _ in students.values()]
+    if candidate_ids:
+        enrolled.update(
+            student_id for (student_id,) in db.query(models.Enrollment.student_id).filter(
+                models.Enrollment.class_id == class_id,
+                models.Enrollment.student_id.in_(candidate_ids)
+            )
+        )
+
+    new_enrollments = []
+    for row_no, _, code in batch:
+        if code not in students:
+            # username == mã đã thuộc về một sinh viên có mã khác
+            errors.append((row_no, f"Row {row_no} ({code}): Student code already exists"))
+            continue
+        student_id, user_id = students[code]
+        if user_id is None:
+            errors.append((row_no, f"Row {row_no} ({code}): Student with code {code} exists but has no user account"))
+        elif student_id in enrolled:
+            errors.append((row_no, f"Row {row_no} ({code}): Already enrolled in class"))
+        else:
+            enrolled.add(student_id)
+            added.append(student_id)
+            new_enrollments.append({"student_id": student_id, "class_id": class_id})
+    if new_enrollments:
+        db.execute(insert(models.Enrollment), new_enrollments)
+
 # --- Remove (unenroll) a student from class ---
 def remove_student_from_class(db: Session, class_id: int, student_id: int) -> bool:
     enrollment = db.query(models.Enrollment).filter(
@@ -183,28 +543,88 @@ def remove_student_from_class(db: Session, class_id: int, student_id: int) -> bo
     if not enrollment:
         return False
     db.delete(enrollment)
+    grade_aggregates.refresh_results(db, class_id, [student_id])
     db.commit()
+    cache.invalidate_students([student_id])
     return True
 
 # --- Save or update grades for a class ---
-def save_grades(db: Session, class_id: int, grades: List[Dict]) -> None:
+# Số dòng tối đa trong một câu INSERT (4 tham số/dòng, SQLite cũ giới hạn 999 biến)
+GRADE_UPSERT_BATCH_SIZE = 200
+
+
+def save_grades(db: Session, class_id: int, grades: List[Dict]) -> Dict[str, int]:
     """
     grades: list of { student_id, subject, score }
     Subject expected: "attendance", "mid", "final" (matching frontend).
+
+    Upsert theo lô: 1 câu SELECT đọc điểm hiện có của các sinh viên trong lô,
+    sau đó 1 câu INSERT ... ON CONFLICT DO UPDATE cho các dòng mới/thay đổi.
+    Returns counts: { inserted, updated, unchanged }.
     """
+    # Gộp các dòng trùng key, dòng sau ghi đè dòng trước (giống vòng lặp cũ)
+    wanted: Dict[Tuple[int, str], float] = {}
     for g in grades:
-        student_id = int(g["student_id"])
-        subject = str(g["subject"])
-        score = float(g["score"])
-
-        existing = db.query(models.Grade).filter(
-            models.Grade.class_id == class_id,
-            models.Grade.student_id == student_id,
-            models.Grade.subject == subject
-        ).first()
-        if existing:
-            existing.score = score
+        wanted[(int(g["student_id"]), str(g["subject"]))] = float(g["score"])
+
+    counts = {"inserted": 0, "updated": 0, "unchanged": 0}
+    if not wanted:
+        return counts
+
+    insert = database.upsert_insert(db)
+    keys = list(wanted.keys())
+    changed_students = set()
+    for start in range(0, len(keys), GRADE_UPSERT_BATCH_SIZE):
+        batch = keys[start:start + GRADE_UPSERT_BATCH_SIZE]
+        student_ids = {sid for sid, _ in batch}
+
+        existing = {
+            (sid, subject): score
+            for sid, subject, score in db.query(
+                models.Grade.student_id, models.Grade.subject, models.Grade.score
+            ).filter(
+                models.Grade.class_id == class_id,
+                models.Grade.student_id.in_(student_ids)
+            )
+        }
+
+        rows = []
+        for key in batch:
+            score = wanted[key]
+            if key not in existing:
+                counts["inserted"] += 1
+            elif existing[key] != score:
+                counts["updated"] += 1
+            else:
+                counts["unchanged"] += 1
+                continue
+            rows.append({"class_id": class_id, "student_id": key[0], "subject": key[1], "score": score})
+
+        if not rows:
+            continue
+
+        if insert is not None:
+            stmt = insert(models.Grade).values(rows)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["class_id", "student_id", "subject"],
+                set_={"score": stmt.excluded.score, "updated_at": func.now()}
+            )
+            db.execute(stmt)
         else:
-            newg = models.Grade(student_id=student_id, class_id=class_id, subject=subject, score=score)
-            db.add(newg)
+            # Dialect khác: fallback từng dòng
+            for row in rows:
+                existing_grade = db.query(models.Grade).filter(
+                    models.Grade.class_id == class_id,
+                    models.Grade.student_id == row["student_id"],
+                    models.Grade.subject == row["subject"]
+                ).first()
+                if existing_grade:
+                    existing_grade.score = row["score"]
+                else:
+                    db.add(models.Grade(**row))
+        changed_students.update(row["student_id"] for row in rows)
+
+    grade_aggregates.refresh_results(db, class_id, changed_students)
     db.commit()
+    cache.invalidate_students(sid for sid, _ in keys)
+    return counts
@@ -0,0 +1,58 @@
+"""
+ETag / If-None-Match cho các API JSON đọc nhiều.
+
+json_with_etag() render body JSON, lấy ETag = sha256 của body; nếu client gửi
+If-None-Match khớp thì trả 304 không có body. Cache-Control "private, no-cache"
+để trình duyệt luôn hỏi lại server nhưng được dùng bản đã lưu khi nhận 304.
+
+Với dữ liệu theo lớp (chi tiết lớp, điểm, export), ETag lấy từ classes.version
+qua version_etag(): kiểm tra If-None-Match chỉ cần đọc version, không cần truy
+vấn bảng điểm.
+"""
+import hashlib
+from typing import Any, Optional
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+CACHE_CONTROL = "private, no-cache"
+
+
+def make_etag(body: bytes) -> str:
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def version_etag(*parts: Any) -> str:
+    """ETag mạnh từ các phần định danh phiên bản (vd: "class-detail", class_id, version)."""
+    return make_etag(repr(parts).encode("utf-8"))
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """So khớp If-None-Match (so sánh yếu: bỏ qua tiền tố W/)."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    candidates = (tag.strip() for tag in header.split(","))
+    return any(tag.removeprefix("W/") == etag.removeprefix("W/") for tag in candidates)
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+
+
+def set_etag(response: Response, etag: str) -> None:
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
+
+
+def json_with_etag(request: Request, content: Any, etag: Optional[str] = None) -> Response:
+    """JSONResponse có ETag (mặc định tính từ body), hoặc 304 nếu client đã có bản này."""
+    response = JSONResponse(jsonable_encoder(content))
+    etag = etag or make_etag(response.body)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    set_etag(response, etag)
+    return response
@@ -0,0 +1,287 @@
+"""
+Mã tham gia lớp (6 ký tự 0-9A-Z).
+
+Cấp mã không cần thử-rồi-kiểm-tra: mỗi mã ứng với một số thứ tự lấy từ bộ đếm
+"join_code" (bảng counters) trong cùng transaction với lớp học. Số thứ tự được
+xáo trộn bằng một hoán vị có khóa (mạng Feistel 4 vòng trên 36^3 x 36^3), nên
+hai số khác nhau luôn cho hai mã khác nhau và mã trông ngẫu nhiên. UPDATE bộ
+đếm khóa dòng đó tới khi commit nên các lớp tạo đồng thời không thể nhận cùng
+số, kể cả khi chạy nhiều worker.
+
+Mã ngẫu nhiên tạo trước đây vẫn dùng được; số thứ tự nào rơi đúng vào một mã
+cũ thì bỏ qua (kiểm tra trong index, không truy vấn DB).
+
+Mã có thể hết hạn (join_codes.expires_at, mặc định theo JOIN_CODE_TTL_DAYS) và
+được đổi bằng rotate(): mã cũ hết hạn ngay hoặc sau `grace` giây.
+
+Tra mã khi sinh viên tham gia lớp dùng index trong bộ nhớ (mã -> lớp, hạn).
+Giống search.py: commit có đổi mã của lớp nào (touch()) thì đánh dấu lớp đó,
+lần tra kế tiếp nạp lại bằng session của request; worker khác nhận qua
+shared.state ("join-code").
+"""
+import hashlib
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set
+
+from sqlalchemy import event, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from . import shared
+from .config import JOIN_CODE_KEY, JOIN_CODE_TTL_DAYS, SHARED_EVENT_RETENTION
+from .db import database, models
+
+ALPHABET = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+LENGTH = 6
+_HALF = len(ALPHABET) ** (LENGTH // 2)
+CAPACITY = _HALF * _HALF  # số mã có thể cấp
+_ROUNDS = 4
+_KEY = hashlib.blake2b(JOIN_CODE_KEY.encode(), digest_size=32).digest()
+COUNTER = "join_code"
+
+
+class CodesExhausted(Exception):
+    """Bộ đếm đã dùng hết CAPACITY mã."""
+
+
+# =========================
+# SỐ THỨ TỰ -> MÃ
+# =========================
+def _round(value: int, i: int) -> int:
+    digest = hashlib.blake2b(f"{i}:{value}".encode(), key=_KEY, digest_size=8).digest()
+    return int.from_bytes(digest, "big") % _HALF
+
+
+def permute(seq: int) -> int:
+    """Hoán vị có khóa của [0, CAPACITY): khác đầu vào -> khác đầu ra."""
+    if not 0 <= seq < CAPACITY:
+        raise CodesExhausted(seq)
+    left, right = divmod(seq, _HALF)
+    for i in range(_ROUNDS):
+        left, right = right, (left + _round(right, i)) % _HALF
+    return left * _HALF + right
+
+
+def encode(seq: int) -> str:
+    n = permute(seq)
+    chars = []
+    for _ in range(LENGTH):
+        n, digit = divmod(n, len(ALPHABET))
+        chars.append(ALPHABET[digit])
+    return "".join(reversed(chars))
+
+
+def normalize(code: str) -> str:
+    return (code or "").strip().upper()
+
+
+def _utcnow() -> datetime:
+    # Cột DateTime không lưu múi giờ: luôn ghi giờ UTC
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _timestamp(value: Optional[datetime]) -> Optional[float]:
+    return value.replace(tzinfo=timezone.utc).timestamp() if value is not None else None
+
+
+def default_ttl() -> Optional[float]:
+    return JOIN_CODE_TTL_DAYS * 86400 if JOIN_CODE_TTL_DAYS > 0 else None
+
+
+def active_code(codes: Iterable[models.JoinCode]) -> Optional[str]:
+    """Mã còn hiệu lực của một lớp (nếu có nhiều thì lấy mã hết hạn muộn nhất)."""
+    now = _utcnow()
+    valid = [c for c in codes if c.expires_at is None or c.expires_at > now]
+    if not valid:
+        return None
+    return max(valid, key=lambda c: (c.expires_at is None, c.expires_at or now)).code
+
+
+# =========================
+# CẤP / ĐỔI MÃ (không commit, người gọi commit cùng lớp học)
+# =========================
+def _next_value(db: Session, name: str) -> int:
+    """Tăng bộ đếm (tạo nếu chưa có) và trả về giá trị mới; dòng bộ đếm bị khóa tới khi transaction kết thúc."""
+    counter = models.Counter
+    insert = database.upsert_insert(db)
+    if insert is not None:
+        # Một câu lệnh: hai transaction cùng cấp mã đầu tiên không thể cùng INSERT dòng bộ đếm
+        stmt = insert(counter).values(name=name, value=1)
+        stmt = stmt.on_conflict_do_update(index_elements=[counter.name], set_={"value": counter.value + 1})
+        return db.execute(stmt.returning(counter.value)).scalar_one()
+
+    updated = db.execute(update(counter).where(counter.name == name).values(value=counter.value + 1))
+    if updated.rowcount == 0:
+        try:
+            with db.begin_nested():  # transaction khác vừa tạo dòng bộ đếm -> tăng dòng đó
+                db.add(counter(name=name, value=1))
+            return 1
+        except IntegrityError:
+            db.execute(update(counter).where(counter.name == name).values(value=counter.value + 1))
+    return db.execute(select(counter.value).where(counter.name == name)).scalar_one()
+
+
+def allocate(db: Session, class_id: int, ttl: Optional[float] = None) -> models.JoinCode:
+    """Thêm mã mới cho lớp vào session. `ttl` (giây) mặc định theo JOIN_CODE_TTL_DAYS."""
+    index.ensure_built(db)
+    while True:
+        code = encode(_next_value(db, COUNTER))
+        if not index.taken(code):  # chỉ có thể trùng mã ngẫu nhiên tạo trước đây
+            break
+    ttl = default_ttl() if ttl is None else ttl
+    join_code = models.JoinCode(
+        code=code,
+        class_id=class_id,
+        expires_at=_utcnow() + timedelta(seconds=ttl) if ttl else None,
+    )
+    db.add(join_code)
+    touch(db, [class_id])
+    return join_code
+
+
+def rotate(db: Session, class_id: int, ttl: Optional[float] = None, grace: float = 0) -> models.JoinCode:
+    """Cấp mã mới cho lớp; các mã đang hiệu lực hết hạn sau `grace` giây."""
+    expires = _utcnow() + timedelta(seconds=grace)
+    db.execute(
+        update(models.JoinCode)
+        .where(models.JoinCode.class_id == class_id,
+               or_(models.JoinCode.expires_at.is_(None), models.JoinCode.expires_at > expires))
+        .values(expires_at=expires)
+        .execution_options(synchronize_session=False)
+    )
+    return allocate(db, class_id, ttl)
+
+
+# =========================
+# INDEX TRA MÃ
+# =========================
+class Entry(NamedTuple):
+    class_id: int
+    expires: Optional[float]  # timestamp UTC, None = không hết hạn
+
+
+class JoinCodeIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.ready = False
+        self._codes: Dict[str, Entry] = {}
+        self._by_class: Dict[int, Set[str]] = {}
+        self._cursor = 0                                             # sự kiện "join-code" đã áp dụng
+        self._synced_at = 0.0
+        self._stale: Set[int] = set()                                # lớp commit trong process này
+        self._stale_lock = threading.Lock()
+
+    @staticmethod
+    def _load(db: Session, class_ids: Optional[List[int]] = None):
+        query = db.query(models.JoinCode.code, models.JoinCode.class_id, models.JoinCode.expires_at)
+        if class_ids is not None:
+            query = query.filter(models.JoinCode.class_id.in_(class_ids))
+        return query.all()
+
+    def _add(self, code: str, class_id: int, expires_at: Optional[datetime]):
+        self._codes[code] = Entry(class_id, _timestamp(expires_at))
+        self._by_class.setdefault(class_id, set()).add(code)
+
+    def build(self, db: Session) -> int:
+        """Nạp lại toàn bộ mã. Trả về số mã."""
+        cursor = shared.state.cursor("join-code")
+        with self._stale_lock:
+            self._stale = set()
+        rows = self._load(db)
+        with self._lock:
+            self._cursor, self._synced_at = cursor, time.time()
+            self._codes, self._by_class = {}, {}
+            for code, class_id, expires_at in rows:
+                self._add(code, class_id, expires_at)
+            self.ready = True
+        return len(rows)
+
+    def ensure_built(self, db: Session):
+        if self.ready:
+            return
+        db.connection()  # lấy connection trước khi chờ lock: người giữ lock không phải chờ pool
+        with self._lock:
+            if not self.ready:
+                self.build(db)
+
+    def invalidate(self, class_ids: Iterable[int]):
+        """Đánh dấu lớp cần nạp lại mã ở lần sync() kế tiếp (không truy vấn DB)."""
+        with self._stale_lock:
+            self._stale.update(class_ids)
+
+    def sync(self, db: Session):
+        """Nạp lại mã của các lớp đã đổi: commit trong process này và sự kiện của worker khác."""
+        if not self.ready:
+            return
+        db.connection()
+        with self._lock:
+            with self._stale_lock:
+                classes, self._stale = self._stale, set()
+            now = time.time()
+            if now - self._synced_at > SHARED_EVENT_RETENTION:
+                self.build(db)
+                return
+            cursor, events = shared.state.poll("join-code", self._cursor)
+            classes.update(i for e in events for i in e["classes"])
+            if classes:
+                self.refresh(db, classes)
+            self._cursor, self._synced_at = cursor, now
+
+    def refresh(self, db: Session, class_ids: Iterable[int]):
+        class_ids = sorted(set(class_ids))
+        with self._lock:
+            rows = self._load(db, class_ids)
+            for class_id in class_ids:
+                for code in self._by_class.pop(class_id, ()):
+                    self._codes.pop(code, None)
+            for code, class_id, expires_at in rows:
+                self._add(code, class_id, expires_at)
+
+    def taken(self, code: str) -> bool:
+        with self._lock:
+            return code in self._codes
+
+    def lookup(self, db: Session, code: str) -> Optional[Entry]:
+        """Mã -> (lớp, hạn), None nếu không có. Người gọi tự kiểm tra hạn bằng expired()."""
+        self.ensure_built(db)
+        self.sync(db)
+        with self._lock:
+            return self._codes.get(normalize(code))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"ready": self.ready, "codes": len(self._codes), "classes": len(self._by_class)}
+
+
+def expired(entry: Entry) -> bool:
+    return entry.expires is not None and entry.expires <= time.time()
+
+
+index = JoinCodeIndex()
+
+
+# =========================
+# ĐỒNG BỘ KHI GHI
+# =========================
+_PENDING = "join_code_pending"
+
+
+def touch(session: Session, class_ids: Iterable[int]):
+    """Đánh dấu lớp đổi mã (thêm / đổi / xóa); index nạp lại sau khi session commit."""
+    session.info.setdefault(_PENDING, set()).update(class_ids)
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_changes(session: Session):
+    classes = session.info.pop(_PENDING, None)
+    if not classes:
+        return
+    shared.state.publish("join-code", {"classes": sorted(classes)})
+    index.invalidate(classes)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changes(session: Session):
+    session.info.pop(_PENDING, None)
@@ -0,0 +1,406 @@
+"""
+Lớp gọi LLM bất đồng bộ cho chatbot.
+
+- Ollama: dùng chung một httpx.AsyncClient (connection pool) cho mọi request.
+- Gemini: SDK đồng bộ nên được chạy trong thread pool riêng (cỡ bằng giới hạn
+  đồng thời), không chặn event loop.
+- Mỗi backend có timeout, giới hạn số request đồng thời (chia đều cho các
+  worker, xem WEB_CONCURRENCY) và circuit breaker riêng. Thread không dừng được
+  khi request timeout / client ngắt kết nối, nên chỗ của lời gọi chỉ được trả
+  khi thread chạy xong: lời gọi Gemini bị treo vẫn tính vào giới hạn.
+  Gemini lỗi liên tục -> breaker mở -> gọi thẳng Ollama cho tới khi hết thời gian nghỉ.
+- Thời gian mỗi lời gọi (và thời gian tới token đầu khi stream) được ghi vào
+  metrics theo backend / kết quả.
+- SDK Gemini và httpx chỉ được import khi chatbot gọi LLM lần đầu, không làm
+  chậm lúc khởi động app.
+"""
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import TYPE_CHECKING, AsyncIterator, Dict, List, Optional
+
+from . import logs, metrics
+from .config import (
+    GEMINI_API_KEY, USE_GEMINI, GEMINI_MODEL, GEMINI_TIMEOUT, GEMINI_MAX_CONCURRENCY,
+    OLLAMA_URL, OLLAMA_MODEL, OLLAMA_TIMEOUT, OLLAMA_MAX_CONCURRENCY,
+    LLM_QUEUE_TIMEOUT, LLM_BREAKER_FAILURES, LLM_BREAKER_RESET, WORKERS,
+)
+
+if TYPE_CHECKING:
+    import httpx
+
+log = logs.get_logger(__name__)
+
+if not GEMINI_API_KEY:
+    log.warning("GEMINI_API_KEY not found in .env file, see .env.example")
+
+
+def per_worker(limit: int) -> int:
+    """Giới hạn cấu hình cho cả server -> phần của mỗi worker (ít nhất 1)."""
+    return max(1, limit // WORKERS)
+
+
+# Gemini được bật khi có key; SDK (google.generativeai) import lần đầu dùng
+GEMINI_CONFIGURED = bool(USE_GEMINI and GEMINI_API_KEY and GEMINI_API_KEY != "YOUR_API_KEY_HERE")
+
+
+class LLMUnavailable(Exception):
+    """Không backend nào trả lời được (lỗi, timeout, quá tải hoặc breaker đang mở)."""
+
+
+# =========================
+# CIRCUIT BREAKER
+# =========================
+class CircuitBreaker:
+    """
+    closed   : gọi bình thường, đếm lỗi liên tiếp
+    open     : sau `failure_threshold` lỗi, từ chối mọi lời gọi trong `reset_timeout` giây
+    half-open: hết thời gian nghỉ, cho 1 lời gọi thử; thành công -> closed, lỗi -> open lại
+    """
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def cancel(self):
+        """Lời gọi bị hủy trước khi tới backend (ví dụ quá tải) -> không tính kết quả."""
+        self._trial_in_flight = False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._trial_in_flight = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+            log.warning("circuit breaker opened", extra={"backend": self.name, "failures": self.failures})
+
+
+# =========================
+# BACKENDS
+# =========================
+class _Slot:
+    """
+    Một chỗ trong semaphore của backend, trả lại khi mọi bên giữ nó xong: lời gọi
+    (request) và các thread đã gắn bằng hold_until().
+    """
+
+    def __init__(self, semaphore: asyncio.Semaphore):
+        self._semaphore = semaphore
+        self._loop = asyncio.get_running_loop()
+        self._holders = 1
+
+    def hold_until(self, future: Future):
+        """Giữ chỗ tới khi `future` (việc trong thread) kết thúc, kể cả khi request đã dừng chờ."""
+        self._holders += 1
+
+        def done(_):
+            try:
+                self._loop.call_soon_threadsafe(self.release)
+            except RuntimeError:  # event loop đã đóng (tắt app)
+                pass
+
+        future.add_done_callback(done)
+
+    def release(self):
+        self._holders -= 1
+        if self._holders == 0:
+            self._semaphore.release()
+
+
+class LLMBackend:
+    name = "llm"
+
+    def __init__(self, timeout: float, max_concurrency: int):
+        self.timeout = timeout
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.breaker = CircuitBreaker(self.name, LLM_BREAKER_FAILURES, LLM_BREAKER_RESET)
+
+    @property
+    def enabled(self) -> bool:
+        return True
+
+    async def _complete(self, messages: List[Dict[str, str]], slot: _Slot) -> str:
+        raise NotImplementedError
+
+    def _stream(self, messages: List[Dict[str, str]], slot: _Slot) -> AsyncIterator[str]:
+        raise NotImplementedError
+
+    async def _acquire(self) -> _Slot:
+        if not self.breaker.allow():
+            raise LLMUnavailable(f"{self.name}: circuit breaker đang mở")
+        try:
+            await asyncio.wait_for(self.semaphore.acquire(), timeout=LLM_QUEUE_TIMEOUT)
+        except asyncio.TimeoutError:
+            # Quá tải không phải lỗi của backend -> không tính vào breaker
+            self.breaker.cancel()
+            raise LLMUnavailable(f"{self.name}: quá nhiều request đồng thời")
+        return _Slot(self.semaphore)
+
+    async def chat(self, messages: List[Dict[str, str]]) -> str:
+        slot = await self._acquire()
+        start = time.perf_counter()
+        try:
+            reply = await asyncio.wait_for(self._complete(messages, slot), timeout=self.timeout)
+        except Exception as e:
+            self.breaker.record_failure()
+            metrics.observe_llm(self.name, "chat", "error", time.perf_counter() - start)
+            raise LLMUnavailable(f"{self.name}: {e!r}") from e
+        finally:
+            slot.release()
+        self.breaker.record_success()
+        metrics.observe_llm(self.name, "chat", "ok", time.perf_counter() - start)
+        return reply
+
+    async def stream(self, messages: List[Dict[str, str]]) -> AsyncIterator[str]:
+        """Trả về từng đoạn text; timeout áp dụng cho khoảng chờ giữa hai đoạn."""
+        slot = await self._acquire()
+        chunks = self._stream(messages, slot)
+        start = time.perf_counter()
+        first = True
+        outcome = "cancelled"
+        try:
+            while True:
+                try:
+                    token = await asyncio.wait_for(chunks.__anext__(), timeout=self.timeout)
+                except StopAsyncIteration:
+                    break
+                except Exception as e:
+                    self.breaker.record_failure()
+                    outcome = "error"
+                    raise LLMUnavailable(f"{self.name}: {e!r}") from e
+                if token:
+                    if first:
+                        metrics.observe_llm_first_token(self.name, time.perf_counter() - start)
+                        first = False
+                    yield token
+            self.breaker.record_success()
+            outcome = "ok"
+        finally:
+            # Client ngắt kết nối giữa chừng -> không tính thành công/thất bại
+            metrics.observe_llm(self.name, "stream", outcome, time.perf_counter() - start)
+            self.breaker.cancel()
+            await chunks.aclose()
+            slot.release()
+
+
+class GeminiBackend(LLMBackend):
+    name = "gemini"
+
+    def __init__(self):
+        super().__init__(GEMINI_TIMEOUT, per_worker(GEMINI_MAX_CONCURRENCY))
+        self._model = None
+        self._sdk_missing = False
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def enabled(self) -> bool:
+        return GEMINI_CONFIGURED and not self._sdk_missing
+
+    @staticmethod
+    def build_prompt(messages: List[Dict[str, str]]) -> str:
+        # Gemini nhận 1 prompt: system prompt + tin nhắn cuối của người dùng
+        return f"{messages[0]['content']}\n\n{messages[-1]['content']}"
+
+    @property
+    def model(self):
+        # Gọi trong thread (_generate / produce) nên import SDK không chặn event loop
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    try:
+                        import google.generativeai as genai
+                    except ImportError:
+                        self._sdk_missing = True
+                        log.warning("google-generativeai is not installed, gemini disabled")
+                        raise
+                    genai.configure(api_key=GEMINI_API_KEY)
+                    self._model = genai.GenerativeModel(GEMINI_MODEL)
+        return self._model
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        # Pool riêng, không chiếm default executor của event loop. Số thread bằng số
+        # chỗ của semaphore và chỗ chỉ được trả khi thread xong, nên không có việc chờ trong pool.
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=per_worker(GEMINI_MAX_CONCURRENCY), thread_name_prefix="gemini"
+                    )
+        return self._executor
+
+    def _generate(self, prompt: str) -> str:
+        response = self.model.generate_content(prompt, request_options={"timeout": self.timeout})
+        return response.text.strip() if response.text else ""
+
+    async def _complete(self, messages: List[Dict[str, str]], slot: _Slot) -> str:
+        future = self.executor.submit(self._generate, self.build_prompt(messages))
+        slot.hold_until(future)
+        return await asyncio.wrap_future(future)
+
+    async def _stream(self, messages: List[Dict[str, str]], slot: _Slot) -> AsyncIterator[str]:
+        # SDK trả về iterator đồng bộ: đọc trong thread, chuyển từng chunk qua queue
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        done = object()
+        stop = threading.Event()
+        prompt = self.build_prompt(messages)
+
+        def produce():
+            try:
+                response = self.model.generate_content(
+                    prompt, stream=True, request_options={"timeout": self.timeout}
+                )
+                for chunk in response:
+                    if stop.is_set():  # request đã dừng (timeout / client ngắt): không đọc tiếp
+                        return
+                    loop.call_soon_threadsafe(queue.put_nowait, chunk.text or "")
+                loop.call_soon_threadsafe(queue.put_nowait, done)
+            except Exception as e:
+                if not stop.is_set():
+                    loop.call_soon_threadsafe(queue.put_nowait, e)
+
+        producer = self.executor.submit(produce)
+        slot.hold_until(producer)
+        try:
+            while True:
+                item = await queue.get()
+                if item is done:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            stop.set()
+            producer.cancel()  # chỉ có tác dụng khi thread chưa bắt đầu
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+class OllamaBackend(LLMBackend):
+    name = "ollama"
+
+    def __init__(self):
+        super().__init__(OLLAMA_TIMEOUT, per_worker(OLLAMA_MAX_CONCURRENCY))
+        self._client: Optional["httpx.AsyncClient"] = None
+
+    @property
+    def client(self) -> "httpx.AsyncClient":
+        if self._client is None or self._client.is_closed:
+            import httpx
+
+            self._client = httpx.AsyncClient(
+                base_url=OLLAMA_URL,
+                timeout=httpx.Timeout(self.timeout, connect=5.0),
+                limits=httpx.Limits(max_connections=per_worker(OLLAMA_MAX_CONCURRENCY),
+                                    max_keepalive_connections=per_worker(OLLAMA_MAX_CONCURRENCY)),
+            )
+        return self._client
+
+    async def _complete(self, messages: List[Dict[str, str]], slot: _Slot) -> str:
+        res = await self.client.post(
+            "/api/chat",
+            json={"model": OLLAMA_MODEL, "messages": messages, "stream": False},
+        )
+        res.raise_for_status()
+        return res.json().get("message", {}).get("content", "").strip()
+
+    async def _stream(self, messages: List[Dict[str, str]], slot: _Slot) -> AsyncIterator[str]:
+        # Ollama stream trả về NDJSON: mỗi dòng một chunk {"message": {"content": ...}, "done": ...}
+        async with self.client.stream(
+            "POST", "/api/chat",
+            json={"model": OLLAMA_MODEL, "messages": messages, "stream": True},
+        ) as res:
+            res.raise_for_status()
+            async for line in res.aiter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                yield chunk.get("message", {}).get("content", "")
+                if chunk.get("done"):
+                    break
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+# =========================
+# GATEWAY
+# =========================
+class LLMGateway:
+    """Thử lần lượt các backend đang bật (Gemini trước, Ollama dự phòng)."""
+
+    def __init__(self):
+        self.gemini = GeminiBackend()
+        self.ollama = OllamaBackend()
+
+    @property
+    def backends(self) -> List[LLMBackend]:
+        return [b for b in (self.gemini, self.ollama) if b.enabled]
+
+    async def chat(self, messages: List[Dict[str, str]]) -> str:
+        errors = []
+        for backend in self.backends:
+            try:
+                return await backend.chat(messages)
+            except LLMUnavailable as e:
+                log.warning("llm backend failed, trying next", extra={"error": str(e)})
+                errors.append(str(e))
+        raise LLMUnavailable("; ".join(errors) or "Không có backend LLM nào được bật")
+
+    async def stream(self, messages: List[Dict[str, str]]) -> AsyncIterator[str]:
+        """Chỉ chuyển sang backend khác nếu backend hiện tại lỗi trước khi gửi token đầu tiên."""
+        errors = []
+        for backend in self.backends:
+            started = False
+            try:
+                async for token in backend.stream(messages):
+                    started = True
+                    yield token
+                return
+            except LLMUnavailable as e:
+                if started:
+                    raise
+                log.warning("llm backend failed, trying next", extra={"error": str(e)})
+                errors.append(str(e))
+        raise LLMUnavailable("; ".join(errors) or "Không có backend LLM nào được bật")
+
+    async def aclose(self):
+        self.gemini.close()
+        await self.ollama.aclose()
+
+
+gateway = LLMGateway()
@@ -0,0 +1,136 @@
+"""
+Logging có cấu trúc cho backend (thay cho print()).
+
+- get_logger(__name__) trả về logger con của "backend"; handler được gắn một lần
+  vào logger "backend" (không đụng root logger của uvicorn).
+- LOG_FORMAT=json: mỗi dòng là 1 object {"ts", "level", "logger", "msg", ...};
+  các trường truyền qua extra={...} và request_id của request hiện tại (do
+  metrics.MetricsMiddleware đặt) được thêm vào object.
+- Giới hạn tần suất: cùng logger + mẫu message chỉ ghi tối đa LOG_RATE_LIMIT
+  dòng mỗi LOG_RATE_WINDOW giây; số dòng bị bỏ được ghi vào trường "suppressed"
+  của dòng kế tiếp.
+"""
+import json
+import logging
+import sys
+import threading
+import time
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+
+from .config import LOG_LEVEL, LOG_FORMAT, LOG_RATE_LIMIT, LOG_RATE_WINDOW
+
+ROOT_LOGGER = "backend"
+
+# Id của request đang xử lý (đặt bởi middleware), "-" khi ngoài request
+request_id: ContextVar[str] = ContextVar("request_id", default="-")
+
+# Thuộc tính có sẵn của LogRecord; phần còn lại là trường truyền qua extra=
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "suppressed"}
+
+
+def _extra_fields(record: logging.LogRecord) -> Dict[str, object]:
+    return {k: v for k, v in vars(record).items() if k not in _RESERVED}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "request_id": request_id.get(),
+        }
+        entry.update(_extra_fields(record))
+        if getattr(record, "suppressed", 0):
+            entry["suppressed"] = record.suppressed
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)-7s %(name)s [%(request_id)s] %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        record.request_id = request_id.get()
+        fields = _extra_fields(record)
+        fields.pop("request_id", None)
+        if getattr(record, "suppressed", 0):
+            fields["suppressed"] = record.suppressed
+        line = super().format(record)
+        if fields:
+            line += " " + " ".join(f"{k}={v}" for k, v in fields.items())
+        return line
+
+
+class RateLimitFilter(logging.Filter):
+    """Cho qua tối đa `limit` bản ghi mỗi `window` giây với mỗi (logger, level, mẫu message)."""
+
+    def __init__(self, limit: int = LOG_RATE_LIMIT, window: float = LOG_RATE_WINDOW):
+        super().__init__()
+        self.limit = limit
+        self.window = window
+        # key -> [bắt đầu cửa sổ, số bản ghi đã cho qua, số bản ghi bị bỏ]
+        self._windows: Dict[Tuple[str, int, str], list] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.limit <= 0:
+            return True
+        key = (record.name, record.levelno, str(record.msg))
+        now = time.monotonic()
+        with self._lock:
+            state = self._windows.get(key)
+            if state is None or now - state[0] >= self.window:
+                suppressed = state[2] if state else 0
+                self._windows[key] = [now, 1, 0]
+                if len(self._windows) > 10000:
+                    self._prune(now)
+                record.suppressed = suppressed
+                return True
+            if state[1] < self.limit:
+                state[1] += 1
+                record.suppressed = 0
+                return True
+            state[2] += 1
+            return False
+
+    def _prune(self, now: float):
+        expired = [k for k, (start, _, dropped) in self._windows.items()
+                   if now - start >= self.window and not dropped]
+        for key in expired:
+            del self._windows[key]
+
+
+_configured = False
+_setup_lock = threading.Lock()
+
+
+def setup(level: str = LOG_LEVEL, fmt: str = LOG_FORMAT) -> logging.Logger:
+    """Gắn handler (stderr) cho logger "backend". Gọi lại nhiều lần không sao."""
+    global _configured
+    logger = logging.getLogger(ROOT_LOGGER)
+    with _setup_lock:
+        if _configured:
+            return logger
+        handler = logging.StreamHandler(sys.stderr)
+        handler.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+        handler.addFilter(RateLimitFilter())
+        logger.addHandler(handler)
+        logger.setLevel(level)
+        logger.propagate = False
+        _configured = True
+    return logger
+
+
+def get_logger(name: Optional[str] = None) -> logging.Logger:
+    setup()
+    if not name or name == ROOT_LOGGER:
+        return logging.getLogger(ROOT_LOGGER)
+    if not name.startswith(ROOT_LOGGER + "."):
+        name = f"{ROOT_LOGGER}.{name}"
+    return logging.getLogger(name)
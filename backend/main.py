@@ -1,16 +1,45 @@
+import hmac
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, Request, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse, Response
 from fastapi.templating import Jinja2Templates
 from pathlib import Path
-from .db import models, database
+from sqlalchemy.orm import Session
+from .db import database, migrations
 from .routers import mainrouter, jwt_auth, chatbot
+from . import llm_client, logs, metrics, passwords, shared
+from .config import AUTO_MIGRATE, METRICS_ENABLED, METRICS_TOKEN, WORKERS
 
-models.Base.metadata.create_all(bind=database.engine)
+log = logs.get_logger(__name__)
 
 from fastapi.middleware.cors import CORSMiddleware
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Tạo bảng / thêm cột khi server khởi động, không phải lúc import module
+    # (test, benchmark, CLI import app không phải chạm vào DB)
+    if WORKERS > 1 and shared.state.name == "memory":
+        log.warning("SHARED_BACKEND=memory with several workers: caches and locks are per process",
+                    extra={"workers": WORKERS})
+    if AUTO_MIGRATE:
+        await run_in_threadpool(prepare_database)
+    yield
+    await llm_client.gateway.aclose()
+    passwords.hasher.shutdown()
+    await database.close_async_engine()
+
+
+def prepare_database():
+    # Nhiều worker khởi động cùng lúc: lần lượt từng worker, worker sau thấy schema đã đủ
+    with shared.state.lock("prepare-database", timeout=600, lease=600):
+        migrations.prepare_database(database.engine)
+
+
+app = FastAPI(lifespan=lifespan)
 
 origins = [
     "http://localhost:8000",
@@ -21,48 +50,34 @@ origins = [
 async def get_current_user(request: Request):
     """Lấy thông tin user từ token"""
     try:
-       
-        token = request.cookies.get("access_token")
-        if not token:
-           
-            auth_header = request.headers.get("Authorization")
-            if auth_header and auth_header.startswith("Bearer "):
-                token = auth_header.split("Bearer ")[1]
-
+        token = jwt_auth.token_from_request(request)
         if token:
-            
             user = jwt_auth.decode_tokenNE(token)
             return user
     except Exception as e:
-        print(f"Auth error: {e}")
+        log.warning("page auth failed", extra={"error": str(e)})
     return None
 
 
 def require_role(required_role: str):
     """Middleware kiểm tra role"""
 
-    async def role_checker(request: Request):
+    async def role_checker(request: Request, db: Session = Depends(database.get_db)):
         user = await get_current_user(request)
 
         if not user:
             
             return RedirectResponse(url="/login")
 
-        
-        from .db import crud
-        from .db.database import SessionLocal
-        db = SessionLocal()
-        try:
-            db_user = crud.get_user_by_username(db, user['username'])
-            if not db_user or db_user.role != required_role:
-                
-                raise HTTPException(
-                    status_code=403,
-                    detail=f"Yêu cầu role {required_role} để truy cập trang này"
-                )
-            return db_user
-        finally:
-            db.close()
+        # Principal được cache theo username (xem jwt_auth.get_principal)
+        principal = jwt_auth.get_principal(db, user['username'])
+        if not principal or principal.role != required_role:
+            
+            raise HTTPException(
+                status_code=403,
+                detail=f"Yêu cầu role {required_role} để truy cập trang này"
+            )
+        return principal
 
     return role_checker
 
@@ -89,6 +104,21 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Thêm sau cùng -> bọc ngoài cùng: đo cả thời gian của các middleware khác
+if METRICS_ENABLED:
+    app.add_middleware(metrics.MetricsMiddleware)
+
+
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics(request: Request):
+    """Số liệu dạng Prometheus text; nếu đặt METRICS_TOKEN thì cần Authorization: Bearer <token>."""
+    if not METRICS_ENABLED:
+        return Response(status_code=404)
+    if METRICS_TOKEN and not hmac.compare_digest(request.headers.get("Authorization", ""),
+                                                 f"Bearer {METRICS_TOKEN}"):
+        return Response(status_code=401, headers={"WWW-Authenticate": "Bearer"})
+    return Response(metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
+
 
 app.include_router(mainrouter, prefix="/api")
 app.include_router(chatbot.router)  
@@ -143,4 +173,5 @@ async def access_denied_page(request: Request):
 if __name__ == "__main__":
     import uvicorn
 
-    uvicorn.run(app, host="127.0.0.1", port=8000, log_level="info")
\ No newline at end of file
+    # Nhiều worker cần import string để mỗi process tự import app
+    uvicorn.run("backend.main:app", host="127.0.0.1", port=8000, log_level="info", workers=WORKERS)
\ No newline at end of file
@@ -0,0 +1,347 @@
+"""
+Số liệu hiệu năng dạng Prometheus (GET /metrics, xem backend/main.py).
+
+- MetricsMiddleware: với mỗi request HTTP đo thời gian xử lý (tới khi gửi xong
+  body, kể cả response stream), số request đang xử lý, số câu SQL và tổng thời
+  gian SQL của request đó. Nhãn route là mẫu đường dẫn (vd. /api/teacher/classes/{class_id})
+  để số chuỗi số liệu không tăng theo id.
+- instrument_engine(): gắn event before/after_cursor_execute vào engine; câu
+  SQL chạy trong request được cộng vào RequestStats của request (ContextVar,
+  nên áp dụng được cho route sync chạy trong threadpool và AsyncSession).
+- llm_client ghi thời gian gọi LLM qua observe_llm() / observe_llm_first_token().
+- Số liệu cache (hit / miss / size) và trạng thái circuit breaker được đọc lúc scrape.
+
+Không phụ thuộc prometheus_client: các metric ở đây chỉ cần đếm trong 1 process.
+"""
+import bisect
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from . import logs
+from .config import SLOW_REQUEST_MS
+
+log = logs.get_logger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SQL_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 500)
+LLM_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 30.0, 60.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# =========================
+# METRIC TYPES
+# =========================
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, *labels: str):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [f"{self.name}{_labels(self.labelnames, k)} {_number(v)}" for k, v in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1, *labels: str):
+        self.inc(-amount, *labels)
+
+    def set(self, value: float, *labels: str):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [số đếm theo từng bucket (không cộng dồn), tổng, số lần]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labels: str):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def count(self, *labels: str) -> int:
+        state = self._values.get(labels)
+        return state[2] if state else 0
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, ([*v[0]], v[1], v[2])) for k, v in self._values.items())
+        lines = self.header()
+        for labels, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        # Hàm trả về các dòng số liệu đọc lúc scrape (cache, circuit breaker...)
+        self._collectors: List[Callable[[], Iterable[str]]] = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def collector(self, func: Callable[[], Iterable[str]]):
+        self._collectors.append(func)
+        return func
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collect in self._collectors:
+            try:
+                lines.extend(collect())
+            except Exception:
+                log.exception("metrics collector failed", extra={"collector": collect.__name__})
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_requests_in_flight = registry.register(Gauge(
+    "http_requests_in_flight", "Số request HTTP đang xử lý"))
+http_request_duration = registry.register(Histogram(
+    "http_request_duration_seconds", "Thời gian xử lý request HTTP (tới khi gửi xong body)",
+    ("method", "route", "status")))
+http_request_db_statements = registry.register(Histogram(
+    "http_request_db_statements", "Số câu SQL mỗi request", ("method", "route"), SQL_COUNT_BUCKETS))
+http_request_db_duration = registry.register(Histogram(
+    "http_request_db_seconds", "Tổng thời gian SQL mỗi request", ("method", "route")))
+db_statements_total = registry.register(Counter(
+    "db_statements_total", "Số câu SQL đã chạy (cả ngoài request)"))
+db_duration_total = registry.register(Counter(
+    "db_seconds_total", "Tổng thời gian chạy SQL (giây)"))
+llm_request_duration = registry.register(Histogram(
+    "llm_request_duration_seconds", "Thời gian gọi LLM (stream: tới token cuối)",
+    ("backend", "mode", "outcome"), LLM_BUCKETS))
+llm_first_token = registry.register(Histogram(
+    "llm_stream_first_token_seconds", "Thời gian chờ token đầu tiên khi stream", ("backend",), LLM_BUCKETS))
+
+
+def observe_llm(backend: str, mode: str, outcome: str, seconds: float):
+    llm_request_duration.observe(seconds, backend, mode, outcome)
+
+
+def observe_llm_first_token(backend: str, seconds: float):
+    llm_first_token.observe(seconds, backend)
+
+
+# =========================
+# SQL THEO REQUEST
+# =========================
+class RequestStats:
+    __slots__ = ("request_id", "sql_count", "sql_seconds")
+
+    def __init__(self, request_id: str):
+        self.request_id = request_id
+        self.sql_count = 0
+        self.sql_seconds = 0.0
+
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def current_request() -> Optional[RequestStats]:
+    return _current.get()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("query_start")
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    db_statements_total.inc()
+    db_duration_total.inc(elapsed)
+    stats = _current.get()
+    if stats is not None:
+        stats.sql_count += 1
+        stats.sql_seconds += elapsed
+
+
+def _handle_error(exception_context):
+    # Câu SQL lỗi không tới after_cursor_execute -> bỏ mốc thời gian đã đẩy vào
+    conn = exception_context.connection
+    if conn is not None and conn.info.get("query_start"):
+        conn.info["query_start"].pop()
+
+
+def instrument_engine(engine: Engine) -> Engine:
+    """Đếm câu SQL / thời gian SQL của engine (với AsyncEngine truyền engine.sync_engine)."""
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(engine, "handle_error", _handle_error)
+    return engine
+
+
+# =========================
+# MIDDLEWARE
+# =========================
+def route_label(scope, root_path: str) -> str:
+    """Mẫu route đã khớp; mount (vd. /static) -> tiền tố mount; không khớp -> "<unmatched>"."""
+    route = scope.get("route")
+    path_format = getattr(route, "path_format", None)
+    if path_format:
+        # Một số bản FastAPI giữ path của route con không kèm prefix của include_router:
+        # tìm phần đuôi của path khớp với route, phần đầu còn lại là prefix
+        path = scope.get("path", "")
+        regex = getattr(route, "path_regex", None)
+        if regex is not None and not regex.match(path):
+            for i, char in enumerate(path):
+                if char == "/" and i and regex.match(path[i:]):
+                    return path[:i] + path_format
+        return path_format
+    if scope.get("root_path", "") != root_path:
+        return scope["root_path"][len(root_path):] or "/"
+    return "<unmatched>"
+
+
+class MetricsMiddleware:
+    """ASGI middleware: latency, in-flight, số câu SQL mỗi request; thêm header X-Request-ID."""
+
+    def __init__(self, app, slow_request_ms: float = SLOW_REQUEST_MS):
+        self.app = app
+        self.slow_request_ms = slow_request_ms
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        rid = uuid.uuid4().hex[:16]
+        stats = RequestStats(rid)
+        stats_token = _current.set(stats)
+        rid_token = logs.request_id.set(rid)
+        root_path = scope.get("root_path", "")
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message.setdefault("headers", [])
+                message["headers"] = [*message["headers"], (b"x-request-id", rid.encode())]
+            await send(message)
+
+        http_requests_in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            http_requests_in_flight.dec()
+            method = scope.get("method", "")
+            route = route_label(scope, root_path)
+            http_request_duration.observe(elapsed, method, route, str(status))
+            http_request_db_statements.observe(stats.sql_count, method, route)
+            http_request_db_duration.observe(stats.sql_seconds, method, route)
+            if elapsed * 1000 >= self.slow_request_ms:
+                log.warning("slow request", extra={
+                    "method": method, "route": route, "status": status,
+                    "duration_ms": round(elapsed * 1000, 1), "sql_count": stats.sql_count,
+                    "sql_ms": round(stats.sql_seconds * 1000, 1),
+                })
+            logs.request_id.reset(rid_token)
+            _current.reset(stats_token)
+
+
+# =========================
+# SỐ LIỆU ĐỌC LÚC SCRAPE
+# =========================
+@registry.collector
+def _cache_metrics() -> Iterable[str]:
+    from . import cache
+
+    caches = {"intent": cache.intent_cache, "token": cache.token_cache, "principal": cache.principal_cache}
+    lines = ["# HELP cache_hits_total Số lần đọc cache trúng", "# TYPE cache_hits_total counter"]
+    stats = {name: c.stats() for name, c in caches.items()}
+    lines += [f'cache_hits_total{{cache="{n}"}} {s["hits"]}' for n, s in stats.items()]
+    lines += ["# HELP cache_misses_total Số lần đọc cache trượt", "# TYPE cache_misses_total counter"]
+    lines += [f'cache_misses_total{{cache="{n}"}} {s["misses"]}' for n, s in stats.items()]
+    lines += ["# HELP cache_entries Số phần tử trong cache", "# TYPE cache_entries gauge"]
+    lines += [f'cache_entries{{cache="{n}"}} {s["size"]}' for n, s in stats.items()]
+    return lines
+
+
+@registry.collector
+def _llm_breaker_metrics() -> Iterable[str]:
+    from . import llm_client
+
+    states = {"closed": 0, "half-open": 1, "open": 2}
+    lines = ["# HELP llm_circuit_breaker_state 0 = closed, 1 = half-open, 2 = open",
+             "# TYPE llm_circuit_breaker_state gauge"]
+    for backend in (llm_client.gateway.gemini, llm_client.gateway.ollama):
+        lines.append(f'llm_circuit_breaker_state{{backend="{backend.name}"}} {states[backend.breaker.state]}')
+    return lines
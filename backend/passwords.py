@@ -0,0 +1,140 @@
+"""
+Băm / kiểm tra mật khẩu bcrypt trong một pool luồng riêng có giới hạn.
+
+bcrypt tốn CPU có chủ đích (~250 ms ở cost 12); gọi thẳng trong route thì lúc
+cả lớp cùng đăng nhập, mọi worker đều bận băm và các request khác bị treo.
+PasswordHasher chạy việc băm trên PASSWORD_HASH_WORKERS luồng (bcrypt nhả GIL),
+giới hạn số yêu cầu chờ ở PASSWORD_HASH_MAX_PENDING (vượt quá -> HasherBusy)
+và ghi lại độ dài hàng đợi, thời gian chờ và thời gian băm.
+"""
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+import bcrypt
+
+from .config import BCRYPT_ROUNDS, PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_PENDING
+
+
+class HasherBusy(Exception):
+    """Hàng đợi băm mật khẩu đã đầy."""
+
+
+# Giá trị cột users.password của tài khoản chưa có mật khẩu (tạo hàng loạt khi import
+# danh sách lớp): không phải chuỗi bcrypt nên không mật khẩu nào khớp và needs_rehash()
+# bỏ qua. Không lưu token ngẫu nhiên ở dạng rõ, cũng không tốn một lần băm cho mỗi dòng.
+UNUSABLE_PASSWORD = "!"
+
+
+def hash_password(password: str, rounds: int = BCRYPT_ROUNDS) -> str:
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    try:
+        return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
+    except ValueError:
+        # Không phải chuỗi bcrypt (vd. UNUSABLE_PASSWORD của tài khoản tạo khi import)
+        return False
+
+
+def hash_cost(hashed_password: str) -> Optional[int]:
+    """Cost của chuỗi bcrypt dạng $2b$12$..., None nếu không đọc được."""
+    parts = hashed_password.split('$')
+    if len(parts) < 4 or not parts[2].isdigit():
+        return None
+    return int(parts[2])
+
+
+def needs_rehash(hashed_password: str) -> bool:
+    cost = hash_cost(hashed_password)
+    return cost is not None and cost != BCRYPT_ROUNDS
+
+
+def _percentile(values, p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = min(len(ordered) - 1, max(0, round(p / 100 * (len(ordered) - 1))))
+    return round(ordered[k] * 1000, 1)
+
+
+class PasswordHasher:
+    def __init__(self, workers: int, max_pending: int, window: int = 1000):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+        # thời gian (giây) của `window` yêu cầu gần nhất
+        self._waits = deque(maxlen=window)
+        self._durations = deque(maxlen=window)
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="bcrypt")
+        return self._executor
+
+    def submit(self, fn: Callable[..., Any], *args) -> Future:
+        """Đưa việc băm vào pool. Raise HasherBusy nếu đã có max_pending việc đang chờ/chạy."""
+        with self._lock:
+            if self.queued + self.running >= self.max_pending:
+                self.rejected += 1
+                raise HasherBusy()
+            self.queued += 1
+        submitted = time.perf_counter()
+
+        def job():
+            started = time.perf_counter()
+            with self._lock:
+                self.queued -= 1
+                self.running += 1
+            try:
+                return fn(*args)
+            finally:
+                finished = time.perf_counter()
+                with self._lock:
+                    self.running -= 1
+                    self.completed += 1
+                    self._waits.append(started - submitted)
+                    self._durations.append(finished - started)
+
+        return self._get_executor().submit(job)
+
+    async def hash(self, password: str) -> str:
+        return await asyncio.wrap_future(self.submit(hash_password, password))
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await asyncio.wrap_future(self.submit(verify_password, plain_password, hashed_password))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            waits = list(self._waits)
+            durations = list(self._durations)
+            return {
+                "workers": self.workers,
+                "rounds": BCRYPT_ROUNDS,
+                "max_pending": self.max_pending,
+                "queue_depth": self.queued,
+                "running": self.running,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "wait_ms": {"p50": _percentile(waits, 50), "p95": _percentile(waits, 95)},
+                "hash_ms": {"p50": _percentile(durations, 50), "p95": _percentile(durations, 95)},
+            }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+hasher = PasswordHasher(PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_PENDING)
@@ -4,7 +4,7 @@ from sqlalchemy.orm import Session
 
 from ..db import schemas
 from ..db import crud, models, database
-from . import api, student, teacher
+from . import analytics, api, search, student, teacher
 
 # Tạo main router
 mainrouter = APIRouter()
@@ -12,4 +12,6 @@ mainrouter = APIRouter()
 # Include các sub-routers
 mainrouter.include_router(api.router)
 mainrouter.include_router(student.router)
-mainrouter.include_router(teacher.router)
\ No newline at end of file
+mainrouter.include_router(teacher.router)
+mainrouter.include_router(search.router)
+mainrouter.include_router(analytics.router)
@@ -0,0 +1,32 @@
+from fastapi import APIRouter, Depends, HTTPException, Request
+from sqlalchemy.orm import Session
+
+from .. import http_cache
+from ..db import database
+from . import jwt_auth
+
+router = APIRouter(prefix="/analytics", tags=["Analytics"])
+
+
+@router.get("/terms/{year}/{semester}", summary="Grade statistics of a term")
+def term_analytics(
+    year: int,
+    semester: int,
+    request: Request,
+    db: Session = Depends(database.get_db),
+    principal: jwt_auth.Principal = Depends(jwt_auth.require_roles("teacher", "admin"))
+):
+    """
+    Thống kê học kỳ: phân bố điểm tổng kết từng lớp và cả học kỳ (phân vị, tỉ lệ
+    đạt, histogram, học lực), so sánh giảng viên, tương quan giữa các thành phần.
+    ETag theo phiên bản dữ liệu của học kỳ: 304 chỉ tốn 1 câu query trên bảng classes.
+    """
+    from .. import analytics  # NumPy chỉ được nạp khi có người xem thống kê
+
+    version = analytics.term_version(db, year, semester)
+    if not version[0]:
+        raise HTTPException(status_code=404, detail="No classes in this term")
+    etag = http_cache.version_etag("analytics", year, semester, version)
+    if http_cache.etag_matches(request, etag):
+        return http_cache.not_modified(etag)
+    return http_cache.json_with_etag(request, analytics.term_report(db, year, semester, version), etag)
@@ -1,58 +1,90 @@
-from fastapi import APIRouter, Depends, HTTPException
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from ..db import schemas
-from ..db import crud, models, database
+from ..db import crud, models, database, grade_aggregates
+from ..db.database import get_db, get_async_db
+from .. import cache, http_cache, logs, passwords
 from . import jwt_auth
 
 router = APIRouter()
 
+log = logs.get_logger(__name__)
+
 
 class UserAuth(BaseModel):
     username: str
     password: str
 
 
-def get_db():
-    db = database.SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+
+
+def hasher_busy() -> HTTPException:
+    return HTTPException(status_code=503, detail="Hệ thống đang bận, vui lòng thử lại sau giây lát",
+                         headers={"Retry-After": "1"})
+
+
+# register / login là route async dùng Session đồng bộ: truy vấn chạy trong threadpool
+# (lấy connection từ pool không chặn event loop) và connection được trả về pool
+# trước khi chờ bcrypt, nên nhiều người đăng nhập cùng lúc không làm cạn pool.
+def _create_student_user(db: Session, username: str, hashed_password: str) -> models.User:
+    db_user = models.User(
+        username=username,
+        password=hashed_password,
+        full_name="NoName",
+        email=None,
+        role=models.UserRole.student
+    )
+    db.add(db_user)
+    db.flush()
+
+    db_student = models.Student(
+        student_id=db_user.user_id,
+        student_code=f"ST{db_user.user_id:04d}",
+        birthdate=None
+    )
+    db.add(db_student)
+
+    db.commit()
+    db.refresh(db_user)
+    return db_user
+
+
+def _login_lookup(db: Session, username: str):
+    """(user_id, username, role, mật khẩu đã băm) hoặc None; trả connection về pool."""
+    user_db = crud.get_user_by_username(db, username)
+    row = None if user_db is None else (user_db.user_id, user_db.username, user_db.role.value, user_db.password)
+    db.rollback()
+    return row
+
+
+def _store_password_hash(db: Session, user_id: int, hashed_password: str):
+    db.query(models.User).filter(models.User.user_id == user_id).update({"password": hashed_password})
+    db.commit()
 
 
 @router.post("/register")
-def register(user: UserAuth, db: Session = Depends(get_db)):
+async def register(user: UserAuth, db: Session = Depends(get_db)):
     try:
-        
-        existing_user = crud.get_user_by_username(db, user.username)
+        existing_user = await run_in_threadpool(crud.get_user_by_username, db, user.username)
         if existing_user:
             raise HTTPException(status_code=400, detail="Username đã tồn tại")
+        db.rollback()
 
-        hashedpassw: str = jwt_auth.hash_password(user.password)
-        db_user = models.User(
-            username=user.username,
-            password=hashedpassw,
-            full_name="NoName",
-            email=None,
-            role=models.UserRole.student
-        )
-        db.add(db_user)
-        db.flush()  
-
+        try:
+            hashedpassw: str = await passwords.hasher.hash(user.password)
+        except passwords.HasherBusy:
+            raise hasher_busy()
+        db_user = await run_in_threadpool(_create_student_user, db, user.username, hashedpassw)
         student_code = f"ST{db_user.user_id:04d}"
-        db_student = models.Student(
-            student_id=db_user.user_id,
-            student_code=student_code,
-            birthdate=None
-        )
-        db.add(db_student)
-
-        db.commit()
-        db.refresh(db_user)
 
-        print(f"✅ Đã tạo user '{user.username}' và student profile với mã: {student_code}")
+        log.info("user registered", extra={"username": user.username, "student_code": student_code})
 
         token = jwt_auth.create_token({"username": db_user.username, "password": db_user.password, "role": db_user.role.value})
 
@@ -67,9 +99,7 @@ def register(user: UserAuth, db: Session = Depends(get_db)):
         raise
     except Exception as e:
         db.rollback()
-        print("❌ Lỗi khi tạo user:", str(e))
-        import traceback
-        traceback.print_exc()
+        log.exception("register failed", extra={"username": user.username})
 
         
         error_msg = str(e).lower()
@@ -80,17 +110,30 @@ def register(user: UserAuth, db: Session = Depends(get_db)):
 
 
 @router.post("/login")
-def login(user: UserAuth, db: Session = Depends(get_db)):
-    print("user:", user.username, user.password)
-    user_db = crud.get_user_by_username(db, user.username)
+async def login(user: UserAuth, db: Session = Depends(get_db)):
+    row = await run_in_threadpool(_login_lookup, db, user.username)
+    if not row:
+        raise HTTPException(401)
+    user_id, username, role, hashed = row
 
-    ok = jwt_auth.verify_password(user.password, user_db.password)
+    try:
+        ok = await passwords.hasher.verify(user.password, hashed)
+    except passwords.HasherBusy:
+        raise hasher_busy()
 
     if not ok:
         raise HTTPException(401)
 
-    token = jwt_auth.create_token({"username": user_db.username, "id": user_db.user_id, "role": user_db.role.value})
-    print("Generated token:", token)
+    # Mật khẩu băm với cost cũ -> băm lại theo BCRYPT_ROUNDS hiện tại
+    if passwords.needs_rehash(hashed):
+        try:
+            new_hash = await passwords.hasher.hash(user.password)
+            await run_in_threadpool(_store_password_hash, db, user_id, new_hash)
+        except passwords.HasherBusy:
+            pass  # để lần đăng nhập sau
+
+    token = jwt_auth.create_token({"username": username, "id": user_id, "role": role})
+    log.debug("user logged in", extra={"username": username})
 
     return {
         "token": token,
@@ -116,9 +159,14 @@ def update_me(update: schemas.UserUpdate, user: dict = Depends(jwt_auth.auth), d
         raise HTTPException(404, detail="User not found")
 
     data = update.model_dump(exclude_unset=True)
+    # Tên / mã sinh viên hiển thị trong danh sách lớp -> đổi version các lớp đang học
+    roster_changed = bool({'full_name', 'student_code'} & data.keys())
 
     if 'password' in data and data['password']:
-        db_user.password = jwt_auth.hash_password(data.pop('password'))
+        try:
+            db_user.password = passwords.hasher.submit(passwords.hash_password, data.pop('password')).result()
+        except passwords.HasherBusy:
+            raise hasher_busy()
 
     for field in ['full_name', 'email', 'role']:
         if field in data:
@@ -175,6 +223,11 @@ def update_me(update: schemas.UserUpdate, user: dict = Depends(jwt_auth.auth), d
             except Exception as e:
                 raise HTTPException(status_code=400, detail=f"Failed to create teacher profile: {e}")
 
+    if roster_changed:
+        grade_aggregates.bump_class_versions(
+            db, select(models.Enrollment.class_id).where(models.Enrollment.student_id == db_user.user_id)
+        )
+
     try:
         db.commit()
         db.refresh(db_user)
@@ -185,6 +238,9 @@ def update_me(update: schemas.UserUpdate, user: dict = Depends(jwt_auth.auth), d
         if 'unique' in error_msg or 'duplicate' in error_msg:
             raise HTTPException(status_code=400, detail="Mã sinh viên hoặc email đã tồn tại")
         raise HTTPException(status_code=500, detail=f"Lỗi cập nhật: {str(e)}")
+    finally:
+        # role / hồ sơ có thể đã đổi (kể cả khi crud.create_* đã commit trước đó)
+        cache.invalidate_principal(user.get('username'))
 
     return db_user
 
@@ -214,50 +270,87 @@ def update_user_role(
     db_user.role = role_data.new_role
     db.commit()
     db.refresh(db_user)
+    cache.invalidate_principal(db_user.username)
 
     return {"message": f"Đã cập nhật role {role_data.new_role} cho user {role_data.username}"}
 
 
+@router.get("/admin/password-hasher/stats")
+def password_hasher_stats(current_user: dict = Depends(jwt_auth.auth)):
+    if current_user["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Access denied. Admin only.")
+    return passwords.hasher.stats()
+
 
-@router.get("/debug-all-users")
-def debug_all_users(db: Session = Depends(get_db)):
-    users = db.query(models.User).all()
-    result = []
-    for user in users:
-        result.append({
-            "id": user.user_id,
-            "username": user.username,
-            "role": user.role.value if user.role else None,
-            "name": user.full_name
-        })
+@router.get("/admin/users")
+def list_users(
+    role: Optional[models.UserRole] = None,
+    name_prefix: Optional[str] = Query(None, min_length=1),
+    username_prefix: Optional[str] = Query(None, min_length=1),
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=crud.USER_PAGE_MAX),
+    include_total: bool = False,
+    db: Session = Depends(get_db),
+    admin: jwt_auth.Principal = Depends(jwt_auth.require_roles("admin"))
+):
+    """
+    Danh sách user phân trang keyset (thay /debug-all-users).
+    Trang sau: gửi lại `next_cursor` với cùng bộ lọc. `include_total` đếm tối đa
+    crud.USER_COUNT_CAP dòng (`total_exact` = False nếu nhiều hơn).
+    """
+    try:
+        rows, next_cursor = crud.list_users_page(db, role, name_prefix, username_prefix, cursor, limit)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    result = {
+        "items": [
+            {"id": row.user_id, "username": row.username, "role": row.role.value, "name": row.full_name}
+            for row in rows
+        ],
+        "next_cursor": next_cursor,
+    }
+    if include_total:
+        result["total"], result["total_exact"] = crud.count_users(db, role, name_prefix, username_prefix)
     return result
 
 
+@router.get("/admin/users/counts")
+def user_counts(
+    db: Session = Depends(get_db),
+    admin: jwt_auth.Principal = Depends(jwt_auth.require_roles("admin"))
+):
+    """Số user theo role (cho các ô thống kê của trang admin)."""
+    counts = crud.count_users_by_role(db)
+    return {"total": sum(counts.values()), **counts}
+
+
 @router.get("/check-auth")
 def check_auth(user: dict = Depends(jwt_auth.auth)):
     return {"authenticated": True, "user": user}
 
 
 
+# --- Các route đọc của sinh viên: AsyncSession, không chiếm luồng của threadpool ---
 @router.get("/students/{student_id}/enrollments", response_model=list[schemas.EnrollmentRead])
-def get_student_enrollments_api(
+async def get_student_enrollments_api(
         student_id: int,
-        db: Session = Depends(get_db),
-        user: dict = Depends(jwt_auth.auth)
+        db: AsyncSession = Depends(get_async_db),
+        user: dict = Depends(jwt_auth.auth_async)
 ):
     
-    enrollments = crud.get_student_enrollments(db, student_id)
+    enrollments = await crud.get_student_enrollments_async(db, student_id)
     return enrollments
 
 
 @router.get("/classes/{class_id}", response_model=schemas.ClassRead)
-def get_class_detail(
+async def get_class_detail(
         class_id: int,
-        db: Session = Depends(get_db),
-        user: dict = Depends(jwt_auth.auth)
+        db: AsyncSession = Depends(get_async_db),
+        user: dict = Depends(jwt_auth.auth_async)
 ):
     """Lấy thông tin chi tiết của một lớp học"""
-    class_obj = crud.get_class(db, class_id)
+    class_obj = await crud.get_class_async(db, class_id)
 
     if not class_obj:
         raise HTTPException(status_code=404, detail="Không tìm thấy lớp học")
@@ -266,12 +359,20 @@ def get_class_detail(
 
 
 @router.get("/students/{student_id}/grades", response_model=list[schemas.GradeRead])
-def get_student_grades_api(
+async def get_student_grades_api(
         student_id: int,
+        request: Request,
+        response: Response,
         class_id: int = None,
-        db: Session = Depends(get_db),
-        user: dict = Depends(jwt_auth.auth)
+        db: AsyncSession = Depends(get_async_db),
+        user: dict = Depends(jwt_auth.auth_async)
 ):
-
-    grades = crud.get_student_grades(db, student_id, class_id)
-    return grades
\ No newline at end of file
+    # ETag theo classes.version của các lớp liên quan
+    versions = await crud.get_class_versions_async(db, student_id, class_id)
+    etag = http_cache.version_etag("student-grades", student_id, class_id, tuple(versions))
+    if http_cache.etag_matches(request, etag):
+        return http_cache.not_modified(etag)
+
+    grades = await crud.get_student_grades_async(db, student_id, class_id)
+    http_cache.set_etag(response, etag)
+    return grades
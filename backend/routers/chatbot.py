@@ -1,41 +1,23 @@
 from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from sqlalchemy.orm import Session
-from ..db import database, crud, models
+from sqlalchemy import func
+from sqlalchemy.orm import Session, joinedload
+from ..db import database, crud, models, grade_aggregates
+from ..db.database import get_db
+from .. import cache, llm_client, logs
 from . import jwt_auth
-import requests
 from typing import List, Dict, Optional
 from datetime import datetime, date
-
-# Import Gemini (nếu có)
-try:
-    import google.generativeai as genai
-    from ..config import GEMINI_API_KEY, USE_GEMINI
-    if USE_GEMINI and GEMINI_API_KEY != "YOUR_API_KEY_HERE":
-        genai.configure(api_key=GEMINI_API_KEY)
-        GEMINI_AVAILABLE = True
-    else:
-        GEMINI_AVAILABLE = False
-except ImportError:
-    GEMINI_AVAILABLE = False
-    USE_GEMINI = False
+import json
 
 router = APIRouter(
     prefix="/api/chatbot",
     tags=["Chatbot"]
 )
 
-# =========================
-# ✅ Kết nối DB
-# =========================
-def get_db():
-    db = database.SessionLocal()
-    try:
-        # Đảm bảo không cache dữ liệu cũ
-        db.expire_on_commit = True
-        yield db
-    finally:
-        db.close()
+log = logs.get_logger(__name__)
 
 # =========================
 # 🧠 Schema message từ frontend
@@ -111,9 +93,21 @@ def analyze_question(message: str) -> Dict[str, bool]:
 # =========================
 # ✅ LẤY PROFILE NGƯỜI DÙNG
 # =========================
+COMPONENT_SUBJECTS = ['attendance', 'mid', 'final']
+
+
 def get_user_profile(db: Session, user_id: int) -> Dict:
-    """Trả về thông tin user kèm profile sinh viên/giảng viên nếu có"""
-    user = crud.get_user(db, user_id)
+    """
+    Trả về thông tin user kèm profile sinh viên/giảng viên nếu có.
+    Số truy vấn cố định (tối đa 3) bất kể số lớp: user + profile (joinedload),
+    lớp học (join Class), điểm thành phần.
+    """
+    user = (
+        db.query(models.User)
+        .options(joinedload(models.User.student_profile), joinedload(models.User.teacher_profile))
+        .filter(models.User.user_id == user_id)
+        .first()
+    )
     if not user:
         raise HTTPException(status_code=404, detail="Không tìm thấy user")
     
@@ -133,21 +127,27 @@ def get_user_profile(db: Session, user_id: int) -> Dict:
         }
         profile["enrollments"] = [
             {
-                "class_id": e.class_id,
-                "class_name": crud.get_class(db, e.class_id).class_name if crud.get_class(db, e.class_id) else None,
-                "enroll_date": e.enroll_date
-            } for e in crud.get_student_enrollments(db, user.user_id)
+                "class_id": class_id,
+                "class_name": class_name,
+                "enroll_date": enroll_date
+            } for class_id, class_name, enroll_date in (
+                db.query(models.Enrollment.class_id, models.Class.class_name, models.Enrollment.enroll_date)
+                .join(models.Class, models.Class.class_id == models.Enrollment.class_id)
+                .filter(models.Enrollment.student_id == user.user_id)
+                .order_by(models.Enrollment.class_id)
+            )
         ]
         # CHỈ gửi điểm thành phần (attendance, mid, final) cho AI - BỎ QUA điểm cũ
-        all_grades = crud.get_grades_by_student(db, user.user_id)
-        component_grades = [g for g in all_grades if g.subject.lower() in ['attendance', 'mid', 'final']]
-
         profile["grades"] = [
             {
-                "class_id": g.class_id,
-                "subject": g.subject,
-                "score": g.score
-            } for g in component_grades
+                "class_id": class_id,
+                "subject": subject,
+                "score": score
+            } for class_id, subject, score in (
+                db.query(models.Grade.class_id, models.Grade.subject, models.Grade.score)
+                .filter(models.Grade.student_id == user.user_id,
+                        func.lower(models.Grade.subject).in_(COMPONENT_SUBJECTS))
+            )
         ]
     
     elif user.role == models.UserRole.teacher and user.teacher_profile:
@@ -158,54 +158,64 @@ def get_user_profile(db: Session, user_id: int) -> Dict:
         }
         profile["assignments"] = [
             {
-                "class_id": a.class_id,
-                "class_name": crud.get_class(db, a.class_id).class_name if crud.get_class(db, a.class_id) else None
-            } for a in db.query(models.TeachingAssignment).filter(models.TeachingAssignment.teacher_id==user.user_id).all()
+                "class_id": class_id,
+                "class_name": class_name
+            } for class_id, class_name in (
+                db.query(models.TeachingAssignment.class_id, models.Class.class_name)
+                .join(models.Class, models.Class.class_id == models.TeachingAssignment.class_id)
+                .filter(models.TeachingAssignment.teacher_id == user.user_id)
+                .order_by(models.TeachingAssignment.class_id)
+            )
         ]
 
     return profile
 
+
+def format_profile_context(profile: Dict) -> str:
+    """
+    Chuỗi ngữ cảnh gọn cho prompt (thay cho repr của dict), ví dụ:
+      Mã SV: SV001 | Ngày sinh: 2002-03-15
+      Lớp (CC/GK/CK, trung bình 20-30-50):
+      - Lập trình Web [#3, ĐK 2025-01-10]: 8.0/7.5/9.0 → 8.35
+    """
+    lines = []
+    sp = profile.get("student_profile")
+    if sp:
+        lines.append(f"Mã SV: {sp.get('student_code') or 'N/A'} | Ngày sinh: {sp.get('birthdate') or 'N/A'}")
+        scores: Dict[int, Dict[str, float]] = {}
+        for g in profile.get("grades", []):
+            scores.setdefault(g["class_id"], {})[g["subject"].lower()] = g["score"]
+        if profile.get("enrollments"):
+            lines.append("Lớp (CC/GK/CK, trung bình 20-30-50):")
+        for e in profile.get("enrollments", []):
+            s = scores.get(e["class_id"], {})
+            parts = [s.get(k) for k in COMPONENT_SUBJECTS]
+            text = "/".join("-" if v is None else f"{v:g}" for v in parts)
+            if all(v is not None for v in parts):
+                text += f" → {parts[0] * 0.2 + parts[1] * 0.3 + parts[2] * 0.5:.2f}"
+            lines.append(f"- {e['class_name']} [#{e['class_id']}, ĐK {e['enroll_date']}]: {text}")
+
+    tp = profile.get("teacher_profile")
+    if tp:
+        lines.append(f"Khoa: {tp.get('department') or 'N/A'} | Chức danh: {tp.get('title') or 'N/A'}")
+        classes = ", ".join(f"{a['class_name']} [#{a['class_id']}]" for a in profile.get("assignments", []))
+        lines.append(f"Lớp phụ trách: {classes or 'chưa có'}")
+    return "\n".join(lines)
+
 # =========================
 # 📊 TÍNH ĐIỂM TRUNG BÌNH CHUẨN
 # =========================
-def calculate_average(grades: List[models.Grade]) -> float:
+def calculate_average(results: List[models.StudentClassResult]) -> float:
     """
     Tính trung bình chung theo công thức:
     - Chuyên cần (Attendance): 20%
     - Giữa kỳ (Mid): 30%
     - Cuối kỳ (Final): 50%
 
-    CHỈ tính các lớp có đầy đủ điểm thành phần (attendance, mid, final)
-    Bỏ qua điểm cũ (subject = tên môn học)
+    Điểm tổng kết từng lớp (weighted) đã được tính sẵn trong student_class_results,
+    chỉ có khi lớp có đầy đủ 3 điểm thành phần.
     """
-    if not grades:
-        return 0.0
-
-    # Nhóm điểm theo lớp, CHỈ LẤY điểm thành phần
-    component_scores = ['attendance', 'mid', 'final']
-    class_grades = {}
-
-    for grade in grades:
-        subject_lower = grade.subject.lower()
-
-        # Chỉ lấy 3 loại điểm thành phần, BỎ QUA điểm cũ
-        if subject_lower in component_scores:
-            if grade.class_id not in class_grades:
-                class_grades[grade.class_id] = {}
-            class_grades[grade.class_id][subject_lower] = grade.score
-
-    # Tính trung bình từng lớp rồi lấy trung bình chung
-    class_averages = []
-    for class_id, subjects in class_grades.items():
-        attendance = subjects.get('attendance', None)
-        mid = subjects.get('mid', None)
-        final = subjects.get('final', None)
-
-        # CHỈ tính nếu có ĐẦY ĐỦ 3 điểm thành phần
-        if attendance is not None and mid is not None and final is not None:
-            weighted_avg = (attendance * 0.2) + (mid * 0.3) + (final * 0.5)
-            class_averages.append(weighted_avg)
-
+    class_averages = [r.weighted for r in results if r.weighted is not None]
     if not class_averages:
         return 0.0
 
@@ -215,7 +225,7 @@ def calculate_average(grades: List[models.Grade]) -> float:
 # =========================
 # 📈 PHÂN TÍCH KẾT QUẢ HỌC TẬP CHI TIẾT
 # =========================
-def analyze_performance(grades: List[models.Grade], db: Session) -> str:
+def analyze_performance(results: List[models.StudentClassResult], db: Session) -> str:
     """
     Phân tích chi tiết kết quả học tập:
     - Nhóm điểm theo loại (Chuyên cần, Giữa kỳ, Cuối kỳ)
@@ -223,27 +233,17 @@ def analyze_performance(grades: List[models.Grade], db: Session) -> str:
     - Đưa ra nhận xét và lời khuyên chi tiết
     - CHỈ xử lý điểm thành phần (attendance, mid, final), BỎ QUA điểm cũ
     """
-    if not grades:
-        return "📝 Bạn chưa có điểm nào trong hệ thống. Hãy học tập chăm chỉ nhé! 💪"
-
-    # --- Chỉ lấy điểm thành phần (attendance, mid, final) ---
-    component_grades = [g for g in grades if g.subject.lower() in ['attendance', 'mid', 'final']]
-
-    if not component_grades:
+    # student_class_results chỉ có dòng cho lớp đã có ít nhất 1 điểm thành phần
+    if not results:
         return "📝 Bạn chưa có điểm thành phần (chuyên cần, giữa kỳ, cuối kỳ) nào. Hãy chờ giáo viên nhập điểm! 📊"
 
     # --- Nhóm điểm theo loại ---
     score_types = {
-        'attendance': [],    # Chuyên cần
-        'mid': [],          # Giữa kỳ
-        'final': []         # Cuối kỳ
+        'attendance': [r.attendance for r in results if r.attendance is not None],    # Chuyên cần
+        'mid': [r.mid for r in results if r.mid is not None],                         # Giữa kỳ
+        'final': [r.final for r in results if r.final is not None]                    # Cuối kỳ
     }
 
-    for grade in component_grades:
-        subject = grade.subject.lower()
-        if subject in score_types:
-            score_types[subject].append(grade.score)
-
     # --- Tính trung bình từng loại ---
     type_averages = {}
     for score_type, scores in score_types.items():
@@ -284,7 +284,7 @@ def analyze_performance(grades: List[models.Grade], db: Session) -> str:
     analysis += f"\n"
 
     # --- Tìm điểm cao nhất và thấp nhất (CHỈ từ component grades) ---
-    all_scores = [g.score for g in component_grades if g.score]
+    all_scores = [score for scores in score_types.values() for score in scores if score]
     if all_scores:
         highest = max(all_scores)
         lowest = min(all_scores)
@@ -346,6 +346,178 @@ def analyze_performance(grades: List[models.Grade], db: Session) -> str:
 
 
 
+# =========================
+# 🔐 XÁC THỰC NGƯỜI DÙNG CHAT
+# =========================
+def get_chat_user(request: Request, db: Session) -> jwt_auth.Principal:
+    token = jwt_auth.token_from_request(request)
+    if not token:
+        raise HTTPException(status_code=401, detail="Chưa đăng nhập")
+
+    user_data = jwt_auth.decode_tokenNE(token)
+    if not user_data:
+        raise HTTPException(status_code=401, detail="Token không hợp lệ")
+
+    principal = jwt_auth.get_principal(db, user_data.get('username'))
+    if not principal:
+        raise HTTPException(status_code=404, detail="Không tìm thấy user")
+    return principal
+
+# =========================
+# 📋 TRẢ LỜI THEO Ý ĐỊNH (không cần AI)
+# =========================
+def grades_response(db: Session, student_id: int) -> str:
+    rows = (
+        db.query(models.StudentClassResult, models.Class.class_name)
+        .join(models.Class, models.Class.class_id == models.StudentClassResult.class_id)
+        .filter(models.StudentClassResult.student_id == student_id)
+        .order_by(models.StudentClassResult.class_id)
+        .all()
+    )
+
+    if not rows:
+        return "📝 Bạn chưa có điểm thành phần nào. Hãy chờ giáo viên nhập điểm! 📊"
+
+    response = "📊 **ĐIỂM CỦA BẠN (Chi tiết từng thành phần)**\n\n"
+
+    # Hiển thị từng lớp
+    for result, class_name in rows:
+        response += f"📚 **{class_name}**\n"
+
+        if result.attendance is not None:
+            response += f"  • Chuyên cần: {result.attendance}/10\n"
+        if result.mid is not None:
+            response += f"  • Giữa kỳ: {result.mid}/10\n"
+        if result.final is not None:
+            response += f"  • Cuối kỳ: {result.final}/10\n"
+
+        # Điểm lớp (chỉ có khi đủ 3 thành phần)
+        if result.weighted is not None:
+            response += f"  ➜ **Điểm lớp: {result.weighted:.2f}/10**\n"
+
+        response += "\n"
+
+    # Tính điểm trung bình chung
+    overall_avg = calculate_average([result for result, _ in rows])
+    if overall_avg > 0:
+        response += f"🎯 **Điểm trung bình chung: {overall_avg}/10**"
+
+    return response
+
+
+def classes_response(db: Session, student_id: int) -> str:
+    enrollments = crud.get_student_enrollments(db, student_id)
+    if not enrollments:
+        return "📚 Bạn chưa đăng ký lớp học nào. Hãy đăng ký để bắt đầu học tập nhé! 🎓"
+    
+    response = "📚 **CÁC LỚP HỌC CỦA BẠN**\n\n"
+    for e in enrollments:
+        cls = crud.get_class(db, e.class_id)
+        if cls:
+            assign = db.query(models.TeachingAssignment).filter(models.TeachingAssignment.class_id==cls.class_id).first()
+            teacher_name = "Chưa phân công"
+            if assign:
+                t = crud.get_teacher(db, assign.teacher_id)
+                if t and t.user: teacher_name = t.user.full_name
+            response += f"🎓 {cls.class_name}\n  • Năm học: {cls.year}\n  • Học kỳ: {cls.semester}\n  • Giảng viên: {teacher_name}\n  • Ngày đăng ký: {e.enroll_date}\n\n"
+    return response
+
+
+def analysis_response(db: Session, student_id: int) -> str:
+    results = grade_aggregates.get_student_results(db, student_id)
+    analysis = analyze_performance(results, db)
+    return analysis
+
+
+# Câu trả lời chỉ phụ thuộc vào điểm / lớp của sinh viên -> cache được (xem backend/cache.py)
+STUDENT_INTENTS = {
+    "grades": grades_response,
+    "classes": classes_response,
+    "analysis": analysis_response,
+}
+
+
+def build_intent_response(db: Session, db_user: jwt_auth.Principal, message: str) -> Optional[str]:
+    """Trả về câu trả lời Markdown cho các câu hỏi về điểm/lớp/phân tích/giảng viên, None nếu cần hỏi AI."""
+    student_id = db_user.student_id if db_user.role == models.UserRole.student.value else None
+    
+    intent = analyze_question(message)
+    user_message = message.lower().strip()
+
+    kind = None
+    if student_id:
+        if intent["want_grades"]:
+            kind = "grades"
+        elif intent["want_classes"]:
+            kind = "classes"
+        elif intent["want_stats"] or intent["want_analysis"]:
+            kind = "analysis"
+
+    if kind:
+        key = (student_id, kind)
+        response = cache.intent_cache.get(key)
+        if response is None:
+            response = STUDENT_INTENTS[kind](db, student_id)
+            cache.intent_cache.set(key, response)
+        return response
+
+    # --- Danh sách giảng viên ---
+    if "giảng viên" in user_message or "teacher" in user_message:
+        teachers = crud.get_teachers(db)
+        if not teachers:
+            return "Hiện hệ thống chưa có giảng viên nào."
+        response = "👨‍🏫 **DANH SÁCH GIẢNG VIÊN**\n\n"
+        for t in teachers:
+            if t.user:
+                response += f"• {t.user.full_name}\n"
+                if t.title: response += f"  Chức danh: {t.title}\n"
+                if t.department: response += f"  Khoa: {t.department}\n"
+                response += "\n"
+        return response
+
+    return None
+
+# =========================
+# 🧠 MESSAGES GỬI CHO AI
+# =========================
+def build_llm_messages(db: Session, db_user: jwt_auth.Principal, data: ChatMessage) -> List[Dict[str, str]]:
+    messages = [system_prompt]
+    if data.conversation_history:
+        messages.extend(data.conversation_history)
+
+    # Thêm profile người dùng vào context - NÊN BẬT TÊN THẬT
+    profile_info = get_user_profile(db, db_user.user_id)
+    user_context = (
+        f"Người dùng hiện tại:\n"
+        f"- Tên: {profile_info.get('full_name', 'N/A')} (DÙNG TÊN NÀY KHI CHÀO)\n"
+        f"- Username: {profile_info.get('username', 'N/A')} (ĐỪNG DÙNG USERNAME)\n"
+        f"- Vai trò: {profile_info.get('role', 'N/A')}\n"
+        f"\nDữ liệu chi tiết:\n{format_profile_context(profile_info)}"
+    )
+    messages.append({
+        "role": "user",
+        "content": f"{data.message}\n\n[{user_context}]"
+    })
+    return messages
+
+
+def prepare_chat(request: Request, db: Session, data: ChatMessage):
+    """
+    Phần truy vấn DB của /chat và /chat/stream: (câu trả lời có sẵn, None) hoặc
+    (None, messages cho LLM). Chạy trong threadpool và trả connection về pool trước
+    khi chờ LLM, nên route async không chặn event loop khi pool đang cạn.
+    """
+    try:
+        db_user = get_chat_user(request, db)
+        reply = build_intent_response(db, db_user, data.message)
+        messages = build_llm_messages(db, db_user, data) if reply is None else None
+    finally:
+        db.rollback()
+    return reply, messages
+
+
+EMPTY_REPLY = "Xin lỗi, mình chưa hiểu rõ câu hỏi của bạn. Bạn có thể nói rõ hơn được không? 🤔"
+BUSY_REPLY = "🤖 AI đang bận, nhưng mình vẫn có thể giúp bạn:\n\n• Xem điểm\n• Thống kê kết quả học tập\n• Danh sách giảng viên\n\nBạn muốn biết điều gì? 😊"
 
 # =========================
 # 💬 API chính: chat với AI
@@ -357,197 +529,89 @@ async def chat_with_ai(
     db: Session = Depends(get_db)
 ):
     try:
-        token = request.cookies.get("access_token") or \
-                (request.headers.get("Authorization").split("Bearer ")[1] 
-                 if request.headers.get("Authorization", "").startswith("Bearer ") else None)
-        
-        if not token:
-            raise HTTPException(status_code=401, detail="Chưa đăng nhập")
-        
-        user_data = jwt_auth.decode_tokenNE(token)
-        if not user_data:
-            raise HTTPException(status_code=401, detail="Token không hợp lệ")
-        
-        username = user_data.get('username')
-        user_id = user_data.get('id')
+        reply, messages = await run_in_threadpool(prepare_chat, request, db, data)
+        if reply is not None:
+            return {"response": reply}
 
-        # 🔄 QUAN TRỌNG: Xóa cache NGAY để lấy dữ liệu mới nhất từ DB
-        db.expire_all()
+        # Gọi AI (Gemini, fallback Ollama) - không chặn event loop
+        try:
+            reply = await llm_client.gateway.chat(messages)
+            return {"response": reply or EMPTY_REPLY}
 
-        db_user = crud.get_user_by_username(db, username)
-        if not db_user:
-            raise HTTPException(status_code=404, detail="Không tìm thấy user")
-        
-        student_id = db_user.student_profile.student_id if db_user.role==models.UserRole.student and db_user.student_profile else None
-        
-        intent = analyze_question(data.message)
-        user_message = data.message.lower().strip()
-
-        # --- Xử lý yêu cầu điểm ---
-        if intent["want_grades"] and student_id:
-            grades = crud.get_grades_by_student(db, student_id)
-
-            if not grades:
-                return {"response": "📝 Bạn chưa có điểm nào trong hệ thống. Hãy chăm chỉ học tập nhé! 💪"}
-
-            # CHỈ LẤY điểm thành phần (attendance, mid, final) - ĐỒNG BỘ VỚI ANALYZE
-            component_grades = [g for g in grades if g.subject.lower() in ['attendance', 'mid', 'final']]
-
-            if not component_grades:
-                return {"response": "📝 Bạn chưa có điểm thành phần nào. Hãy chờ giáo viên nhập điểm! 📊"}
-
-            response = "📊 **ĐIỂM CỦA BẠN (Chi tiết từng thành phần)**\n\n"
-
-            # Nhóm theo lớp
-            class_grades = {}
-            for grade in component_grades:
-                if grade.class_id not in class_grades:
-                    cls = crud.get_class(db, grade.class_id)
-                    if cls:
-                        class_grades[grade.class_id] = {
-                            'name': cls.class_name,
-                            'attendance': None,
-                            'mid': None,
-                            'final': None
-                        }
-
-                if grade.class_id in class_grades:
-                    subject = grade.subject.lower()
-                    if subject in ['attendance', 'mid', 'final']:
-                        class_grades[grade.class_id][subject] = grade.score
-
-            # Hiển thị từng lớp
-            for class_id, data in sorted(class_grades.items()):
-                response += f"📚 **{data['name']}**\n"
-
-                if data['attendance'] is not None:
-                    response += f"  • Chuyên cần: {data['attendance']}/10\n"
-                if data['mid'] is not None:
-                    response += f"  • Giữa kỳ: {data['mid']}/10\n"
-                if data['final'] is not None:
-                    response += f"  • Cuối kỳ: {data['final']}/10\n"
-
-                # Tính điểm trung bình lớp (nếu có đủ 3 thành phần)
-                if all(data[k] is not None for k in ['attendance', 'mid', 'final']):
-                    avg = (data['attendance'] * 0.2) + (data['mid'] * 0.3) + (data['final'] * 0.5)
-                    response += f"  ➜ **Điểm lớp: {avg:.2f}/10**\n"
+        except llm_client.LLMUnavailable as e:
+            log.warning("llm unavailable", extra={"error": str(e)})
+            return {"response": BUSY_REPLY}
 
-                response += "\n"
+    except HTTPException:
+        raise
+    except Exception as e:
+        log.exception("chatbot request failed")
+        raise HTTPException(status_code=500, detail="Đã có lỗi xảy ra khi xử lý yêu cầu.")
 
-            # Tính điểm trung bình chung
-            overall_avg = calculate_average(grades)
-            if overall_avg > 0:
-                response += f"🎯 **Điểm trung bình chung: {overall_avg}/10**"
-
-            return {"response": response}
-
-        # --- Xử lý lớp học ---
-        elif intent["want_classes"] and student_id:
-            enrollments = crud.get_student_enrollments(db, student_id)
-            if not enrollments:
-                return {"response": "📚 Bạn chưa đăng ký lớp học nào. Hãy đăng ký để bắt đầu học tập nhé! 🎓"}
-            
-            response = "📚 **CÁC LỚP HỌC CỦA BẠN**\n\n"
-            for e in enrollments:
-                cls = crud.get_class(db, e.class_id)
-                if cls:
-                    assign = db.query(models.TeachingAssignment).filter(models.TeachingAssignment.class_id==cls.class_id).first()
-                    teacher_name = "Chưa phân công"
-                    if assign:
-                        t = crud.get_teacher(db, assign.teacher_id)
-                        if t and t.user: teacher_name = t.user.full_name
-                    response += f"🎓 {cls.class_name}\n  • Năm học: {cls.year}\n  • Học kỳ: {cls.semester}\n  • Giảng viên: {teacher_name}\n  • Ngày đăng ký: {e.enroll_date}\n\n"
-            return {"response": response}
-        
-        # --- Phân tích kết quả ---
-        elif (intent["want_stats"] or intent["want_analysis"]) and student_id:
-            grades = crud.get_grades_by_student(db, student_id)
-            analysis = analyze_performance(grades, db)
-            return {"response": analysis}
-
-        # --- Danh sách giảng viên ---
-        elif "giảng viên" in user_message or "teacher" in user_message:
-            teachers = crud.get_teachers(db)
-            if not teachers:
-                return {"response": "Hiện hệ thống chưa có giảng viên nào."}
-            response = "👨‍🏫 **DANH SÁCH GIẢNG VIÊN**\n\n"
-            for t in teachers:
-                if t.user:
-                    response += f"• {t.user.full_name}\n"
-                    if t.title: response += f"  Chức danh: {t.title}\n"
-                    if t.department: response += f"  Khoa: {t.department}\n"
-                    response += "\n"
-            return {"response": response}
-        
-        # --- Gửi câu hỏi không xác định cho AI ---
-        messages = [system_prompt]
-        if data.conversation_history:
-            messages.extend(data.conversation_history)
-        
-        # Thêm profile người dùng vào context - NÊN BẬT TÊN THẬT
-        profile_info = get_user_profile(db, db_user.user_id)
-        user_context = (
-            f"Người dùng hiện tại:\n"
-            f"- Tên: {profile_info.get('full_name', 'N/A')} (DÙNG TÊN NÀY KHI CHÀO)\n"
-            f"- Username: {profile_info.get('username', 'N/A')} (ĐỪNG DÙNG USERNAME)\n"
-            f"- Vai trò: {profile_info.get('role', 'N/A')}\n"
-            f"\nDữ liệu chi tiết: {profile_info}"
-        )
-        messages.append({
-            "role": "user",
-            "content": f"{data.message}\n\n[{user_context}]"
-        })
-        
-        # Gọi AI (Gemini hoặc Ollama)
-        try:
-            if USE_GEMINI and GEMINI_AVAILABLE:
-                # ===== SỬ DỤNG GEMINI (Nhanh, chính xác) =====
-                try:
-                    model = genai.GenerativeModel('gemini-2.5-flash')  # Model mới nhất, ổn định
-
-                    # Chuyển đổi messages sang prompt cho Gemini
-                    system_text = system_prompt['content']
-                    user_text = messages[-1]['content']
-                    full_prompt = f"{system_text}\n\n{user_text}"
-
-                    response = model.generate_content(full_prompt)
-                    reply = response.text.strip() if response.text else \
-                            "Xin lỗi, mình chưa hiểu rõ câu hỏi của bạn. Bạn có thể nói rõ hơn được không? 🤔"
-
-                    return {"response": reply}
-
-                except Exception as gemini_error:
-                    # Nếu Gemini lỗi (quota/rate limit), fallback về Ollama
-                    print(f"⚠️ Gemini lỗi ({gemini_error}), fallback về Ollama...")
-                    # Tiếp tục xuống phần Ollama bên dưới
-
-            # ===== SỬ DỤNG OLLAMA (Local - Fallback) =====
-            res = requests.post(
-                "http://localhost:11434/api/chat",
-                json={"model":"llama3","messages":messages,"stream":False},
-                timeout=60
-            )
-            if res.status_code != 200:
-                return {"response": "⚠️ Không thể kết nối tới AI. Vui lòng thử lại sau!"}
-            result = res.json()
-            reply = result.get("message", {}).get("content", "").strip() or \
-                    "Xin lỗi, mình chưa hiểu rõ câu hỏi của bạn. Bạn có thể nói rõ hơn được không? 🤔"
-            return {"response": reply}
+# =========================
+# 📡 API chat dạng stream (Server-Sent Events)
+# =========================
+def sse_event(payload: Dict, event: Optional[str] = None) -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(payload, ensure_ascii=False)}\n\n"
 
-        except Exception as e:
-            print(f"❌ Lỗi AI: {e}")
-            import traceback
-            traceback.print_exc()
-            return {"response": "🤖 AI đang bận, nhưng mình vẫn có thể giúp bạn:\n\n• Xem điểm\n• Thống kê kết quả học tập\n• Danh sách giảng viên\n\nBạn muốn biết điều gì? 😊"}
 
+@router.post("/chat/stream")
+async def chat_with_ai_stream(
+    data: ChatMessage,
+    request: Request,
+    db: Session = Depends(get_db)
+):
+    """
+    Giống /chat nhưng trả về text/event-stream:
+      data: {"delta": "..."}   - từng đoạn câu trả lời
+      event: done              - kết thúc
+    Mọi truy vấn DB chạy xong trước khi bắt đầu stream.
+    """
+    try:
+        reply, messages = await run_in_threadpool(prepare_chat, request, db, data)
     except HTTPException:
         raise
     except Exception as e:
-        print(f"❌ Lỗi chatbot: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception("chatbot request failed")
         raise HTTPException(status_code=500, detail="Đã có lỗi xảy ra khi xử lý yêu cầu.")
 
+    async def events():
+        if reply is not None:
+            # Câu trả lời có sẵn: gửi từng dòng để frontend hiển thị dần
+            for line in reply.splitlines(keepends=True):
+                yield sse_event({"delta": line})
+        else:
+            sent = False
+            try:
+                async for token in llm_client.gateway.stream(messages):
+                    sent = True
+                    yield sse_event({"delta": token})
+                if not sent:
+                    yield sse_event({"delta": EMPTY_REPLY})
+            except llm_client.LLMUnavailable as e:
+                log.warning("llm unavailable", extra={"error": str(e), "started": sent})
+                if not sent:
+                    yield sse_event({"delta": BUSY_REPLY})
+                else:
+                    yield sse_event({"detail": "AI bị ngắt giữa chừng"}, event="error")
+        yield sse_event({}, event="done")
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# =========================
+# 📈 THỐNG KÊ CACHE (admin)
+# =========================
+@router.get("/cache/stats")
+def get_cache_stats(user: dict = Depends(jwt_auth.auth)):
+    if user.get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Access denied. Admin only.")
+    return {"intent_cache": cache.intent_cache.stats()}
+
 # =========================
 # 💡 GỢI Ý CÂU HỎI
 # =========================
@@ -572,6 +636,6 @@ async def get_chatbot_suggestions(request: Request):
             "💡 Làm sao để học hiệu quả hơn?"
         ]}
     except Exception as e:
-        print(f"❌ Lỗi suggestions: {e}")
+        log.exception("chatbot suggestions failed")
         return {"suggestions": ["📊 Xem điểm", "📚 Xem lớp học", "💡 Tư vấn học tập"]}
 
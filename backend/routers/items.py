@@ -3,15 +3,10 @@ from sqlalchemy.orm import Session
 
 from ..db import schemas
 from ..db import crud, models, database
+from ..db.database import get_db
 
 router = APIRouter()
 
-def get_db():
-    db = database.SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
 
 @router.get("/items/", response_model=list[schemas.Item])
 def read_items(skip: int = 0, limit: int = 10, db: Session = Depends(get_db)):
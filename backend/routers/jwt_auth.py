@@ -1,10 +1,18 @@
+import hashlib
 import os
+import time
+from typing import NamedTuple, Optional
+
 from dotenv import load_dotenv
 from fastapi import Depends, HTTPException, status, Request  # Thêm Request
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt, JWTError
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
 
-from bcrypt import checkpw, hashpw, gensalt
+from .. import cache, logs, passwords
+from ..db import database, models
 
 # load .env
 load_dotenv()
@@ -13,36 +21,141 @@ ALGORITHM = os.getenv("ALGORITHM", "HS256")
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
-def auth(token: str = Depends(oauth2_scheme)):
-    try:
-        token = token.strip("\"")
-        print("Decoding token:", token)
-        payload = jwt.decode(token, JWT_SECRET, algorithms=[ALGORITHM])
-        print("payload", payload)
-        return payload
-    except JWTError as e:
-        print("JWTError:", e)
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid or expired token",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+log = logs.get_logger(__name__)
+
+
+class Principal(NamedTuple):
+    """Thông tin user cần cho phân quyền, được cache theo username."""
+    user_id: int
+    username: str
+    role: str
+    student_id: Optional[int]
+    teacher_id: Optional[int]
+
+
+def token_from_request(request: Request) -> Optional[str]:
+    """Lấy token từ cookie (access_token / token) hoặc header Authorization: Bearer."""
+    token = request.cookies.get("access_token") or request.cookies.get("token")
+    if not token:
+        auth_header = request.headers.get("Authorization", "")
+        if auth_header.startswith("Bearer "):
+            token = auth_header.split("Bearer ")[1]
+    return token.strip("\"") if token else None
+
+
+def _principal_query(username: str):
+    return (
+        select(models.User.user_id, models.User.username, models.User.role,
+               models.Student.student_id, models.Teacher.teacher_id)
+        .outerjoin(models.Student, models.Student.student_id == models.User.user_id)
+        .outerjoin(models.Teacher, models.Teacher.teacher_id == models.User.user_id)
+        .where(models.User.username == username)
+    )
+
+
+def _cache_principal(row) -> Optional[Principal]:
+    if row is None:
+        return None
+    user_id, username, role, student_id, teacher_id = row
+    principal = Principal(user_id, username, getattr(role, "value", role), student_id, teacher_id)
+    cache.principal_cache.set(username, principal)
+    return principal
+
+
+def get_principal(db: Session, username: str) -> Optional[Principal]:
+    """Principal của username: lấy từ cache, nếu chưa có thì 1 câu query (user + id hồ sơ)."""
+    principal = cache.principal_cache.get(username)
+    if principal is not None:
+        return principal
+    return _cache_principal(db.execute(_principal_query(username)).first())
+
+
+async def get_principal_async(db: AsyncSession, username: str) -> Optional[Principal]:
+    principal = cache.principal_cache.get(username)
+    if principal is not None:
+        return principal
+    return _cache_principal((await db.execute(_principal_query(username))).first())
+
+
+def principal_from_token(db: Session, token: Optional[str]) -> Optional[Principal]:
+    payload = decode_tokenNE(token) if token else None
+    if not payload or not payload.get("username"):
+        return None
+    return get_principal(db, payload["username"])
+
+
+def _unauthorized() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid or expired token",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+
+def current_principal(request: Request, db: Session = Depends(database.get_db)) -> Principal:
+    """Dependency xác thực chung: token (cookie hoặc header) -> Principal."""
+    principal = principal_from_token(db, token_from_request(request))
+    if principal is None:
+        raise _unauthorized()
+    return principal
+
+
+def require_roles(*roles: str):
+    """Dependency: như current_principal nhưng chỉ cho phép các role trong `roles`."""
+    def checker(principal: Principal = Depends(current_principal)) -> Principal:
+        if principal.role not in roles:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
+                                detail=f"Requires {' or '.join(roles)} role")
+        return principal
+    return checker
+
+
+def _auth_payload(payload: dict, principal: Optional[Principal]) -> dict:
+    if principal is None:
+        raise _unauthorized()
+    return {**payload, "id": principal.user_id, "role": principal.role}
+
+
+def auth(token: str = Depends(oauth2_scheme), db: Session = Depends(database.get_db)):
+    """Payload của token (header Bearer), với id / role lấy từ Principal mới nhất."""
+    payload = decode_tokenNE(token.strip("\""))
+    if not payload or not payload.get("username"):
+        raise _unauthorized()
+    return _auth_payload(payload, get_principal(db, payload["username"]))
+
+
+async def auth_async(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(database.get_async_db)):
+    """Như auth nhưng dùng AsyncSession, cho các route async (không chiếm luồng của threadpool)."""
+    payload = decode_tokenNE(token.strip("\""))
+    if not payload or not payload.get("username"):
+        raise _unauthorized()
+    return _auth_payload(payload, await get_principal_async(db, payload["username"]))
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
+    return passwords.verify_password(plain_password, hashed_password)
 
 def hash_password(password: str) -> str:
-    return hashpw(password.encode('utf-8'), gensalt()).decode('utf-8')
+    return passwords.hash_password(password)
 
 def create_token(data: dict):
     return jwt.encode(data, JWT_SECRET, algorithm=ALGORITHM)
 
 def decode_tokenNE(token: str):
+    """Giải mã + kiểm tra chữ ký JWT; kết quả hợp lệ được cache (key = sha256 của token) tới `exp`."""
+    key = hashlib.sha256(token.encode('utf-8')).hexdigest()
+    payload = cache.token_cache.get(key)
+    if payload is not None:
+        return dict(payload)
     try:
         payload = jwt.decode(token, JWT_SECRET, algorithms=[ALGORITHM])
-        return payload
     except JWTError:
         return None
+    ttl = cache.token_cache.ttl
+    if isinstance(payload.get("exp"), (int, float)):
+        ttl = min(ttl, payload["exp"] - time.time())
+    if ttl > 0:
+        cache.token_cache.set(key, payload, ttl)
+    return dict(payload)
 
 # Thêm hàm verify_token (thay thế cho hàm bị lỗi)
 def verify_token(token: str):
@@ -90,5 +203,5 @@ async def get_current_user(request: Request):
 
         return user
     except Exception as e:
-        print(f"[get_current_user] Error: {e}")
+        log.warning("chatbot auth failed", extra={"error": str(e)})
         raise HTTPException(status_code=401, detail="Authentication error")
@@ -0,0 +1,34 @@
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+
+from .. import search
+from ..db import database
+from . import jwt_auth
+
+router = APIRouter(tags=["Search"])
+
+
+@router.get("/search")
+def search_all(
+    q: str = Query(..., min_length=1, max_length=100),
+    kinds: Optional[str] = Query(None, description="lọc loại: student,teacher,class"),
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(database.get_db),
+    principal: jwt_auth.Principal = Depends(jwt_auth.require_roles("teacher", "admin"))
+):
+    """
+    Tìm sinh viên (tên, mã SV), giảng viên (tên, khoa) và lớp (tên lớp).
+    Không phân biệt dấu; mỗi từ khớp đúng, theo tiền tố, hoặc sai 1 ký tự.
+    """
+    selected = search.KINDS
+    if kinds:
+        selected = tuple(k.strip() for k in kinds.split(",") if k.strip())
+        unknown = set(selected) - set(search.KINDS)
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown kinds: {', '.join(sorted(unknown))}")
+
+    search.index.ensure_built(db)
+    search.index.sync(db)
+    return {"query": q, "results": search.index.search(q, selected, limit)}
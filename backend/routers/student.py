@@ -1,7 +1,9 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from ..db import schemas, models, crud, database
+from .. import http_cache, join_codes, logs
 from . import jwt_auth
 
 router = APIRouter(
@@ -9,6 +11,8 @@ router = APIRouter(
     tags=["Student"]
 )
 
+log = logs.get_logger(__name__)
+
 # ✅ CHỈ GIỮ CÁC ROUTES KHÔNG BỊ CONFLICT VỚI API.PY
 
 @router.get("/test")
@@ -16,13 +20,31 @@ def test_student():
     return {"message": "Student router connected!"}
 
 
+@router.get("/dashboard")
+def get_dashboard(
+    request: Request,
+    db: Session = Depends(database.get_db),
+    principal: jwt_auth.Principal = Depends(jwt_auth.require_roles("student"))
+):
+    """Trang chủ sinh viên trong 1 request: hồ sơ, lớp đã đăng ký, điểm từng lớp (hỗ trợ If-None-Match)"""
+    dashboard = crud.get_student_dashboard(db, principal.user_id)
+    if dashboard is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return http_cache.json_with_etag(request, dashboard)
+
+
 @router.get("/all")
 def get_all_students(
+    after: Optional[int] = None,
+    limit: int = Query(100, ge=1, le=500),
     db: Session = Depends(database.get_db),
     user: dict = Depends(jwt_auth.auth)
 ):
-    """Lấy danh sách tất cả sinh viên (admin only)"""
-    students = db.query(models.Student).all()
+    """Lấy danh sách sinh viên (admin only), phân trang keyset: `after` = student_id cuối trang trước"""
+    query = db.query(models.Student)
+    if after is not None:
+        query = query.filter(models.Student.student_id > after)
+    students = query.order_by(models.Student.student_id).limit(limit).all()
     return students
 
 
@@ -60,12 +82,15 @@ def get_student_statistics(
     db: Session = Depends(database.get_db),
     user: dict = Depends(jwt_auth.auth)
 ):
-    """Lấy thống kê điểm của sinh viên"""
-    grades = db.query(models.Grade).filter(
-        models.Grade.student_id == student_id
-    ).all()
+    """Lấy thống kê điểm tổng kết các lớp của sinh viên (từ student_class_results)"""
+    count, avg, highest, lowest = db.query(
+        func.count(models.StudentClassResult.weighted),
+        func.avg(models.StudentClassResult.weighted),
+        func.max(models.StudentClassResult.weighted),
+        func.min(models.StudentClassResult.weighted)
+    ).filter(models.StudentClassResult.student_id == student_id).one()
     
-    if not grades:
+    if not count:
         return {
             "total_subjects": 0,
             "average_score": 0,
@@ -73,13 +98,11 @@ def get_student_statistics(
             "lowest_score": 0
         }
     
-    scores = [float(g.score) for g in grades]
-    
     return {
-        "total_subjects": len(scores),
-        "average_score": round(sum(scores) / len(scores), 2),
-        "highest_score": max(scores),
-        "lowest_score": min(scores)
+        "total_subjects": count,
+        "average_score": round(avg, 2),
+        "highest_score": round(highest, 2),
+        "lowest_score": round(lowest, 2)
     }
 
 
@@ -99,19 +122,20 @@ def add_student(
 @router.post("/{student_id}/join")
 def join_class(student_id: int, request: schemas.JoinCode, db: Session = Depends(database.get_db)):
     
-    join_code = request.code
-    print(join_code)
-    check = db.query(models.JoinCode).filter(models.JoinCode.code == join_code).first()
+    check = join_codes.index.lookup(db, request.code)
     if check is None:
-        print("DEBUG: class not found")
+        log.debug("join code not found", extra={"student_id": student_id})
         return {"message": "Class not found"}
+    if join_codes.expired(check):
+        log.debug("join code expired", extra={"student_id": student_id, "class_id": check.class_id})
+        return {"message": "Join code expired"}
 
     existing = db.query(models.Enrollment).filter(
         models.Enrollment.student_id == student_id,
         models.Enrollment.class_id == check.class_id
     ).first()
     if existing:
-        print("DEBUG: already joined")
+        log.debug("class already joined", extra={"student_id": student_id, "class_id": check.class_id})
         return {"message": "Class already joined"}
 
     enrollment_data = schemas.EnrollmentCreate(
@@ -119,5 +143,5 @@ def join_class(student_id: int, request: schemas.JoinCode, db: Session = Depends
         class_id=check.class_id
     )
     crud.enroll_student(db, enrollment_data)
-    print("DEBUG: joined successfully")
+    log.debug("class joined", extra={"student_id": student_id, "class_id": check.class_id})
     return {"message": "Class joined successfully"}
\ No newline at end of file
@@ -1,7 +1,7 @@
 # backend/routers/teacher.py - FIXED FULL VERSION
-from fastapi import APIRouter, Depends, HTTPException, status, Request, UploadFile, File
-from fastapi.responses import StreamingResponse, Response
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query, status, Request, UploadFile, File
+from fastapi.responses import StreamingResponse
+from typing import List, Optional
 from sqlalchemy.orm import Session
 from pydantic import BaseModel, Field
 import csv
@@ -10,6 +10,7 @@ import re
 from urllib.parse import quote
 
 from ..db import teacher_crud, crud, database, schemas, models
+from .. import cache, http_cache
 from ..db.database import get_db
 from ..routers import jwt_auth
 
@@ -38,57 +39,20 @@ class GradeUpdateRequest(BaseModel):
 
 
 
-def get_current_teacher(request: Request, db: Session = Depends(get_db)):
-    token = None
-    token = request.cookies.get("token")
-    if not token:
-        auth = request.headers.get("Authorization")
-        if auth and auth.startswith("Bearer "):
-            token = auth.split("Bearer ")[1]
-    if not token:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Missing token")
-
-    try:
-        payload = jwt_auth.decode_tokenNE(token)
-        username = payload.get("username")
-        if not username:
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token payload")
-    except Exception:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
-
-    db_user = crud.get_user_by_username(db, username)
-    if not db_user:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
-    if db_user.role != schemas.UserRole.teacher:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Requires teacher role")
-    return db_user
+# Principal (user_id, role, ...) của giáo viên, lấy qua dependency xác thực chung
+get_current_teacher = jwt_auth.require_roles("teacher")
 
 
 # ================== ROUTES ==================
 
 @router.get("/classes", summary="Get classes for current teacher")
-def list_classes(current_user: models.User = Depends(get_current_teacher), db: Session = Depends(get_db)):
-    teacher_id = current_user.user_id
-    cls = teacher_crud.get_teacher_classes(db, teacher_id)
-
-    result = []
-    for c in cls:
-        
-        student_count = db.query(models.Enrollment).filter(models.Enrollment.class_id == c.class_id).count()
-
-        result.append({
-            "class_id": c.class_id,
-            "class_name": c.class_name,
-            "year": c.year,
-            "semester": c.semester,
-            "current_students": student_count
-        })
-    return result
+def list_classes(current_user: jwt_auth.Principal = Depends(get_current_teacher), db: Session = Depends(get_db)):
+    return teacher_crud.get_teacher_classes(db, current_user.user_id)
 
 
 @router.post("/classes", summary="Create class and assign to current teacher")
 def create_class(class_in: schemas.ClassCreate,
-                 current_user: models.User = Depends(get_current_teacher),
+                 current_user: jwt_auth.Principal = Depends(get_current_teacher),
                  db: Session = Depends(get_db)):
     teacher_id = current_user.user_id
     newc = teacher_crud.create_class_for_teacher(db, teacher_id, class_in)
@@ -97,25 +61,44 @@ def create_class(class_in: schemas.ClassCreate,
 
 @router.get("/classes/{class_id}", summary="Get class detail (students + grades)")
 def get_class(class_id: int,
-              current_user: models.User = Depends(get_current_teacher),
+              request: Request,
+              current_user: jwt_auth.Principal = Depends(get_current_teacher),
               db: Session = Depends(get_db)):
-    ta = db.query(models.TeachingAssignment).filter(
-        models.TeachingAssignment.class_id == class_id,
-        models.TeachingAssignment.teacher_id == current_user.user_id
-    ).first()
-    if not ta:
+    # ETag theo classes.version: 304 chỉ tốn 1 câu query, không đọc bảng điểm
+    version = teacher_crud.assigned_class_version(db, current_user.user_id, class_id)
+    if version is None:
         raise HTTPException(status_code=403, detail="You are not assigned to this class")
+    etag = http_cache.version_etag("class-detail", class_id, version)
+    if http_cache.etag_matches(request, etag):
+        return http_cache.not_modified(etag)
 
     detail = teacher_crud.get_class_detail(db, class_id)
     if not detail:
         raise HTTPException(status_code=404, detail="Class not found")
-    return detail
+    return http_cache.json_with_etag(request, detail, etag)
+
+
+class RotateJoinCodeRequest(BaseModel):
+    ttl_days: Optional[float] = Field(None, gt=0, description="Số ngày mã mới còn hiệu lực (mặc định theo cấu hình)")
+    grace_minutes: float = Field(0, ge=0, description="Mã cũ còn dùng được thêm bao nhiêu phút")
+
+
+@router.post("/classes/{class_id}/join-code", summary="Rotate the class join code")
+def rotate_join_code(class_id: int,
+                     payload: RotateJoinCodeRequest = RotateJoinCodeRequest(),
+                     current_user: jwt_auth.Principal = Depends(get_current_teacher),
+                     db: Session = Depends(get_db)):
+    if teacher_crud.assigned_class_version(db, current_user.user_id, class_id) is None:
+        raise HTTPException(status_code=403, detail="You are not assigned to this class")
+    ttl = payload.ttl_days * 86400 if payload.ttl_days else None
+    join_code = teacher_crud.rotate_join_code(db, class_id, ttl, payload.grace_minutes * 60)
+    return {"join_code": join_code.code, "expires_at": join_code.expires_at}
 
 
 @router.post("/classes/{class_id}/students", summary="Add (or create) student and enroll into class")
 def add_student(class_id: int,
                 payload: dict,
-                current_user: models.User = Depends(get_current_teacher),
+                current_user: jwt_auth.Principal = Depends(get_current_teacher),
                 db: Session = Depends(get_db)):
     full_name = payload.get("full_name")
     student_code = payload.get("student_code")
@@ -136,7 +119,7 @@ def add_student(class_id: int,
 @router.delete("/classes/{class_id}/students/{student_id}", summary="Unenroll student from a class")
 def delete_student(class_id: int,
                    student_id: int,
-                   current_user: models.User = Depends(get_current_teacher),
+                   current_user: jwt_auth.Principal = Depends(get_current_teacher),
                    db: Session = Depends(get_db)):
     ta = db.query(models.TeachingAssignment).filter(
         models.TeachingAssignment.class_id == class_id,
@@ -154,7 +137,7 @@ def delete_student(class_id: int,
 @router.post("/classes/{class_id}/grades", summary="Save/update grades (bulk)")
 def save_grades(class_id: int,
                 grades: List[GradeUpdateRequest],
-                current_user: models.User = Depends(get_current_teacher),
+                current_user: jwt_auth.Principal = Depends(get_current_teacher),
                 db: Session = Depends(get_db)):
     """
     Update điểm cho sinh viên trong lớp
@@ -176,174 +159,288 @@ def save_grades(class_id: int,
 
     payload = [g.model_dump() for g in grades]
     try:
-        teacher_crud.save_grades(db, class_id, payload)
+        counts = teacher_crud.save_grades(db, class_id, payload)
         return {
             "ok": True,
             "message": f"Updated {len(grades)} grade(s) successfully",
-            "updated_count": len(grades)
+            "updated_count": len(grades),
+            "inserted": counts["inserted"],
+            "updated": counts["updated"],
+            "unchanged": counts["unchanged"]
         }
     except Exception as e:
+        db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to save grades: {str(e)}")
 
 
-@router.delete("/classes/{class_id}", summary="Delete a class and its enrollments")
+@router.delete("/classes/{class_id}", summary="Archive (or permanently delete) a class")
 def delete_class(class_id: int,
-                 current_user: models.User = Depends(get_current_teacher),
+                 permanent: bool = Query(False, description="Xóa hẳn thay vì lưu trữ"),
+                 current_user: jwt_auth.Principal = Depends(get_current_teacher),
                  db: Session = Depends(get_db)):
     """
-    Xóa lớp học do giáo viên sở hữu, bao gồm enrollment, assignment, join code, và điểm.
+    Xóa lớp học do giáo viên được phân công. Mặc định lớp được lưu trữ (khôi phục
+    được, xem /archived-classes); permanent=true thì xóa hẳn. Enrollment,
+    assignment, join code, điểm được DB xóa theo lớp (ON DELETE CASCADE).
     """
-   
-    ta = (
-        db.query(models.TeachingAssignment)
-        .filter(
-            models.TeachingAssignment.class_id == class_id,
-            models.TeachingAssignment.teacher_id == current_user.user_id
-        )
-        .first()
-    )
-    if not ta:
+    if teacher_crud.assigned_class_version(db, current_user.user_id, class_id) is None:
         raise HTTPException(
             status_code=403,
             detail="You are not assigned to this class or lack permission"
         )
 
-    cls = db.query(models.Class).filter(models.Class.class_id == class_id).first()
-    if not cls:
-        raise HTTPException(status_code=404, detail="Class not found")
-
     try:
-        
-        db.query(models.Enrollment).filter(models.Enrollment.class_id == class_id).delete(synchronize_session=False)
+        if permanent:
+            student_ids = teacher_crud.delete_class(db, class_id)
+            result = {"ok": True, "message": f"Class {class_id} deleted successfully"}
+        else:
+            archive_id, student_ids = teacher_crud.archive_class(db, class_id, current_user.user_id)
+            result = {"ok": True, "message": f"Class {class_id} archived", "archive_id": archive_id}
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=f"Failed to delete class: {str(e)}")
+    cache.invalidate_students(student_ids)
+    return result
+
 
-        
-        db.query(models.TeachingAssignment).filter(models.TeachingAssignment.class_id == class_id).delete(synchronize_session=False)
+@router.get("/archived-classes", summary="List archived classes of current teacher")
+def list_archived_classes(current_user: jwt_auth.Principal = Depends(get_current_teacher),
+                          db: Session = Depends(get_db)):
+    return teacher_crud.get_archived_classes(db, current_user.user_id)
 
-        
-        if hasattr(models, "JoinCode"):
-            db.query(models.JoinCode).filter(models.JoinCode.class_id == class_id).delete(synchronize_session=False)
-        elif hasattr(models, "Join_Code"):
-            db.query(models.Join_Code).filter(models.Join_Code.class_id == class_id).delete(synchronize_session=False)
 
-       
-        if hasattr(models, "Grade"):
-            db.query(models.Grade).filter(models.Grade.class_id == class_id).delete(synchronize_session=False)
-        elif hasattr(models, "Score"):
-            db.query(models.Score).filter(models.Score.class_id == class_id).delete(synchronize_session=False)
+def _get_archived_class(db: Session, teacher_id: int, archive_id: int) -> models.ArchivedClass:
+    archived = teacher_crud.archived_class_for_teacher(db, teacher_id, archive_id)
+    if archived is None:
+        raise HTTPException(status_code=404, detail="Archived class not found")
+    return archived
 
-        
-        db.delete(cls)
-        db.commit()
-        return {"ok": True, "message": f"Class {class_id} deleted successfully"}
 
+@router.post("/archived-classes/{archive_id}/restore", summary="Restore an archived class")
+def restore_class(archive_id: int,
+                  current_user: jwt_auth.Principal = Depends(get_current_teacher),
+                  db: Session = Depends(get_db)):
+    archived = _get_archived_class(db, current_user.user_id, archive_id)
+    try:
+        class_id, student_ids = teacher_crud.restore_class(db, archived)
     except Exception as e:
         db.rollback()
-        raise HTTPException(status_code=500, detail=f"Failed to delete class: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to restore class: {str(e)}")
+    cache.invalidate_students(student_ids)
+    return {"ok": True, "class_id": class_id}
+
+
+@router.delete("/archived-classes/{archive_id}", summary="Permanently delete an archived class")
+def purge_archived_class(archive_id: int,
+                         current_user: jwt_auth.Principal = Depends(get_current_teacher),
+                         db: Session = Depends(get_db)):
+    _get_archived_class(db, current_user.user_id, archive_id)
+    teacher_crud.purge_archived_class(db, archive_id)
+    return {"ok": True}
+
+
+# ================== CSV EXPORT (STREAMING) ==================
+EXPORT_HEADER = ['STT', 'Họ và tên', 'Mã sinh viên', 'Chuyên cần', 'Giữa kỳ', 'Cuối kỳ', 'Trung bình']
+# Số dòng CSV gom lại thành một chunk gửi đi
+CSV_FLUSH_ROWS = 500
+
+
+def _cells(idx, row):
+    _, _, full_name, student_code, att, mid, fin, weighted = row
+    score = lambda v: '' if v is None else v
+    # Điểm tổng kết đã được tính sẵn trong student_class_results
+    avg = '' if weighted is None else round(weighted, 1)
+    return [idx, full_name or '', student_code or '', score(att), score(mid), score(fin), avg]
+
+
+def class_csv_rows(rows):
+    for idx, row in enumerate(rows, start=1):
+        yield _cells(idx, row)
+
+
+def term_csv_rows(rows):
+    """Như class_csv_rows nhưng thêm cột lớp, STT đánh lại từ 1 cho mỗi lớp."""
+    current_class, idx = None, 0
+    for row in rows:
+        if row[0] != current_class:
+            current_class, idx = row[0], 0
+        idx += 1
+        yield [row[1]] + _cells(idx, row)
+
+
+def csv_chunks(header, rows, flush_rows: int = CSV_FLUSH_ROWS):
+    """Ghi CSV (UTF-8 BOM để Excel đọc đúng tiếng Việt) thành từng khối bytes."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, quoting=csv.QUOTE_ALL)
+    buffer.write('\ufeff')
+    writer.writerow(header)
+    for count, cells in enumerate(rows, start=1):
+        writer.writerow(cells)
+        if count % flush_rows == 0:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate(0)
+    yield buffer.getvalue().encode('utf-8')
+
+
+def stream_export(db: Session, criteria, header, to_rows):
+    """
+    Body cho StreamingResponse. Dùng session riêng trên cùng engine vì body được
+    gửi sau khi route trả về; session của request được đóng ngay để mỗi export chỉ
+    giữ 1 connection trong lúc stream (giữ cả 2 -> nhiều export cùng lúc làm cạn pool
+    và chờ lẫn nhau).
+    """
+    bind = db.get_bind()
+    db.close()
+    return _stream_export_rows(bind, criteria, header, to_rows)
+
+
+def _stream_export_rows(bind, criteria, header, to_rows):
+    session = Session(bind=bind)
+    try:
+        rows = teacher_crud.iter_export_rows(session, *criteria)
+        yield from csv_chunks(header, to_rows(rows))
+    finally:
+        session.close()
+
+
+def csv_download(name: str, body, etag: str = None) -> StreamingResponse:
+    safe_filename = re.sub(r'[<>:"/\\|?*]', '_', name)
+    safe_filename = safe_filename.encode('ascii', 'ignore').decode('ascii') or "class"
+    filename = f"{safe_filename}_students.csv"
+    filename_encoded = quote(filename)
+
+    headers = {
+        'Content-Disposition': f'attachment; filename="{filename}"; filename*=UTF-8\'\'{filename_encoded}',
+        'Cache-Control': 'no-cache'
+    }
+    response = StreamingResponse(body, media_type="text/csv; charset=utf-8", headers=headers)
+    if etag:
+        http_cache.set_etag(response, etag)
+    return response
 
 
 @router.get("/classes/{class_id}/export", summary="Export student list to CSV")
 def export_class_students(
     class_id: int,
-    current_user: models.User = Depends(get_current_teacher),
+    request: Request,
+    current_user: jwt_auth.Principal = Depends(get_current_teacher),
     db: Session = Depends(get_db)
 ):
     """
-    Export danh sách sinh viên của lớp ra file CSV với encoding UTF-8 BOM để hỗ trợ tiếng Việt
+    Export danh sách sinh viên của lớp ra file CSV (stream từng khối, bộ nhớ không đổi theo sĩ số)
     """
-    try:
-       
-        ta = db.query(models.TeachingAssignment).filter(
-            models.TeachingAssignment.class_id == class_id,
-            models.TeachingAssignment.teacher_id == current_user.user_id
-        ).first()
-        if not ta:
-            raise HTTPException(status_code=403, detail="You are not assigned to this class")
-
-        
-        class_detail = teacher_crud.get_class_detail(db, class_id)
-        if not class_detail:
-            raise HTTPException(status_code=404, detail="Class not found")
-
-        
-        output = io.StringIO()
-       
-        output.write('\ufeff')
-
-        writer = csv.writer(output, quoting=csv.QUOTE_ALL)
-        
-        writer.writerow(['STT', 'Họ và tên', 'Mã sinh viên', 'Chuyên cần', 'Giữa kỳ', 'Cuối kỳ', 'Trung bình'])
-
-        
-        for idx, student in enumerate(class_detail.get('students', []), start=1):
-            grades = student.get('grades', {})
-            att = grades.get('attendance', '')
-            mid = grades.get('mid', '')
-            fin = grades.get('final', '')
-
-            
-            avg = ''
-            if att != '' and mid != '' and fin != '':
-                try:
-                    avg = round(float(att) * 0.2 + float(mid) * 0.3 + float(fin) * 0.5, 1)
-                except:
-                    avg = ''
-
-            writer.writerow([
-                idx,
-                student.get('full_name', ''),
-                student.get('student_code', ''),
-                att,
-                mid,
-                fin,
-                avg
-            ])
-
-       
-        csv_content = output.getvalue()
-
-        
-        class_name = class_detail.get("class_name", "class")
-        
-        safe_filename = re.sub(r'[<>:"/\\|?*]', '_', class_name)
-        
-        safe_filename = safe_filename.encode('ascii', 'ignore').decode('ascii')
-        if not safe_filename:
-            safe_filename = "class"
-        filename = f"{safe_filename}_students.csv"
-
-        
-        filename_encoded = quote(filename)
-
-       
-        csv_bytes = csv_content.encode('utf-8')
-
-        headers = {
-            'Content-Disposition': f'attachment; filename="{filename}"; filename*=UTF-8\'\'{filename_encoded}',
-            'Content-Type': 'text/csv; charset=utf-8',
-            'Cache-Control': 'no-cache'
-        }
+    ta = db.query(models.TeachingAssignment).filter(
+        models.TeachingAssignment.class_id == class_id,
+        models.TeachingAssignment.teacher_id == current_user.user_id
+    ).first()
+    if not ta:
+        raise HTTPException(status_code=403, detail="You are not assigned to this class")
 
-        
-        return Response(
-            content=csv_bytes,
-            media_type="text/csv; charset=utf-8",
-            headers=headers
-        )
+    cls = db.query(models.Class).filter(models.Class.class_id == class_id).first()
+    if not cls:
+        raise HTTPException(status_code=404, detail="Class not found")
 
-    except HTTPException:
-        raise
-    except Exception as e:
-        import traceback
-        error_detail = f"Export failed: {str(e)}\n{traceback.format_exc()}"
-        print(f"❌ Export error: {error_detail}")
-        raise HTTPException(status_code=500, detail=f"Export failed: {str(e)}")
+    etag = http_cache.version_etag("class-export", class_id, cls.version)
+    if http_cache.etag_matches(request, etag):
+        return http_cache.not_modified(etag)
+
+    body = stream_export(db, [models.Enrollment.class_id == class_id], EXPORT_HEADER, class_csv_rows)
+    return csv_download(cls.class_name or "class", body, etag)
+
+
+@router.get("/terms/{year}/{semester}/export", summary="Export all classes of a term to CSV")
+def export_term_students(
+    year: int,
+    semester: int,
+    request: Request,
+    current_user: jwt_auth.Principal = Depends(get_current_teacher),
+    db: Session = Depends(get_db)
+):
+    """
+    Export sinh viên của tất cả các lớp giảng viên dạy trong năm học / học kỳ vào một file CSV
+    """
+    versions = teacher_crud.term_class_versions(db, current_user.user_id, year, semester)
+    if not versions:
+        raise HTTPException(status_code=404, detail="No classes in this term")
+
+    etag = http_cache.version_etag("term-export", year, semester, tuple(versions))
+    if http_cache.etag_matches(request, etag):
+        return http_cache.not_modified(etag)
+
+    class_ids = teacher_crud.teacher_term_class_ids(current_user.user_id, year, semester)
+    body = stream_export(db, [models.Enrollment.class_id.in_(class_ids)], ['Lớp'] + EXPORT_HEADER, term_csv_rows)
+    return csv_download(f"{year}_HK{semester}", body, etag)
+
+
+# ================== CSV IMPORT ==================
+# Thử lần lượt; latin1 giải mã được mọi byte nên luôn là lựa chọn cuối
+IMPORT_ENCODINGS = ('utf-8-sig', 'cp1252', 'latin1')
+
+
+def _parse_roster_rows(reader):
+    """
+    Đọc từng dòng CSV (không giữ cả file trong bộ nhớ).
+    Trả về (rows, errors, total_rows): rows = (row_no, full_name, student_code).
+    """
+    header = next(reader, None)
+    rows = []
+    errors = []
+    total_rows = 0
+
+    for idx, row in enumerate(reader, start=2):
+        total_rows += 1
+        if not row or len(row) < 2:
+            continue
+
+        row = [cell.strip() for cell in row]
+
+        full_name = None
+        student_code = None
+
+        if len(row) >= 3:
+            # Format: STT,Họ và tên,Mã sinh viên
+            if row[0].isdigit() or row[0] == '':
+                full_name = row[1]
+                student_code = row[2]
+            else:
+                full_name = row[0]
+                student_code = row[1]
+        else:
+            # Format: Họ và tên,Mã sinh viên
+            full_name = row[0]
+            student_code = row[1]
+
+        if not full_name or not student_code:
+            errors.append((idx, f"Row {idx}: Missing name or student code"))
+            continue
+
+        rows.append((idx, full_name, student_code))
+
+    if header is None or total_rows == 0:
+        raise HTTPException(status_code=400, detail="CSV file is empty or missing header")
+    return rows, errors, total_rows
+
+
+def parse_roster(binary):
+    """Giải mã file upload theo từng encoding trong IMPORT_ENCODINGS, đọc lại từ đầu nếu lỗi."""
+    for encoding in IMPORT_ENCODINGS:
+        binary.seek(0)
+        text = io.TextIOWrapper(binary, encoding=encoding, newline='')
+        try:
+            return _parse_roster_rows(csv.reader(text))
+        except UnicodeDecodeError:
+            continue
+        finally:
+            text.detach()
+    raise HTTPException(status_code=400, detail="Cannot decode file. Please use UTF-8 encoding")
 
 
 @router.post("/classes/{class_id}/import", summary="Import students from CSV")
-async def import_class_students(
+def import_class_students(
     class_id: int,
     file: UploadFile = File(...),
-    current_user: models.User = Depends(get_current_teacher),
+    current_user: jwt_auth.Principal = Depends(get_current_teacher),
     db: Session = Depends(get_db)
 ):
     """
@@ -363,93 +460,19 @@ async def import_class_students(
     if not file.filename.endswith('.csv'):
         raise HTTPException(status_code=400, detail="Only CSV files are allowed")
 
-    try:
-        
-        content = await file.read()
-
-       
-        text_content = None
-        for encoding in ['utf-8-sig', 'utf-8', 'cp1252', 'latin1']:
-            try:
-                text_content = content.decode(encoding)
-                break
-            except UnicodeDecodeError:
-                continue
-
-        if text_content is None:
-            raise HTTPException(status_code=400, detail="Cannot decode file. Please use UTF-8 encoding")
-
-        
-        text_content = text_content.lstrip('\ufeff')
-
-        
-        csv_reader = csv.reader(io.StringIO(text_content))
-        rows = list(csv_reader)
-
-        if len(rows) < 2:
-            raise HTTPException(status_code=400, detail="CSV file is empty or missing header")
-
-        
-        header = rows[0]
-        data_rows = rows[1:]
-
-        added_count = 0
-        errors = []
-
-        for idx, row in enumerate(data_rows, start=2):
-            if not row or len(row) < 2:
-                continue
-
-            
-            row = [cell.strip() for cell in row]
-
-            full_name = None
-            student_code = None
-
-            if len(row) >= 3:
-                
-                first_col = row[0].strip()
-                if first_col.isdigit() or first_col == '':
-                   
-                    full_name = row[1].strip()
-                    student_code = row[2].strip()
-                else:
-                   
-                    full_name = row[0].strip()
-                    student_code = row[1].strip()
-            elif len(row) >= 2:
-               
-                full_name = row[0].strip()
-                student_code = row[1].strip()
-
-            if not full_name or not student_code:
-                errors.append(f"Row {idx}: Missing name or student code")
-                continue
-
-            try:
-                teacher_crud.add_student_to_class(db, class_id, full_name, student_code)
-                added_count += 1
-            except Exception as e:
-                
-                db.rollback()
-                error_msg = str(e)
-                
-                if "already enrolled" in error_msg:
-                    errors.append(f"Row {idx} ({student_code}): Already enrolled in class")
-                elif "UNIQUE constraint" in error_msg:
-                    errors.append(f"Row {idx} ({student_code}): Student code already exists")
-                else:
-                    errors.append(f"Row {idx} ({student_code}): {error_msg}")
+    rows, errors, total_rows = parse_roster(file.file)
 
-        return {
-            "ok": True,
-            "message": f"Successfully imported {added_count} students",
-            "added_count": added_count,
-            "total_rows": len(data_rows),
-            "errors": errors if errors else None
-        }
-
-    except HTTPException:
-        raise
+    try:
+        added_count, import_errors = teacher_crud.bulk_add_students_to_class(db, class_id, rows)
     except Exception as e:
+        db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to import: {str(e)}")
+
+    errors = [message for _, message in sorted(errors + import_errors)]
+    return {
+        "ok": True,
+        "message": f"Successfully imported {added_count} students",
+        "added_count": added_count,
+        "total_rows": total_rows,
+        "errors": errors if errors else None
+    }
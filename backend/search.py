@@ -0,0 +1,372 @@
+"""
+Tìm kiếm sinh viên, giảng viên và lớp học (GET /api/search).
+
+Index đảo ngược trong bộ nhớ trên:
+- sinh viên: users.full_name + students.student_code
+- giảng viên: users.full_name + teachers.department
+- lớp học: classes.class_name
+
+Chuẩn hóa không dấu ("Nguyễn Đức" -> "nguyen duc") nên gõ có dấu hay không đều
+khớp. Mỗi từ trong câu tìm khớp đúng từ hoặc theo tiền tố; nếu không có từ nào
+như vậy thì chấp nhận sai 1 ký tự (thêm / bớt / thay / đảo 2 ký tự kề nhau, chỉ
+với từ >= 4 chữ cái).
+
+Index được dựng lần đầu khi có người tìm kiếm. Sau đó mỗi commit có thay đổi
+User / Student / Teacher / Class (theo dõi bằng event của Session) đánh dấu các
+bản ghi đó; các câu INSERT hàng loạt không qua ORM thì gọi touch(). Lần tìm kiếm
+kế tiếp (sync()) nạp lại đúng các bản ghi đã đánh dấu bằng session của chính
+request đó: commit không phải mở thêm connection (giữ 2 connection một lúc có
+thể làm cạn pool khi nhiều request cùng commit).
+Mỗi worker giữ index riêng: id thay đổi còn được phát qua shared.state
+("search") để worker khác nạp lại như trên.
+"""
+import bisect
+import threading
+import time
+import unicodedata
+from collections import defaultdict
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from . import shared
+from .config import SHARED_EVENT_RETENTION
+from .db import models
+
+KINDS = ("student", "teacher", "class")
+# Số từ tối đa một tiền tố được mở rộng ra (vd: "sv" khớp 100k mã sinh viên)
+PREFIX_EXPANSION_LIMIT = 500
+# Từ ngắn hơn thì không sửa lỗi chính tả
+TYPO_MIN_LENGTH = 4
+MATCH_SCORES = {"exact": 3, "prefix": 2, "typo": 1}
+_CHUNK = 500
+
+DocKey = Tuple[str, int]
+
+
+def normalize(text: Optional[str]) -> str:
+    """Chữ thường, bỏ dấu tiếng Việt (kể cả đ -> d)."""
+    if not text:
+        return ""
+    text = unicodedata.normalize("NFD", text.lower().replace("đ", "d"))
+    return "".join(ch for ch in text if not unicodedata.combining(ch))
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    normalized = normalize(text)
+    return "".join(ch if ch.isalnum() else " " for ch in normalized).split()
+
+
+def _deletes(token: str) -> Set[str]:
+    """Các chuỗi có được khi bỏ 1 ký tự của token."""
+    return {token[:i] + token[i + 1:] for i in range(len(token))}
+
+
+def _typo_eligible(token: str) -> bool:
+    return len(token) >= TYPO_MIN_LENGTH and token.isalpha()
+
+
+class Document(NamedTuple):
+    kind: str
+    id: int
+    fields: dict
+    tokens: Tuple[str, ...]
+    sort_key: str
+
+
+class SearchIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.ready = False
+        self._docs: Dict[DocKey, Document] = {}
+        self._order: Dict[DocKey, tuple] = {}                        # khóa sắp xếp kết quả (tên không dấu)
+        self._postings: Dict[str, Set[DocKey]] = defaultdict(set)
+        self._vocab: List[str] = []                                  # các từ, đã sắp xếp (tìm tiền tố)
+        self._deletes: Dict[str, Set[str]] = defaultdict(set)        # bỏ 1 ký tự -> các từ gốc (sửa lỗi)
+        self._cursor = 0                                             # sự kiện "search" đã áp dụng
+        self._synced_at = 0.0
+        # user / lớp commit trong process này, chờ sync(); lock riêng vì không truy vấn DB
+        self._stale: Tuple[Set[int], Set[int]] = (set(), set())
+        self._stale_lock = threading.Lock()
+
+    # ---------- nạp dữ liệu ----------
+    @staticmethod
+    def _load(db: Session, user_ids: Optional[Iterable[int]] = None,
+              class_ids: Optional[Iterable[int]] = None) -> List[Document]:
+        """Đọc tài liệu từ DB: tất cả (mặc định) hoặc chỉ các user_id / class_id cho trước."""
+        def chunks(ids):
+            if ids is None:
+                yield None
+                return
+            ids = list(ids)
+            for start in range(0, len(ids), _CHUNK):
+                yield ids[start:start + _CHUNK]
+
+        docs = []
+        if user_ids is not None or class_ids is None:
+            for chunk in chunks(user_ids):
+                students = db.query(models.User.user_id, models.User.full_name, models.Student.student_code).join(
+                    models.Student, models.Student.student_id == models.User.user_id
+                ).filter(models.User.role == models.UserRole.student)
+                teachers = db.query(models.User.user_id, models.User.full_name, models.Teacher.department).join(
+                    models.Teacher, models.Teacher.teacher_id == models.User.user_id
+                ).filter(models.User.role == models.UserRole.teacher)
+                if chunk is not None:
+                    students = students.filter(models.User.user_id.in_(chunk))
+                    teachers = teachers.filter(models.User.user_id.in_(chunk))
+                for user_id, full_name, code in students:
+                    docs.append(Document(
+                        "student", user_id, {"name": full_name, "student_code": code},
+                        tuple(tokenize(full_name) + tokenize(code)), normalize(full_name)
+                    ))
+                for user_id, full_name, department in teachers:
+                    docs.append(Document(
+                        "teacher", user_id, {"name": full_name, "department": department},
+                        tuple(tokenize(full_name) + tokenize(department)), normalize(full_name)
+                    ))
+        if class_ids is not None or user_ids is None:
+            for chunk in chunks(class_ids):
+                classes = db.query(models.Class.class_id, models.Class.class_name,
+                                   models.Class.year, models.Class.semester)
+                if chunk is not None:
+                    classes = classes.filter(models.Class.class_id.in_(chunk))
+                for class_id, class_name, year, semester in classes:
+                    docs.append(Document(
+                        "class", class_id, {"name": class_name, "year": year, "semester": semester},
+                        tuple(tokenize(class_name)), normalize(class_name)
+                    ))
+        return docs
+
+    def build(self, db: Session) -> int:
+        """Dựng lại toàn bộ index. Trả về số tài liệu."""
+        # Lấy cursor / xóa đánh dấu trước khi đọc: thay đổi xảy ra trong lúc đọc
+        # vẫn được sync() áp dụng lại
+        cursor = shared.state.cursor("search")
+        with self._stale_lock:
+            self._stale = (set(), set())
+        docs = self._load(db)
+        with self._lock:
+            self._cursor, self._synced_at = cursor, time.time()
+            self._docs = {}
+            self._order = {}
+            self._postings = defaultdict(set)
+            self._deletes = defaultdict(set)
+            for doc in docs:
+                self._docs[(doc.kind, doc.id)] = doc
+                self._order[(doc.kind, doc.id)] = (doc.sort_key, doc.kind, doc.id)
+                for token in set(doc.tokens):
+                    self._postings[token].add((doc.kind, doc.id))
+            self._vocab = sorted(self._postings)
+            for token in self._vocab:
+                if _typo_eligible(token):
+                    for variant in _deletes(token):
+                        self._deletes[variant].add(token)
+            self.ready = True
+        return len(docs)
+
+    def ensure_built(self, db: Session):
+        if self.ready:
+            return
+        db.connection()  # lấy connection trước khi chờ lock: người giữ lock không phải chờ pool
+        with self._lock:
+            if not self.ready:
+                self.build(db)
+
+    def invalidate(self, user_ids: Iterable[int], class_ids: Iterable[int]):
+        """Đánh dấu user / lớp cần nạp lại ở lần sync() kế tiếp (không truy vấn DB)."""
+        with self._stale_lock:
+            self._stale[0].update(user_ids)
+            self._stale[1].update(class_ids)
+
+    def sync(self, db: Session):
+        """Nạp lại các user / lớp đã đổi: commit trong process này và sự kiện của worker khác."""
+        if not self.ready:
+            return
+        db.connection()
+        with self._lock:
+            with self._stale_lock:
+                users, classes = self._stale
+                self._stale = (set(), set())
+            now = time.time()
+            if now - self._synced_at > SHARED_EVENT_RETENTION:
+                # Sự kiện cũ có thể đã bị xóa -> dựng lại từ DB
+                self.build(db)
+                return
+            cursor, events = shared.state.poll("search", self._cursor)
+            users.update(i for e in events for i in e["users"])
+            classes.update(i for e in events for i in e["classes"])
+            if users or classes:
+                self.refresh(db, users, classes)
+            self._cursor, self._synced_at = cursor, now
+
+    def refresh(self, db: Session, user_ids: Iterable[int] = (), class_ids: Iterable[int] = ()):
+        """Nạp lại các user / lớp vừa đổi (bản ghi không còn thì xóa khỏi index)."""
+        user_ids, class_ids = set(user_ids), set(class_ids)
+        with self._lock:
+            if not self.ready:
+                return  # chưa dựng: lần dựng đầu tiên sẽ đọc dữ liệu mới
+            docs = self._load(db, user_ids or [], class_ids or [])
+            stale = [("student", i) for i in user_ids] + [("teacher", i) for i in user_ids] + \
+                    [("class", i) for i in class_ids]
+            for key in stale:
+                self._remove(key)
+            for doc in docs:
+                self._add(doc)
+
+    def _add(self, doc: Document):
+        key = (doc.kind, doc.id)
+        self._docs[key] = doc
+        self._order[key] = (doc.sort_key, doc.kind, doc.id)
+        for token in set(doc.tokens):
+            posting = self._postings[token]
+            if not posting:
+                bisect.insort(self._vocab, token)
+                if _typo_eligible(token):
+                    for variant in _deletes(token):
+                        self._deletes[variant].add(token)
+            posting.add(key)
+
+    def _remove(self, key: DocKey):
+        doc = self._docs.pop(key, None)
+        if doc is None:
+            return
+        del self._order[key]
+        for token in set(doc.tokens):
+            posting = self._postings.get(token)
+            if posting is None:
+                continue
+            posting.discard(key)
+            if not posting:
+                del self._postings[token]
+                del self._vocab[bisect.bisect_left(self._vocab, token)]
+                if _typo_eligible(token):
+                    for variant in _deletes(token):
+                        self._deletes[variant].discard(token)
+                        if not self._deletes[variant]:
+                            del self._deletes[variant]
+
+    # ---------- tìm kiếm ----------
+    def _expand(self, term: str) -> Dict[str, str]:
+        """Các từ trong index khớp với term -> kiểu khớp (exact / prefix / typo)."""
+        matches = {}
+        start = bisect.bisect_left(self._vocab, term)
+        for token in self._vocab[start:start + PREFIX_EXPANSION_LIMIT]:
+            if not token.startswith(term):
+                break
+            matches[token] = "prefix"
+        if term in self._postings:
+            matches[term] = "exact"
+        if not matches and _typo_eligible(term):
+            # Chỉ sửa lỗi khi không có từ nào khớp đúng / theo tiền tố
+            candidates = set(self._deletes.get(term, ()))            # thiếu 1 ký tự
+            for variant in _deletes(term):
+                if variant in self._postings:                        # thừa 1 ký tự
+                    candidates.add(variant)
+                candidates.update(self._deletes.get(variant, ()))    # sai / đảo 1 ký tự
+            for token in candidates:
+                matches[token] = "typo"
+        return matches
+
+    def _term_levels(self, term: str) -> List[Set[DocKey]]:
+        """Tài liệu khớp term, chia theo mức: [exact, prefix, typo] (không trùng nhau)."""
+        tokens = {match: [] for match in MATCH_SCORES}
+        for token, match in self._expand(term).items():
+            tokens[match].append(self._postings[token])
+        levels, seen = [], set()
+        for match in MATCH_SCORES:
+            docs = set().union(*tokens[match]) - seen
+            seen |= docs
+            levels.append(docs)
+        return levels
+
+    def search(self, query: str, kinds: Iterable[str] = KINDS, limit: int = 20) -> List[dict]:
+        terms = sorted(set(tokenize(query)), key=len, reverse=True)
+        if not terms:
+            return []
+        kinds = set(kinds)
+        points = list(MATCH_SCORES.values())
+        with self._lock:
+            per_term = [self._term_levels(term) for term in terms]
+            # Tài liệu phải khớp mọi từ; giao từ tập nhỏ nhất
+            matched = sorted((set().union(*levels) for levels in per_term), key=len)
+            candidates = matched[0].intersection(*matched[1:])
+            if kinds != set(KINDS):
+                candidates = {key for key in candidates if key[0] in kinds}
+            if not candidates:
+                return []
+
+            # Gom theo tổng điểm (điểm mỗi từ: exact 3 / prefix 2 / typo 1), chỉ dùng phép toán tập hợp
+            buckets: Dict[int, Set[DocKey]] = {0: candidates}
+            for levels in per_term:
+                scored: Dict[int, Set[DocKey]] = defaultdict(set)
+                for total, docs in buckets.items():
+                    for points_, level in zip(points, levels):
+                        matched_docs = docs & level
+                        if matched_docs:
+                            scored[total + points_] |= matched_docs
+                buckets = scored
+
+            # Điểm cao trước, cùng điểm thì theo tên (không dấu)
+            top: List[Tuple[DocKey, int]] = []
+            for score in sorted(buckets, reverse=True):
+                ranked = sorted(buckets[score], key=self._order.__getitem__)
+                top.extend((key, score) for key in ranked[:limit - len(top)])
+                if len(top) >= limit:
+                    break
+            return [
+                {"kind": kind, "id": doc_id, **self._docs[(kind, doc_id)].fields, "score": score}
+                for (kind, doc_id), score in top
+            ]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"ready": self.ready, "documents": len(self._docs), "tokens": len(self._vocab)}
+
+
+index = SearchIndex()
+
+
+# =========================
+# ĐỒNG BỘ KHI GHI
+# =========================
+_PENDING = "search_pending"
+
+
+def _pending(session: Session) -> Tuple[Set[int], Set[int]]:
+    return session.info.setdefault(_PENDING, (set(), set()))
+
+
+def touch(session: Session, user_ids: Iterable[int] = (), class_ids: Iterable[int] = ()):
+    """Đánh dấu user / lớp cần nạp lại vào index sau khi session commit (cho INSERT hàng loạt)."""
+    users, classes = _pending(session)
+    users.update(user_ids)
+    classes.update(class_ids)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changes(session: Session, flush_context):
+    users, classes = _pending(session)
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, models.User):
+            users.add(obj.user_id)
+        elif isinstance(obj, models.Student):
+            users.add(obj.student_id)
+        elif isinstance(obj, models.Teacher):
+            users.add(obj.teacher_id)
+        elif isinstance(obj, models.Class):
+            classes.add(obj.class_id)
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_changes(session: Session):
+    users, classes = session.info.pop(_PENDING, (set(), set()))
+    if not (users or classes):
+        return
+    shared.state.publish("search", {"users": sorted(users), "classes": sorted(classes)})
+    index.invalidate(users, classes)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changes(session: Session):
+    session.info.pop(_PENDING, None)
@@ -0,0 +1,261 @@
+"""
+Trạng thái dùng chung giữa các worker (uvicorn --workers / gunicorn -w).
+
+Chọn backend bằng SHARED_BACKEND (xem config.py):
+- "memory": trong bộ nhớ của process. Chỉ đúng khi chạy 1 worker.
+- "sqlite": một file SQLite cục bộ (SHARED_STATE_PATH) dùng chung cho mọi
+  worker trên cùng máy. Mặc định khi WEB_CONCURRENCY > 1.
+
+Giao diện chung (`state`):
+- cache(name, maxsize, ttl): cache TTL có get / set / delete / clear / stats.
+  Xóa key ở một worker thì mọi worker đều thấy.
+- lock(name, timeout): lock giữa các process. Với sqlite đây là một lease hết
+  hạn sau `lease` giây, phòng khi worker chết lúc đang giữ lock.
+- publish(channel, payload) / poll(channel, cursor): nhật ký sự kiện cho dữ
+  liệu mỗi worker giữ riêng trong bộ nhớ (vd. index tìm kiếm). poll() bỏ qua
+  sự kiện do chính process phát, vì process đó đã tự áp dụng.
+
+Giá trị cache được pickle vào file của chính ứng dụng, không nhận dữ liệu từ
+bên ngoài.
+"""
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Hashable, Iterator, List, Optional, Tuple
+
+from . import logs
+from .config import SHARED_BACKEND, SHARED_STATE_PATH, SHARED_EVENT_RETENTION
+
+log = logs.get_logger(__name__)
+
+# Số lần ghi giữa hai lần dọn key hết hạn / sự kiện cũ
+_PRUNE_EVERY = 256
+
+
+class LockTimeout(Exception):
+    """Không lấy được lock trong thời gian cho phép."""
+
+
+# =========================
+# MEMORY (1 PROCESS)
+# =========================
+class MemoryState:
+    name = "memory"
+
+    def __init__(self):
+        self._locks: Dict[str, threading.Lock] = {}
+        self._guard = threading.Lock()
+
+    def cache(self, name: str, maxsize: int, ttl: float):
+        from .cache import TTLCache  # cache.py dựng cache qua module này
+
+        return TTLCache(maxsize, ttl)
+
+    @contextmanager
+    def lock(self, name: str, timeout: float = 30.0, lease: float = 60.0) -> Iterator[None]:
+        with self._guard:
+            lock = self._locks.setdefault(name, threading.Lock())
+        if not lock.acquire(timeout=timeout):
+            raise LockTimeout(name)
+        try:
+            yield
+        finally:
+            lock.release()
+
+    def publish(self, channel: str, payload: Dict[str, Any]) -> None:
+        pass  # không có process nào khác cần nhận
+
+    def cursor(self, channel: str) -> int:
+        return 0
+
+    def poll(self, channel: str, cursor: int) -> Tuple[int, List[Dict[str, Any]]]:
+        return cursor, []
+
+
+# =========================
+# SQLITE (NHIỀU PROCESS, CÙNG MÁY)
+# =========================
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS kv (
+    ns TEXT NOT NULL, key TEXT NOT NULL, value BLOB NOT NULL, expires REAL NOT NULL,
+    PRIMARY KEY (ns, key)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS ix_kv_ns_expires ON kv (ns, expires);
+CREATE TABLE IF NOT EXISTS locks (name TEXT PRIMARY KEY, owner TEXT NOT NULL, expires REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS events (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT, channel TEXT NOT NULL, origin INTEGER NOT NULL,
+    payload TEXT NOT NULL, created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_events_channel_seq ON events (channel, seq);
+"""
+
+
+class SQLiteState:
+    name = "sqlite"
+
+    def __init__(self, path: str, event_retention: float = SHARED_EVENT_RETENTION):
+        self.path = path
+        self.event_retention = event_retention
+        self._local = threading.local()
+        self._published = 0
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # Mất dữ liệu khi mất điện chỉ làm cache trống, không cần fsync
+        conn.execute("PRAGMA synchronous=OFF")
+        return conn
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """Mỗi thread (và mỗi process sau fork) một connection, autocommit."""
+        local = self._local
+        if getattr(local, "pid", None) != os.getpid():
+            local.conn, local.pid = self._connect(), os.getpid()
+        return local.conn
+
+    def cache(self, name: str, maxsize: int, ttl: float) -> "SQLiteCache":
+        return SQLiteCache(self, name, maxsize, ttl)
+
+    @contextmanager
+    def lock(self, name: str, timeout: float = 30.0, lease: float = 60.0) -> Iterator[None]:
+        owner = f"{os.getpid()}:{uuid.uuid4().hex}"
+        deadline = time.monotonic() + timeout
+        delay = 0.005
+        while True:
+            now = time.time()
+            # Chèn mới, hoặc chiếm lại lock mà lease đã hết hạn
+            acquired = self.conn.execute(
+                "INSERT INTO locks (name, owner, expires) VALUES (?, ?, ?) "
+                "ON CONFLICT (name) DO UPDATE SET owner = excluded.owner, expires = excluded.expires "
+                "WHERE locks.expires < ?",
+                (name, owner, now + lease, now),
+            ).rowcount == 1
+            if acquired:
+                break
+            if time.monotonic() >= deadline:
+                raise LockTimeout(name)
+            time.sleep(delay)
+            delay = min(delay * 2, 0.1)
+        try:
+            yield
+        finally:
+            self.conn.execute("DELETE FROM locks WHERE name = ? AND owner = ?", (name, owner))
+
+    def publish(self, channel: str, payload: Dict[str, Any]) -> None:
+        now = time.time()
+        self.conn.execute(
+            "INSERT INTO events (channel, origin, payload, created) VALUES (?, ?, ?, ?)",
+            (channel, os.getpid(), json.dumps(payload), now),
+        )
+        self._published += 1
+        if self._published % _PRUNE_EVERY == 0:
+            self.conn.execute("DELETE FROM events WHERE created < ?", (now - self.event_retention,))
+
+    def cursor(self, channel: str) -> int:
+        """seq của sự kiện mới nhất trên channel (điểm bắt đầu của poll)."""
+        row = self.conn.execute("SELECT MAX(seq) FROM events WHERE channel = ?", (channel,)).fetchone()
+        return row[0] or 0
+
+    def poll(self, channel: str, cursor: int) -> Tuple[int, List[Dict[str, Any]]]:
+        """Sự kiện sau `cursor` do process khác phát. Trả về (cursor mới, payloads)."""
+        rows = self.conn.execute(
+            "SELECT seq, origin, payload FROM events WHERE channel = ? AND seq > ? ORDER BY seq",
+            (channel, cursor),
+        ).fetchall()
+        if not rows:
+            return cursor, []
+        pid = os.getpid()
+        return rows[-1][0], [json.loads(payload) for _, origin, payload in rows if origin != pid]
+
+
+class SQLiteCache:
+    """Cùng giao diện với cache.TTLCache; key hết hạn theo giờ hệ thống (dùng chung giữa process)."""
+
+    def __init__(self, state: SQLiteState, name: str, maxsize: int, ttl: float):
+        self.state = state
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _count(self, hit: bool):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        row = self.state.conn.execute(
+            "SELECT value FROM kv WHERE ns = ? AND key = ? AND expires >= ?", (self.name, repr(key), time.time())
+        ).fetchone()
+        self._count(row is not None)
+        return pickle.loads(row[0]) if row is not None else None
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        expires = time.time() + (self.ttl if ttl is None else ttl)
+        self.state.conn.execute(
+            "INSERT OR REPLACE INTO kv (ns, key, value, expires) VALUES (?, ?, ?, ?)",
+            (self.name, repr(key), pickle.dumps(value, pickle.HIGHEST_PROTOCOL), expires),
+        )
+        with self._lock:
+            self._writes += 1
+            prune = self._writes % _PRUNE_EVERY == 0
+        if prune:
+            self.prune()
+
+    def delete(self, key: Hashable):
+        self.state.conn.execute("DELETE FROM kv WHERE ns = ? AND key = ?", (self.name, repr(key)))
+
+    def clear(self):
+        self.state.conn.execute("DELETE FROM kv WHERE ns = ?", (self.name,))
+
+    def prune(self):
+        """Xóa key hết hạn; vượt maxsize thì bỏ các key sắp hết hạn nhất."""
+        conn = self.state.conn
+        conn.execute("DELETE FROM kv WHERE ns = ? AND expires < ?", (self.name, time.time()))
+        extra = self._size() - self.maxsize
+        if extra > 0:
+            conn.execute(
+                "DELETE FROM kv WHERE ns = ? AND key IN "
+                "(SELECT key FROM kv WHERE ns = ? ORDER BY expires LIMIT ?)",
+                (self.name, self.name, extra),
+            )
+
+    def _size(self) -> int:
+        return self.state.conn.execute("SELECT COUNT(*) FROM kv WHERE ns = ?", (self.name,)).fetchone()[0]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {
+            "size": self._size(),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / total, 4) if total else 0.0,
+        }
+
+
+def make_state(backend: str = SHARED_BACKEND, path: str = SHARED_STATE_PATH):
+    if backend == "memory":
+        return MemoryState()
+    if backend == "sqlite":
+        return SQLiteState(path)
+    raise ValueError(f"SHARED_BACKEND không hợp lệ: {backend!r} (memory | sqlite)")
+
+
+state = make_state()